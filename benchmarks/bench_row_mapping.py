@@ -0,0 +1,85 @@
+"""Сравнение чтения рисков: словари + модели против прямых фабрик строк
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_row_mapping --rows 100000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from src.models.risk import Risk, RiskLevel, RiskType, RiskZone
+from src.services.database_service import DatabaseService
+
+
+def _risk_from_dict(data: dict) -> Risk:
+    """Построение модели из словаря строки (прежний путь)"""
+    return Risk(
+        id=data["id"],
+        type=RiskType(data["type"]),
+        level=RiskLevel(data["level"]),
+        title=data["title"],
+        description=data["description"],
+        zone=RiskZone(
+            latitude=data["lat"],
+            longitude=data["lon"],
+            radius_km=data["radius_km"],
+        ),
+        start_time=datetime.fromisoformat(data["start_time"]) if data["start_time"] else None,
+        end_time=datetime.fromisoformat(data["end_time"]) if data["end_time"] else None,
+        source=data["source"],
+        created_at=datetime.fromisoformat(data["created_at"]),
+    )
+
+
+def _generate_risks(count: int):
+    types = list(RiskType)
+    levels = list(RiskLevel)
+    for i in range(count):
+        yield {
+            "id": f"risk_{i}",
+            "type": types[i % len(types)].value,
+            "level": levels[i % len(levels)].value,
+            "title": f"Риск {i}",
+            "description": "Описание риска для замера",
+            "lat": 41 + (i % 3600) / 100,
+            "lon": 19 + (i % 16000) / 100,
+            "radius_km": 10 + i % 50,
+            "source": "МЧС",
+        }
+
+
+async def _measure(label: str, read):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = await read()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {len(result):>8} строк  {elapsed:8.3f} с  пик {peak / 2**20:8.1f} МиБ")
+    return peak
+
+
+async def main(rows: int):
+    with tempfile.TemporaryDirectory() as directory:
+        async with DatabaseService(os.path.join(directory, "bench.db")) as db:
+            await db.init_db()
+            await db.upsert_risks(_generate_risks(rows), chunk_size=5000)
+
+            async def via_dicts():
+                return [_risk_from_dict(row) for row in await db.get_active_risks()]
+
+            dict_peak = await _measure("dict(row) -> Risk", via_dicts)
+            model_peak = await _measure("фабрика строк -> Risk", db.get_active_risk_models)
+            print(f"Снижение пиковых аллокаций: {1 - model_peak / dict_peak:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    asyncio.run(main(parser.parse_args().rows))
@@ -11,9 +11,28 @@ class Settings:
     # API настройки
     weather_api_url: str = "https://api.openweathermap.org/data/2.5"
     weather_api_key:  Optional[str] = None
+    weather_connect_timeout: float = 5.0  # секунды
+    weather_read_timeout: float = 10.0  # секунды
+    weather_max_connections: int = 100
+    weather_max_keepalive: int = 20  # соединений, удерживаемых между запросами
+    weather_keepalive_expiry: float = 30.0  # секунды
+    weather_http2: bool = True  # при установленном пакете h2
+    weather_rate_limit: float = 10.0  # запросов в секунду по квоте провайдера
+    weather_rate_burst: float = 20.0  # допустимый всплеск запросов
+    weather_max_concurrency: int = 32  # одновременных запросов в пакетной загрузке
+    weather_budget_current: float = 3.0  # секунды на запрос текущей погоды
+    weather_budget_forecast: float = 5.0  # секунды на запрос прогноза
+    weather_failure_threshold: int = 5  # ошибок подряд до отключения API
+    weather_reset_timeout: float = 30.0  # секунды до пробного запроса
+    weather_max_stale: float = 21600.0  # секунды, дольше устаревшие данные не отдаются
     
     # База данных
     db_path: str = "data/mnur.db"
+    db_pool_size: int = 5
+    db_acquire_timeout: float = 30.0  # секунды
+    db_health_check_interval: float = 60.0  # секунды
+    db_write_batch_size: int = 256  # операций в групповой фиксации
+    db_write_max_delay: float = 0.002  # секунды ожидания добора группы
     
     # Уведомления
     notification_check_interval: int = 300  # секунды
@@ -21,9 +40,30 @@ class Settings:
     # Геолокация
     default_latitude: float = 55.7558  # Москва
     default_longitude: float = 37.6173
+    gazetteer_path: str = "data/gazetteer.json"
+    geocoding_cache_path: str = "data/geocode_cache.db"
+    geocoding_precision: int = 2  # знаков после запятой в ключе кэша (~1 км)
+    geocoding_settlement_radius_km: float = 30.0
+    road_graph_path: str = "data/roads.npz"  # граф дорог для маршрутов эвакуации
+    
+    # Бронирование мест в укрытиях
+    reservation_hold_ttl: float = 900.0  # секунды удержания без подтверждения
+    reservation_sweep_interval: float = 30.0  # секунды между снятиями просроченных
     
     # Кэширование
-    cache_ttl: int = 3600  # секунды
+    cache_ttl: int = 3600  # секунды (прогноз погоды)
+    weather_cache_path: str = "data/weather_cache.db"
+    weather_cache_size: int = 10000  # записей в памяти
+    weather_cell_deg: float = 0.1  # размер ячейки сетки кэша погоды (~11 км)
+    weather_ttl_current: float = 600.0  # секунды
+    weather_ttl_alerts: float = 300.0  # секунды
+    
+    # История погоды
+    weather_series_path: str = "data/weather_series.db"
+    weather_utc_offset: int = 10800  # секунды, граница суток для суточных агрегатов
+    weather_raw_retention_days: float = 14  # затем часовые агрегаты
+    weather_hourly_retention_days: float = 180  # затем суточные агрегаты
+    weather_daily_retention_days: float = 1826  # затем удаление
     
     @classmethod
     def load(cls) -> "Settings":
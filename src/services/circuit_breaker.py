@@ -0,0 +1,99 @@
+"""Автоматический выключатель для внешних сервисов"""
+
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Сервис признан недоступным, запрос не выполняется"""
+
+
+@dataclass
+class BreakerStats:
+    """Счётчики выключателя"""
+    successes: int = 0
+    failures: int = 0
+    rejected: int = 0  # запросов, отклонённых без обращения к сервису
+    opened: int = 0  # сколько раз выключатель размыкался
+
+    def to_dict(self) -> dict:
+        """Преобразование в словарь"""
+        return asdict(self)
+
+
+class CircuitBreaker:
+    """Выключатель: closed → open → half_open → closed
+
+    После failure_threshold ошибок подряд запросы отклоняются сразу
+    (open). Через reset_timeout секунд пропускается до half_open_calls
+    пробных запросов: успех замыкает выключатель, ошибка снова размыкает.
+    Вызывающий сообщает исход через record_success/record_failure, а если
+    запрос был отменён — через record_cancel.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.stats = BreakerStats()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        """Проверка перед запросом; CircuitOpenError — запрос не выполнять"""
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_calls):
+            self.stats.rejected += 1
+            raise CircuitOpenError(f"Сервис {self.name} временно недоступен")
+        if state == HALF_OPEN:
+            self._probes += 1
+
+    def record_success(self):
+        self.stats.successes += 1
+        self._consecutive_failures = 0
+        self._state = CLOSED
+        self._probes = 0
+
+    def record_failure(self):
+        self.stats.failures += 1
+        self._consecutive_failures += 1
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.stats.opened += 1
+            self._state = OPEN
+            self._opened_at = self._clock()
+            self._probes = 0
+
+    def record_cancel(self):
+        """Отменённый запрос освобождает место пробного"""
+        if self._state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def get_stats(self) -> dict:
+        """Снимок состояния и счётчиков"""
+        data = self.stats.to_dict()
+        data["state"] = self.state
+        return data
@@ -1,192 +1,1154 @@
 """Сервис базы данных"""
 
+import base64
 import json
 import os
-from typing import Optional, List, Dict, Any
+from dataclasses import dataclass, asdict
+from typing import (
+    Optional, List, Dict, Any, Callable, Iterable, AsyncIterable, AsyncIterator,
+    Tuple, Union, Sequence, FrozenSet,
+)
 from datetime import datetime, date
 import aiosqlite
+from src.config.settings import Settings
+from src.services.db_pool import ConnectionPool
+from src.services.db_writer import DatabaseWriter, WriteOperation
+from src.services.db_migrations import (
+    apply_migrations, get_schema_version, find_table_scans,
+)
+from src.services.location_service import LocationService
+from src.services.zone_engine import PreparedZone, ZoneMatcher
+from src.models.incident import Incident
+from src.models.risk import Risk, RiskZone
+from src.models.shelter import Shelter
+from src.services.db_mapping import (
+    RISK_COLUMNS, INCIDENT_COLUMNS, SHELTER_COLUMNS, NOTIFICATION_COLUMNS,
+    HASH_EXCLUDED_COLUMNS, SHELTER_INSERT_ONLY_COLUMNS, RowFactory, risk_to_record, incident_to_record, shelter_to_record,
+    notification_to_record, record_to_row, decode_polygon, risk_row_factory,
+    incident_row_factory, shelter_row_factory,
+)
+from src.services.shelter_reservations import (
+    Reservation, ReservationError, ReservationNotFoundError, ShelterFullError,
+    VersionConflictError,
+)
+
+
+_SQL_GET_USER = "SELECT * FROM users WHERE id = ?"
+
+_SQL_SAVE_USER = """
+    INSERT OR REPLACE INTO users
+    (id, phone, email, full_name, notifications_enabled,
+     home_lat, home_lon, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Полный проход по домашним адресам для пакетного сопоставления с рисками
+_SQL_USER_HOMES = """
+    SELECT id, home_lat, home_lon FROM users
+    WHERE home_lat IS NOT NULL AND home_lon IS NOT NULL
+"""
+
+# Унарный плюс не даёт планировщику обходить весь индекс по created_at
+# ради сортировки: активные риски выбираются по индексу end_time
+_SQL_ACTIVE_RISKS = """
+    SELECT * FROM risks
+    WHERE (end_time IS NULL OR end_time > ?)
+    ORDER BY +created_at DESC
+"""
+
+_SQL_INCIDENTS_BY_DATE = """
+    SELECT * FROM incidents
+    WHERE incident_date = ?
+    ORDER BY created_at DESC
+"""
+
+_SQL_UNREAD_NOTIFICATIONS = """
+    SELECT * FROM notifications
+    WHERE user_id = ? AND is_read = 0
+    ORDER BY created_at DESC
+"""
+
+_OCCUPANCY_COLUMNS = "id, capacity_current, capacity_total, is_active, version"
+
+_SQL_SHELTER_OCCUPANCY = f"SELECT {_OCCUPANCY_COLUMNS} FROM shelters"
+
+# Проверка свободных мест и увеличение версии в одном выражении:
+# параллельные брони не могут превысить вместимость
+_SQL_RESERVE_SHELTER = f"""
+    UPDATE shelters
+    SET capacity_current = COALESCE(capacity_current, 0) + ?, version = version + 1
+    WHERE id = ? AND is_active = 1
+        AND COALESCE(capacity_current, 0) + ? <= capacity_total
+    RETURNING {_OCCUPANCY_COLUMNS}
+"""
+
+_SQL_RETURN_SHELTER_PLACES = f"""
+    UPDATE shelters
+    SET capacity_current = MAX(COALESCE(capacity_current, 0) - ?, 0),
+        version = version + 1
+    WHERE id = ?
+    RETURNING {_OCCUPANCY_COLUMNS}
+"""
+
+_SQL_SET_SHELTER_CAPACITY = f"""
+    UPDATE shelters SET capacity_total = ?, version = version + 1
+    WHERE id = ? AND version = ?
+    RETURNING {_OCCUPANCY_COLUMNS}
+"""
+
+_SQL_INSERT_RESERVATION = """
+    INSERT INTO shelter_reservations
+        (id, shelter_id, people, status, created_at, expires_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_CONFIRM_RESERVATION = """
+    UPDATE shelter_reservations SET status = 'confirmed', expires_at = NULL
+    WHERE id = ? AND status = 'held' AND expires_at > ?
+    RETURNING *
+"""
+
+_SQL_RELEASE_RESERVATION = """
+    UPDATE shelter_reservations SET status = 'released'
+    WHERE id = ? AND status IN ('held', 'confirmed')
+    RETURNING *
+"""
+
+_SQL_EXPIRE_RESERVATIONS = """
+    UPDATE shelter_reservations SET status = 'expired'
+    WHERE status = 'held' AND expires_at <= ?
+    RETURNING shelter_id, people
+"""
+
+
+# Базовые выборки для потокового чтения и keyset-пагинации
+_SQL_ACTIVE_RISKS_BASE = (
+    "SELECT * FROM risks WHERE (end_time IS NULL OR end_time > ?)"
+)
+_SQL_INCIDENTS_BY_DATE_BASE = "SELECT * FROM incidents WHERE incident_date = ?"
+_SQL_UNREAD_NOTIFICATIONS_BASE = (
+    "SELECT * FROM notifications WHERE user_id = ? AND is_read = 0"
+)
+
+
+def _keyset_page_sql(base_sql: str, after_cursor: bool) -> str:
+    """Страница выборки по убыванию (created_at, id)"""
+    condition = " AND (created_at, id) < (?, ?)" if after_cursor else ""
+    return f"{base_sql}{condition} ORDER BY created_at DESC, id DESC LIMIT ?"
+
+
+def _encode_cursor(row) -> str:
+    """Курсор страницы по последней строке"""
+    payload = json.dumps([row["created_at"], row["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str) -> Tuple[str, str]:
+    """Разбор курсора страницы"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор страницы: {token!r}") from e
+    return created_at, row_id
+
+
+_SQL_INCIDENT_MONTH_SUMMARY = """
+    SELECT day, incident_type, severity, SUM(count) AS count
+    FROM incident_daily_counts
+    WHERE day >= ? AND day < ?
+    GROUP BY day, incident_type, severity
+"""
+
+_SQL_INCIDENT_MONTH_SUMMARY_REGION = """
+    SELECT day, incident_type, severity, count
+    FROM incident_daily_counts
+    WHERE region = ? AND day >= ? AND day < ?
+"""
+
+# Порядок тяжести происшествий (по возрастанию)
+_SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+
+def _month_bounds(year: int, month: int) -> Tuple[str, str]:
+    """Границы месяца [начало, начало следующего) в ISO-формате"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def _nearby_shelters_sql(range_count: int) -> str:
+    """Запрос укрытий в радиусе для заданного числа диапазонов долгот
+
+    Унарный плюс у is_active не даёт планировщику предпочесть индекс
+    idx_shelters_active отбору по R*Tree.
+    """
+    candidates = " UNION ALL ".join(
+        "SELECT id FROM shelters_rtree "
+        "WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?"
+        for _ in range(range_count)
+    )
+    return f"""
+        SELECT * FROM (
+            SELECT s.*, distance_km(?, ?, s.lat, s.lon) AS distance_km
+            FROM shelters AS s
+            WHERE s.rowid IN ({candidates}) AND +s.is_active = 1
+        )
+        WHERE distance_km <= ?
+        ORDER BY distance_km
+        LIMIT ?
+    """
+
+
+def _active_risks_near_sql(range_count: int) -> str:
+    """Запрос активных рисков, зона которых задевает точку или круг
+
+    Кандидаты отбираются по R*Tree прямоугольников зон, точная проверка
+    геометрии выполняется только для них.
+    """
+    candidates = " UNION ALL ".join(
+        "SELECT id FROM risks_rtree "
+        "WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?"
+        for _ in range(range_count)
+    )
+    return f"""
+        SELECT * FROM risks
+        WHERE rowid IN ({candidates})
+          AND (+end_time IS NULL OR +end_time > ?)
+          AND zone_intersects(?, ?, ?, lat, lon, radius_km, polygon)
+        ORDER BY +created_at DESC
+    """
+
+
+def _users_in_bbox_sql(range_count: int) -> str:
+    """Запрос пользователей с домашним адресом в прямоугольнике"""
+    candidates = " UNION ALL ".join(
+        "SELECT id FROM users_rtree "
+        "WHERE min_lat >= ? AND max_lat <= ? AND min_lon >= ? AND max_lon <= ?"
+        for _ in range(range_count)
+    )
+    return f"""
+        SELECT id, home_lat, home_lon FROM users
+        WHERE rowid IN ({candidates})
+    """
+
+
+def _active_risks_by_id_sql(count: int) -> str:
+    """Запрос активных рисков по списку id"""
+    placeholders = ", ".join("?" for _ in range(count))
+    return f"""
+        SELECT * FROM risks
+        WHERE id IN ({placeholders}) AND (+end_time IS NULL OR +end_time > ?)
+    """
+
+
+def _user_homes_by_id_sql(count: int) -> str:
+    """Запрос домашних адресов пользователей по списку id"""
+    placeholders = ", ".join("?" for _ in range(count))
+    return f"""
+        SELECT id, home_lat, home_lon FROM users
+        WHERE id IN ({placeholders}) AND home_lat IS NOT NULL AND home_lon IS NOT NULL
+    """
+
+
+def _shelter_occupancy_by_id_sql(count: int) -> str:
+    """Заполненность укрытий по списку ID"""
+    placeholders = ", ".join("?" for _ in range(count))
+    return f"{_SQL_SHELTER_OCCUPANCY} WHERE id IN ({placeholders})"
+
+
+def _sql_zone_intersects(
+    lat: float, lon: float, radius_km: float,
+    zone_lat: float, zone_lon: float, zone_radius_km: float, polygon: Optional[str],
+) -> bool:
+    """SQL-функция точной проверки зоны риска"""
+    zone = RiskZone(
+        latitude=zone_lat,
+        longitude=zone_lon,
+        radius_km=zone_radius_km or 0,
+        polygon=decode_polygon(polygon),
+    )
+    return LocationService.zone_intersects(zone, lat, lon, radius_km or 0)
+
+
+def _hash_lookup_sql(table: str, count: int) -> str:
+    """Запрос сохранённых хешей содержимого по списку id"""
+    placeholders = ", ".join("?" for _ in range(count))
+    return f"SELECT id, content_hash FROM {table} WHERE id IN ({placeholders})"
+
+
+# Запросы, которые читают всю таблицу намеренно: выгрузки для расчётов
+# в памяти. check_query_plans их не проверяет, но список явный.
+_INTENDED_FULL_SCANS = frozenset((
+    "get_all_shelter_occupancy",  # снимок заполненности всех укрытий
+    "iter_user_homes",  # потоковая выгрузка домашних адресов
+))
+
+
+def _query_plan_samples() -> Dict[str, Tuple[str, tuple]]:
+    """Запросы сервиса с примерными параметрами для EXPLAIN QUERY PLAN"""
+    now = datetime.now().isoformat()
+    samples = {
+        "get_user": (_SQL_GET_USER, ("user",)),
+        "get_active_risks": (_SQL_ACTIVE_RISKS, (now,)),
+        "get_incidents_by_date": (_SQL_INCIDENTS_BY_DATE, (date.today().isoformat(),)),
+        "get_unread_notifications": (_SQL_UNREAD_NOTIFICATIONS, ("user",)),
+        "get_incident_summary_for_month": (
+            _SQL_INCIDENT_MONTH_SUMMARY, _month_bounds(2025, 1),
+        ),
+        "get_incident_summary_for_month_region": (
+            _SQL_INCIDENT_MONTH_SUMMARY_REGION, ("Москва",) + _month_bounds(2025, 1),
+        ),
+        "get_active_risks_near": (
+            _active_risks_near_sql(1), (55.0, 56.0, 37.0, 38.0, now, 55.5, 37.5, 10),
+        ),
+        "get_nearby_shelters": (
+            _nearby_shelters_sql(1), (55.0, 37.0, 54.9, 55.1, 36.8, 37.2, 10, 50),
+        ),
+        "get_users_in_bbox": (
+            _users_in_bbox_sql(1), (55.0, 56.0, 37.0, 38.0),
+        ),
+        "get_user_homes_by_id": (_user_homes_by_id_sql(2), ("a", "b")),
+        "get_active_risks_by_id": (_active_risks_by_id_sql(2), ("a", "b", now)),
+        "get_shelter_occupancy_by_id": (_shelter_occupancy_by_id_sql(2), ("a", "b")),
+        "get_all_shelter_occupancy": (_SQL_SHELTER_OCCUPANCY, ()),
+        "iter_user_homes": (_SQL_USER_HOMES, ()),
+        "reserve_shelter_places": (_SQL_RESERVE_SHELTER, (2, "a", 2)),
+        "return_shelter_places": (_SQL_RETURN_SHELTER_PLACES, (2, "a")),
+        "set_shelter_capacity": (_SQL_SET_SHELTER_CAPACITY, (100, "a", 3)),
+        "confirm_shelter_reservation": (_SQL_CONFIRM_RESERVATION, ("a", now)),
+        "release_shelter_reservation": (_SQL_RELEASE_RESERVATION, ("a",)),
+        "expire_shelter_reservations": (_SQL_EXPIRE_RESERVATIONS, (now,)),
+        "get_nearby_shelters_antimeridian": (
+            _nearby_shelters_sql(2),
+            (65.0, 179.9, 64.9, 65.1, 179.7, 180.0, 64.9, 65.1, -180.0, -179.9, 10, 50),
+        ),
+    }
+    keyset = {
+        "active_risks": (_SQL_ACTIVE_RISKS_BASE, (now,)),
+        "incidents_by_date": (_SQL_INCIDENTS_BY_DATE_BASE, (date.today().isoformat(),)),
+        "unread_notifications": (_SQL_UNREAD_NOTIFICATIONS_BASE, ("user",)),
+    }
+    for name, (base_sql, params) in keyset.items():
+        samples[f"{name}_first_page"] = (
+            _keyset_page_sql(base_sql, False), params + (50,),
+        )
+        samples[f"{name}_next_page"] = (
+            _keyset_page_sql(base_sql, True), params + (now, "id", 50),
+        )
+    for table in ("risks", "incidents", "shelters", "notifications"):
+        samples[f"upsert_{table}_hashes"] = (_hash_lookup_sql(table, 2), ("a", "b"))
+    return samples
+
+
+@dataclass
+class Page:
+    """Страница результатов keyset-пагинации"""
+    items: List[Dict]
+    next_cursor: Optional[str] = None
+
+
+@dataclass
+class UpsertResult:
+    """Итог пакетной записи"""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+    
+    def to_dict(self) -> dict:
+        """Преобразование в словарь"""
+        return asdict(self)
+
+
+async def _iter_chunks(
+    items: Union[Iterable, AsyncIterable], size: int
+) -> AsyncIterator[List]:
+    """Разбиение обычного или асинхронного итератора на пачки"""
+    chunk = []
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
 
 
 class DatabaseService: 
     """Сервис для работы с базой данных"""
     
-    def __init__(self, db_path: str = "data/mnur.db"):
+    def __init__(
+        self,
+        db_path: str = "data/mnur.db",
+        pool_size: int = 5,
+        acquire_timeout: Optional[float] = 30.0,
+        health_check_interval: float = 60.0,
+        statement_cache_size: int = 256,
+        write_batch_size: int = 256,
+        write_max_delay: float = 0.002,
+    ):
         self.db_path = db_path
         self._ensure_data_dir()
+        self._writer = DatabaseWriter(
+            db_path,
+            max_batch=write_batch_size,
+            max_delay=write_max_delay,
+            statement_cache_size=statement_cache_size,
+            on_connect=self._setup_connection,
+        )
+        self._pool = ConnectionPool(
+            db_path,
+            size=pool_size,
+            acquire_timeout=acquire_timeout,
+            health_check_interval=health_check_interval,
+            statement_cache_size=statement_cache_size,
+            on_connect=self._setup_connection,
+        )
+    
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "DatabaseService":
+        """Создание сервиса по настройкам приложения"""
+        return cls(
+            db_path=settings.db_path,
+            pool_size=settings.db_pool_size,
+            acquire_timeout=settings.db_acquire_timeout,
+            health_check_interval=settings.db_health_check_interval,
+            write_batch_size=settings.db_write_batch_size,
+            write_max_delay=settings.db_write_max_delay,
+        )
+    
+    async def __aenter__(self) -> "DatabaseService":
+        await self.open()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
     
     def _ensure_data_dir(self):
         """Создание директории для данных"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-    
-    async def init_db(self):
-        """Инициализация базы данных"""
-        async with aiosqlite.connect(self. db_path) as db:
-            # Таблица пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id TEXT PRIMARY KEY,
-                    phone TEXT,
-                    email TEXT,
-                    full_name TEXT,
-                    notifications_enabled INTEGER DEFAULT 1,
-                    home_lat REAL,
-                    home_lon REAL,
-                    created_at TEXT,
-                    updated_at TEXT
-                )
-            """)
-            
-            # Таблица рисков
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS risks (
-                    id TEXT PRIMARY KEY,
-                    type TEXT,
-                    level TEXT,
-                    title TEXT,
-                    description TEXT,
-                    lat REAL,
-                    lon REAL,
-                    radius_km REAL,
-                    start_time TEXT,
-                    end_time TEXT,
-                    source TEXT,
-                    created_at TEXT
-                )
-            """)
-            
-            # Таблица происшествий
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS incidents (
-                    id TEXT PRIMARY KEY,
-                    title TEXT,
-                    description TEXT,
-                    incident_type TEXT,
-                    lat REAL,
-                    lon REAL,
-                    address TEXT,
-                    is_active INTEGER,
-                    severity TEXT,
-                    incident_date TEXT,
-                    created_at TEXT
-                )
-            """)
-            
-            # Таблица укрытий
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS shelters (
-                    id TEXT PRIMARY KEY,
-                    name TEXT,
-                    shelter_type TEXT,
-                    lat REAL,
-                    lon REAL,
-                    address TEXT,
-                    capacity_total INTEGER,
-                    capacity_current INTEGER,
-                    is_active INTEGER,
-                    phone TEXT,
-                    created_at TEXT
-                )
-            """)
-            
-            # Таблица уведомлений
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS notifications (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT,
-                    title TEXT,
-                    message TEXT,
-                    type TEXT,
-                    is_read INTEGER DEFAULT 0,
-                    created_at TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            await db.commit()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    async def open(self):
+        """Открытие пула соединений и запуск писателя"""
+        await self._pool.open()
+        await self._writer.start()
+    
+    async def close(self):
+        """Завершение ожидающих записей и закрытие соединений"""
+        await self._writer.close()
+        await self._pool.close()
+    
+    @staticmethod
+    async def _setup_connection(db):
+        """Настройка нового соединения"""
+        # WAL: читатели не блокируются единственным писателем
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute("PRAGMA busy_timeout = 5000")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        await db.execute("PRAGMA cache_size = -16000")
+        await db.execute("PRAGMA mmap_size = 268435456")
+        # REPLACE должен вызывать триггеры удаления (синхронизация R*Tree)
+        await db.execute("PRAGMA recursive_triggers = ON")
+        await db.create_function(
+            "distance_km", 4, LocationService.calculate_distance,
+            deterministic=True,
+        )
+        await db.create_function(
+            "zone_intersects", 7, _sql_zone_intersects, deterministic=True,
+        )
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Метрики пула соединений"""
+        return self._pool.get_stats()
+    
+    def get_writer_stats(self) -> Dict[str, Any]:
+        """Метрики очереди записи"""
+        return self._writer.get_stats()
+    
+    async def execute_write(self, operation: WriteOperation) -> Any:
+        """Выполнение операции записи через единственного писателя
+
+        operation получает соединение писателя и не должна управлять
+        транзакцией: фиксация выполняется группой. Возвращает результат
+        операции после COMMIT.
+        """
+        return await self._writer.submit(operation)
+    
+    async def init_db(self) -> List[int]:
+        """Инициализация базы данных: применение недостающих миграций"""
+        async with self._pool.acquire() as db:
+            return await apply_migrations(db)
+    
+    async def get_schema_version(self) -> int:
+        """Текущая версия схемы базы данных"""
+        async with self._pool.acquire() as db:
+            return await get_schema_version(db)
+    
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        """Проверка, что запросы сервиса не делают полный просмотр таблиц
+
+        Планы строятся на пустой базе в памяти с актуальной схемой, чтобы
+        результат не зависел от статистики конкретной базы. Возвращает
+        строки планов с полным просмотром по именам запросов.
+        """
+        async with aiosqlite.connect(":memory:") as db:
+            await self._setup_connection(db)
+            await apply_migrations(db)
+            return await find_table_scans(
+                db, _query_plan_samples(), allowed=_INTENDED_FULL_SCANS
+            )
     
     async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Получение пользователя"""
-        async with aiosqlite.connect(self. db_path) as db:
-            db. row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM users WHERE id = ? ", (user_id,)
-            )
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(_SQL_GET_USER, (user_id,))
             row = await cursor.fetchone()
             return dict(row) if row else None
     
     async def save_user(self, user_data: Dict[str, Any]) -> bool:
         """Сохранение пользователя"""
-        async with aiosqlite. connect(self.db_path) as db:
-            await db.execute("""
-                INSERT OR REPLACE INTO users 
-                (id, phone, email, full_name, notifications_enabled, 
-                 home_lat, home_lon, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_data. get("id"),
-                user_data. get("phone"),
-                user_data. get("email"),
-                user_data. get("full_name"),
-                user_data.get("notifications_enabled", 1),
-                user_data.get("home_lat"),
-                user_data.get("home_lon"),
-                user_data.get("created_at", datetime.now().isoformat()),
-                datetime.now().isoformat(),
-            ))
-            await db.commit()
-            return True
-    
-    async def get_active_risks(self, lat: float = None, lon: float = None) -> List[Dict]: 
-        """Получение активных рисков"""
-        async with aiosqlite.connect(self. db_path) as db:
-            db.row_factory = aiosqlite. Row
-            cursor = await db.execute("""
-                SELECT * FROM risks 
-                WHERE (end_time IS NULL OR end_time > ?)
-                ORDER BY created_at DESC
-            """, (datetime. now().isoformat(),))
+        now = datetime.now().isoformat()
+        params = (
+            user_data.get("id"),
+            user_data.get("phone"),
+            user_data.get("email"),
+            user_data.get("full_name"),
+            user_data.get("notifications_enabled", 1),
+            user_data.get("home_lat"),
+            user_data.get("home_lon"),
+            user_data.get("created_at", now),
+            now,
+        )
+        
+        async def write(db):
+            await db.execute(_SQL_SAVE_USER, params)
+        
+        await self.execute_write(write)
+        return True
+    
+    async def get_active_risks(
+        self, lat: float = None, lon: float = None, radius_km: float = 0
+    ) -> List[Dict]: 
+        """Получение активных рисков
+
+        Если задана точка, возвращаются только риски, зона которых содержит
+        её или пересекает круг radius_km вокруг неё.
+        """
+        sql, params = self._active_risks_query(lat, lon, radius_km)
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(sql, params)
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @staticmethod
+    def _active_risks_query(
+        lat: Optional[float], lon: Optional[float], radius_km: float
+    ) -> Tuple[str, List[Any]]:
+        """Запрос и параметры выборки активных рисков"""
+        now = datetime.now().isoformat()
+        if lat is None or lon is None:
+            return _SQL_ACTIVE_RISKS, [now]
+        
+        min_lat, max_lat, min_lon, max_lon = LocationService.get_bounding_box(
+            lat, lon, radius_km
+        )
+        lon_ranges = LocationService.split_longitude_range(min_lon, max_lon)
+        params: List[Any] = []
+        for range_min, range_max in lon_ranges:
+            params.extend((min_lat, max_lat, range_min, range_max))
+        params.extend((now, lat, lon, radius_km))
+        return _active_risks_near_sql(len(lon_ranges)), params
+    
     async def get_incidents_by_date(self, target_date: date) -> List[Dict]: 
         """Получение происшествий по дате"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT * FROM incidents 
-                WHERE incident_date = ?
-                ORDER BY created_at DESC
-            """, (target_date.isoformat(),))
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(
+                _SQL_INCIDENTS_BY_DATE, (target_date.isoformat(),)
+            )
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
     async def get_nearby_shelters(
-        self, lat: float, lon:  float, radius_km: float = 10
+        self, lat: float, lon: float, radius_km: float = 10, limit: int = 50
     ) -> List[Dict]:
-        """Получение ближайших укрытий"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            # Упрощённый запрос без расчёта расстояния
-            cursor = await db. execute("""
-                SELECT * FROM shelters 
-                WHERE is_active = 1
-                ORDER BY name
-            """)
+        """Получение ближайших укрытий, отсортированных по расстоянию
+
+        Кандидаты отбираются по R*Tree в ограничивающем прямоугольнике,
+        затем уточняются точным расстоянием по большому кругу.
+        """
+        sql, params = self._nearby_shelters_query(lat, lon, radius_km, limit)
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(sql, params)
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @staticmethod
+    def _nearby_shelters_query(
+        lat: float, lon: float, radius_km: float, limit: int
+    ) -> Tuple[str, List[Any]]:
+        """Запрос и параметры поиска укрытий в радиусе"""
+        min_lat, max_lat, min_lon, max_lon = LocationService.get_bounding_box(
+            lat, lon, radius_km
+        )
+        lon_ranges = LocationService.split_longitude_range(min_lon, max_lon)
+        params: List[Any] = [lat, lon]
+        for range_min, range_max in lon_ranges:
+            params.extend((min_lat, max_lat, range_min, range_max))
+        params.extend((radius_km, limit))
+        return _nearby_shelters_sql(len(lon_ranges)), params
+    
+    async def get_active_risk_models(
+        self, lat: float = None, lon: float = None, radius_km: float = 0
+    ) -> List[Risk]:
+        """Активные риски как модели Risk (с той же фильтрацией по точке)"""
+        sql, params = self._active_risks_query(lat, lon, radius_km)
+        return await self._fetch_models(sql, params, risk_row_factory)
+    
+    async def get_incident_models_by_date(self, target_date: date) -> List[Incident]:
+        """Происшествия за дату как модели Incident"""
+        return await self._fetch_models(
+            _SQL_INCIDENTS_BY_DATE, (target_date.isoformat(),), incident_row_factory
+        )
+    
+    async def get_nearby_shelter_models(
+        self, lat: float, lon: float, radius_km: float = 10, limit: int = 50
+    ) -> List[Tuple[Shelter, float]]:
+        """Ближайшие укрытия как пары (Shelter, расстояние в км)"""
+        sql, params = self._nearby_shelters_query(lat, lon, radius_km, limit)
+        return await self._fetch_models(
+            sql, params,
+            lambda description: shelter_row_factory(description, with_distance=True),
+        )
+    
+    def iter_active_risk_models(
+        self, batch_size: int = 500
+    ) -> AsyncIterator[List[Risk]]:
+        """Потоковое чтение активных рисков пачками моделей"""
+        return self._stream(
+            _SQL_ACTIVE_RISKS, (datetime.now().isoformat(),), batch_size,
+            row_factory=risk_row_factory,
+        )
+    
+    async def _fetch_models(
+        self,
+        sql: str,
+        params: Union[tuple, list],
+        row_factory: Callable[[Sequence[tuple]], RowFactory],
+    ) -> List[Any]:
+        """Выполнение запроса с построением моделей прямо из строк курсора"""
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(sql, params)
+            cursor.row_factory = row_factory(cursor.description)
+            return await cursor.fetchall()
+    
     async def get_unread_notifications(self, user_id: str) -> List[Dict]:
         """Получение непрочитанных уведомлений"""
-        async with aiosqlite. connect(self.db_path) as db:
-            db. row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT * FROM notifications 
-                WHERE user_id = ?  AND is_read = 0
-                ORDER BY created_at DESC
-            """, (user_id,))
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(_SQL_UNREAD_NOTIFICATIONS, (user_id,))
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    def iter_active_risks(self, batch_size: int = 500) -> AsyncIterator[List[Dict]]:
+        """Потоковое чтение активных рисков пачками"""
+        return self._stream(
+            _SQL_ACTIVE_RISKS,
+            (datetime.now().isoformat(),),
+            batch_size,
+        )
+    
+    def iter_incidents_by_date(
+        self, target_date: date, batch_size: int = 500
+    ) -> AsyncIterator[List[Dict]]:
+        """Потоковое чтение происшествий за дату пачками"""
+        return self._stream(
+            _SQL_INCIDENTS_BY_DATE,
+            (target_date.isoformat(),),
+            batch_size,
+        )
+    
+    def iter_unread_notifications(
+        self, user_id: str, batch_size: int = 500
+    ) -> AsyncIterator[List[Dict]]:
+        """Потоковое чтение непрочитанных уведомлений пачками"""
+        return self._stream(
+            _SQL_UNREAD_NOTIFICATIONS,
+            (user_id,),
+            batch_size,
+        )
+    
+    async def get_active_risks_page(
+        self, cursor: Optional[str] = None, limit: int = 50
+    ) -> Page:
+        """Страница активных рисков"""
+        return await self._page(
+            _SQL_ACTIVE_RISKS_BASE, (datetime.now().isoformat(),), cursor, limit
+        )
+    
+    async def get_incidents_page(
+        self, target_date: date, cursor: Optional[str] = None, limit: int = 50
+    ) -> Page:
+        """Страница происшествий за дату"""
+        return await self._page(
+            _SQL_INCIDENTS_BY_DATE_BASE, (target_date.isoformat(),), cursor, limit
+        )
+    
+    async def get_unread_notifications_page(
+        self, user_id: str, cursor: Optional[str] = None, limit: int = 50
+    ) -> Page:
+        """Страница непрочитанных уведомлений"""
+        return await self._page(
+            _SQL_UNREAD_NOTIFICATIONS_BASE, (user_id,), cursor, limit
+        )
+    
+    async def _stream(
+        self,
+        sql: str,
+        params: tuple,
+        batch_size: int,
+        row_factory: Optional[Callable[[Sequence[tuple]], RowFactory]] = None,
+    ) -> AsyncIterator[List[Any]]:
+        """Чтение результата запроса пачками фиксированного размера
+
+        Без row_factory строки отдаются словарями, иначе — моделями.
+        Соединение остаётся занятым, пока генератор не исчерпан или не закрыт.
+        """
+        async with self._pool.acquire() as db:
+            cursor = await db.execute(sql, params)
+            if row_factory is not None:
+                cursor.row_factory = row_factory(cursor.description)
+            try:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows if row_factory is not None else [dict(row) for row in rows]
+            finally:
+                await cursor.close()
+    
+    async def _page(
+        self, base_sql: str, params: tuple, cursor: Optional[str], limit: int
+    ) -> Page:
+        """Keyset-страница по убыванию (created_at, id)
+
+        Стоимость любой страницы одинакова: продолжение ищется по индексу
+        от ключа последней строки предыдущей страницы, без OFFSET.
+        """
+        if cursor is not None:
+            sql = _keyset_page_sql(base_sql, True)
+            params = params + _decode_cursor(cursor)
+        else:
+            sql = _keyset_page_sql(base_sql, False)
+        
+        async with self._pool.acquire() as db:
+            db_cursor = await db.execute(sql, params + (limit + 1,))
+            rows = await db_cursor.fetchall()
+        
+        next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return Page(items=[dict(row) for row in rows[:limit]], next_cursor=next_cursor)
+    
+    async def upsert_risks(
+        self,
+        items: Union[Iterable, AsyncIterable],
+        chunk_size: int = 500,
+    ) -> UpsertResult:
+        """Пакетная запись рисков (модели Risk или словари)"""
+        return await self._upsert(
+            "risks", RISK_COLUMNS, items, risk_to_record, chunk_size
+        )
+    
+    async def upsert_incidents(
+        self,
+        items: Union[Iterable, AsyncIterable],
+        chunk_size: int = 500,
+    ) -> UpsertResult:
+        """Пакетная запись происшествий (модели Incident или словари)"""
+        return await self._upsert(
+            "incidents", INCIDENT_COLUMNS, items, incident_to_record, chunk_size
+        )
+    
+    async def upsert_shelters(
+        self,
+        items: Union[Iterable, AsyncIterable],
+        chunk_size: int = 500,
+    ) -> UpsertResult:
+        """Пакетная запись укрытий (модели Shelter или словари)
+        
+        Заполненность (capacity_current) берётся из записи только для новых
+        укрытий: у существующих её ведут брони, и обновление из фида не
+        должно сбрасывать занятые места.
+        """
+        return await self._upsert(
+            "shelters", SHELTER_COLUMNS, items, shelter_to_record, chunk_size,
+            insert_only=SHELTER_INSERT_ONLY_COLUMNS,
+        )
+    
+    async def upsert_notifications(
+        self,
+        items: Union[Iterable, AsyncIterable],
+        user_id: Optional[str] = None,
+        chunk_size: int = 500,
+    ) -> UpsertResult:
+        """Пакетная запись уведомлений (модели Notification или словари)"""
+        return await self._upsert(
+            "notifications", NOTIFICATION_COLUMNS, items,
+            lambda item: notification_to_record(item, user_id), chunk_size,
+        )
+    
+    async def _upsert(
+        self,
+        table: str,
+        columns: Tuple[str, ...],
+        items: Union[Iterable, AsyncIterable],
+        to_record: Callable[[Any], Dict[str, Any]],
+        chunk_size: int,
+        insert_only: FrozenSet[str] = frozenset(),
+    ) -> UpsertResult:
+        """Пакетная вставка/обновление с пропуском неизменённых строк
+
+        Каждая пачка — одна операция писателя: сверка хешей и executemany
+        выполняются атомарно и фиксируются вместе с группой. Строки, хеш
+        содержимого которых совпадает с сохранённым, пропускаются.
+        Колонки insert_only записываются только при вставке и не входят в хеш.
+        """
+        result = UpsertResult()
+        column_list = ", ".join(columns) + ", content_hash"
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        assignments = ", ".join(
+            f"{column} = excluded.{column}"
+            for column in columns
+            if column not in ("id", "created_at") and column not in insert_only
+        )
+        hash_excluded = HASH_EXCLUDED_COLUMNS | insert_only
+        upsert_sql = f"""
+            INSERT INTO {table} ({column_list}) VALUES ({placeholders})
+            ON CONFLICT(id) DO UPDATE SET {assignments},
+                content_hash = excluded.content_hash
+        """
+        created_at_index = columns.index("created_at")
+        
+        async def write_chunk(db, rows: Dict[Any, Tuple[tuple, str]]):
+            cursor = await db.execute(_hash_lookup_sql(table, len(rows)), list(rows))
+            existing = {r["id"]: r["content_hash"] for r in await cursor.fetchall()}
+            
+            now = datetime.now().isoformat()
+            changed = []
+            counts = UpsertResult()
+            for row_id, (row, content_hash) in rows.items():
+                if row_id in existing:
+                    if existing[row_id] == content_hash:
+                        counts.unchanged += 1
+                        continue
+                    counts.updated += 1
+                else:
+                    counts.inserted += 1
+                if row[created_at_index] is None:
+                    row = row[:created_at_index] + (now,) + row[created_at_index + 1:]
+                changed.append(row + (content_hash,))
+            
+            if changed:
+                await db.executemany(upsert_sql, changed)
+            return counts
+        
+        async for chunk in _iter_chunks(items, chunk_size):
+            # Последняя версия записи в пачке побеждает
+            rows: Dict[Any, Tuple[tuple, str]] = {}
+            for item in chunk:
+                row, content_hash = record_to_row(to_record(item), columns, hash_excluded)
+                rows[row[0]] = (row, content_hash)
+            
+            counts = await self.execute_write(
+                lambda db, rows=rows: write_chunk(db, rows)
+            )
+            result.inserted += counts.inserted
+            result.updated += counts.updated
+            result.unchanged += counts.unchanged
+        return result
+    
+    async def get_shelter_occupancy(
+        self, shelter_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Заполненность и версии укрытий (всех или по списку ID)"""
+        if shelter_ids is not None and not shelter_ids:
+            return []
+        rows = []
+        async with self._pool.acquire() as db:
+            if shelter_ids is None:
+                cursor = await db.execute(_SQL_SHELTER_OCCUPANCY)
+                rows.extend(await cursor.fetchall())
+            else:
+                for start in range(0, len(shelter_ids), 500):
+                    chunk = shelter_ids[start:start + 500]
+                    cursor = await db.execute(
+                        _shelter_occupancy_by_id_sql(len(chunk)), chunk
+                    )
+                    rows.extend(await cursor.fetchall())
+        return [dict(row) for row in rows]
+    
+    async def reserve_shelter_places(self, reservation: Reservation) -> Dict[str, Any]:
+        """Атомарное занятие мест и запись брони
+
+        Возвращает заполненность укрытия после брони. ShelterFullError —
+        свободных мест не хватает, ReservationError — укрытие не найдено,
+        не активно или его вместимость неизвестна.
+        """
+        async def write(db):
+            cursor = await db.execute(_SQL_RESERVE_SHELTER, (
+                reservation.people, reservation.shelter_id, reservation.people,
+            ))
+            row = await cursor.fetchone()
+            if row is None:
+                cursor = await db.execute(
+                    _shelter_occupancy_by_id_sql(1), (reservation.shelter_id,)
+                )
+                current = await cursor.fetchone()
+                if current is None or not current["is_active"]:
+                    raise ReservationError(
+                        f"Укрытие {reservation.shelter_id} не найдено или не активно"
+                    )
+                # Без известной вместимости переполнение не проверить
+                if current["capacity_total"] is None:
+                    raise ReservationError(
+                        f"Вместимость укрытия {reservation.shelter_id} неизвестна"
+                    )
+                raise ShelterFullError(
+                    f"В укрытии {reservation.shelter_id} свободно "
+                    f"{current['capacity_total'] - (current['capacity_current'] or 0)} мест"
+                )
+            await db.execute(_SQL_INSERT_RESERVATION, (
+                reservation.id, reservation.shelter_id, reservation.people,
+                reservation.status, reservation.created_at, reservation.expires_at,
+            ))
+            return dict(row)
+        
+        return await self.execute_write(write)
+    
+    async def confirm_shelter_reservation(
+        self, reservation_id: str, now: str
+    ) -> Reservation:
+        """Подтверждение удерживаемой и не истёкшей брони"""
+        async def write(db):
+            cursor = await db.execute(_SQL_CONFIRM_RESERVATION, (reservation_id, now))
+            row = await cursor.fetchone()
+            if row is None:
+                raise ReservationNotFoundError(f"Бронь {reservation_id} не удерживается")
+            return Reservation(**dict(row))
+        
+        return await self.execute_write(write)
+    
+    async def release_shelter_reservation(
+        self, reservation_id: str
+    ) -> Tuple[Reservation, Dict[str, Any]]:
+        """Снятие брони и возврат мест; возвращает бронь и заполненность"""
+        async def write(db):
+            cursor = await db.execute(_SQL_RELEASE_RESERVATION, (reservation_id,))
+            row = await cursor.fetchone()
+            if row is None:
+                raise ReservationNotFoundError(f"Бронь {reservation_id} не активна")
+            reservation = Reservation(**dict(row))
+            cursor = await db.execute(
+                _SQL_RETURN_SHELTER_PLACES, (reservation.people, reservation.shelter_id)
+            )
+            return reservation, dict(await cursor.fetchone())
+        
+        return await self.execute_write(write)
+    
+    async def expire_shelter_reservations(
+        self, now: str
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Снятие просроченных удержаний
+
+        Возвращает число снятых броней и заполненность затронутых укрытий.
+        """
+        async def write(db):
+            cursor = await db.execute(_SQL_EXPIRE_RESERVATIONS, (now,))
+            released: Dict[str, int] = {}
+            expired = 0
+            for row in await cursor.fetchall():
+                released[row["shelter_id"]] = released.get(row["shelter_id"], 0) + row["people"]
+                expired += 1
+            rows = []
+            for shelter_id, people in released.items():
+                cursor = await db.execute(_SQL_RETURN_SHELTER_PLACES, (people, shelter_id))
+                row = await cursor.fetchone()
+                if row is not None:
+                    rows.append(dict(row))
+            return expired, rows
+        
+        return await self.execute_write(write)
+    
+    async def update_shelter_capacity(
+        self, shelter_id: str, total: int, expected_version: int
+    ) -> Dict[str, Any]:
+        """Изменение вместимости с проверкой версии строки"""
+        async def write(db):
+            cursor = await db.execute(
+                _SQL_SET_SHELTER_CAPACITY, (total, shelter_id, expected_version)
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                raise VersionConflictError(
+                    f"Укрытие {shelter_id} изменено (ожидалась версия {expected_version})"
+                )
+            return dict(row)
+        
+        return await self.execute_write(write)
+    
+    async def iter_users_in_risk_zones(
+        self,
+        risk_ids: Optional[Iterable[str]] = None,
+        user_ids: Optional[Iterable[str]] = None,
+        batch_size: int = 20000,
+    ) -> AsyncIterator[List[Tuple[str, str]]]:
+        """Сопоставление домашних адресов пользователей с зонами активных рисков
+
+        Отдаёт пачки пар (user_id, risk_id). Без аргументов все пользователи
+        читаются пачками по batch_size и сверяются с зонами, разложенными
+        по сетке ZoneMatcher. С risk_ids пересчитываются только эти риски:
+        кандидаты берутся из R*Tree домашних адресов по прямоугольнику
+        зоны. С user_ids пересчитываются только эти пользователи: риски
+        ищутся по R*Tree зон (если задан и risk_ids — только среди них).
+        """
+        if user_ids is not None:
+            wanted = set(risk_ids) if risk_ids is not None else None
+            async for pairs in self._match_users(list(user_ids), wanted, batch_size):
+                yield pairs
+            return
+        
+        if risk_ids is not None:
+            risks = await self._get_active_risk_models_by_id(list(risk_ids))
+            async for pairs in self._match_risks(risks, batch_size):
+                yield pairs
+            return
+        
+        matcher = ZoneMatcher()
+        for risk in await self.get_active_risk_models():
+            matcher.add(risk.id, risk.zone)
+        if not len(matcher):
+            return
+        async for rows in self._stream(_SQL_USER_HOMES, (), batch_size):
+            lats = [row["home_lat"] for row in rows]
+            lons = [row["home_lon"] for row in rows]
+            pairs = [
+                (rows[i]["id"], risk_id) for i, risk_id in matcher.match_pairs(lats, lons)
+            ]
+            if pairs:
+                yield pairs
+    
+    async def _get_active_risk_models_by_id(self, risk_ids: List[str]) -> List[Risk]:
+        """Активные риски по списку id как модели"""
+        risks: List[Risk] = []
+        now = datetime.now().isoformat()
+        for start in range(0, len(risk_ids), 500):
+            chunk = risk_ids[start:start + 500]
+            risks.extend(await self._fetch_models(
+                _active_risks_by_id_sql(len(chunk)), (*chunk, now), risk_row_factory
+            ))
+        return risks
+    
+    async def _match_risks(
+        self, risks: List[Risk], batch_size: int
+    ) -> AsyncIterator[List[Tuple[str, str]]]:
+        """Пары (user_id, risk_id) для отдельных рисков по R*Tree пользователей"""
+        pairs: List[Tuple[str, str]] = []
+        for risk in risks:
+            zone = PreparedZone(risk.zone)
+            lon_ranges = LocationService.split_longitude_range(zone.min_lon, zone.max_lon)
+            params: List[Any] = []
+            for range_min, range_max in lon_ranges:
+                params.extend((zone.min_lat, zone.max_lat, range_min, range_max))
+            async with self._pool.acquire() as db:
+                cursor = await db.execute(_users_in_bbox_sql(len(lon_ranges)), params)
+                rows = await cursor.fetchall()
+            if not rows:
+                continue
+            inside = zone.contains_many(
+                [row["home_lat"] for row in rows], [row["home_lon"] for row in rows]
+            )
+            pairs.extend((row["id"], risk.id) for row, hit in zip(rows, inside) if hit)
+            while len(pairs) >= batch_size:
+                yield pairs[:batch_size]
+                pairs = pairs[batch_size:]
+        if pairs:
+            yield pairs
+    
+    async def _match_users(
+        self, user_ids: List[str], risk_ids: Optional[set], batch_size: int
+    ) -> AsyncIterator[List[Tuple[str, str]]]:
+        """Пары (user_id, risk_id) для отдельных пользователей по R*Tree рисков"""
+        pairs: List[Tuple[str, str]] = []
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            async with self._pool.acquire() as db:
+                cursor = await db.execute(_user_homes_by_id_sql(len(chunk)), chunk)
+                homes = await cursor.fetchall()
+            for home in homes:
+                sql, params = self._active_risks_query(home["home_lat"], home["home_lon"], 0)
+                async with self._pool.acquire() as db:
+                    cursor = await db.execute(sql, params)
+                    rows = await cursor.fetchall()
+                pairs.extend(
+                    (home["id"], row["id"]) for row in rows
+                    if risk_ids is None or row["id"] in risk_ids
+                )
+            if len(pairs) >= batch_size:
+                yield pairs
+                pairs = []
+        if pairs:
+            yield pairs
+    
+    async def get_incident_summary_for_month(
+        self, year: int, month: int, region: Optional[str] = None
+    ) -> Dict[int, List[Dict]]:
+        """Сводка происшествий за месяц для календаря
+
+        Читает дневные агрегаты одним диапазонным запросом. Для каждого дня
+        возвращает список {"type", "count", "severity"}, где severity —
+        максимальная тяжесть происшествий этого типа за день.
+        """
+        start, end = _month_bounds(year, month)
+        async with self._pool.acquire() as db:
+            if region is None:
+                cursor = await db.execute(_SQL_INCIDENT_MONTH_SUMMARY, (start, end))
+            else:
+                cursor = await db.execute(
+                    _SQL_INCIDENT_MONTH_SUMMARY_REGION, (region, start, end)
+                )
+            rows = await cursor.fetchall()
+        
+        by_day: Dict[int, Dict[str, Dict]] = {}
+        for row in rows:
+            day = int(row["day"][8:10])
+            types = by_day.setdefault(day, {})
+            entry = types.get(row["incident_type"])
+            if entry is None:
+                entry = types[row["incident_type"]] = {
+                    "type": row["incident_type"],
+                    "count": 0,
+                    "severity": row["severity"],
+                }
+            entry["count"] += row["count"]
+            if _SEVERITY_RANK.get(row["severity"], 0) > _SEVERITY_RANK.get(entry["severity"], 0):
+                entry["severity"] = row["severity"]
+        
+        return {
+            day: sorted(types.values(), key=lambda e: e["count"], reverse=True)
+            for day, types in sorted(by_day.items())
+        }
+    
     def get_mock_incidents_for_month(self, year: int, month:  int) -> Dict[int, List]: 
         """Получение моковых данных о происшествиях за месяц"""
         # Моковые данные для демонстрации
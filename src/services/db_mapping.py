@@ -0,0 +1,330 @@
+"""Отображение моделей на строки таблиц базы данных"""
+
+import hashlib
+import json
+from datetime import datetime, date
+from enum import Enum
+from typing import Any, Callable, Dict, FrozenSet, Optional, Sequence, Tuple, Union
+
+from src.models.incident import Incident, IncidentLocation
+from src.models.risk import Risk, RiskLevel, RiskType, RiskZone
+from src.models.shelter import Shelter, ShelterCapacity, ShelterLocation
+from src.services.location_service import LocationService
+from src.services.notification_service import Notification
+
+
+RowFactory = Callable[[Any, tuple], Any]
+
+
+# Колонки таблиц в порядке вставки; id всегда первый
+RISK_COLUMNS = (
+    "id", "type", "level", "title", "description", "lat", "lon",
+    "radius_km", "polygon", "min_lat", "max_lat", "min_lon", "max_lon",
+    "start_time", "end_time", "source", "created_at",
+)
+INCIDENT_COLUMNS = (
+    "id", "title", "description", "incident_type", "lat", "lon",
+    "address", "region", "is_active", "severity", "incident_date", "created_at",
+)
+SHELTER_COLUMNS = (
+    "id", "name", "shelter_type", "lat", "lon", "address",
+    "capacity_total", "capacity_current", "is_active", "phone", "created_at",
+)
+NOTIFICATION_COLUMNS = (
+    "id", "user_id", "title", "message", "type", "is_read", "created_at",
+)
+
+# Колонки, не влияющие на хеш содержимого
+HASH_EXCLUDED_COLUMNS = frozenset(("id", "created_at"))
+
+# Колонки, которые пакетная запись задаёт только при вставке: заполненность
+# укрытия дальше меняют только брони
+SHELTER_INSERT_ONLY_COLUMNS = frozenset(("capacity_current",))
+
+
+def _to_db_value(value: Any) -> Any:
+    """Приведение значения к типу, поддерживаемому SQLite"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def encode_polygon(polygon: Optional[list]) -> Optional[str]:
+    """Многоугольник зоны в JSON"""
+    if not polygon:
+        return None
+    return json.dumps([[point[0], point[1]] for point in polygon])
+
+
+def decode_polygon(value: Optional[str]) -> Optional[list]:
+    """Многоугольник зоны из JSON"""
+    if not value:
+        return None
+    return [tuple(point) for point in json.loads(value)]
+
+
+def risk_zone_bounds(
+    lat: float, lon: float, radius_km: float, polygon: Optional[list]
+) -> Dict[str, float]:
+    """Колонки ограничивающего прямоугольника зоны риска"""
+    min_lat, max_lat, min_lon, max_lon = LocationService.get_zone_bounding_box(
+        RiskZone(latitude=lat, longitude=lon, radius_km=radius_km or 0, polygon=polygon)
+    )
+    return {"min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon}
+
+
+def _enum_value(enum: type, value: Any, column: str) -> str:
+    """Значение перечисления для колонки; ValueError, если значение неизвестно"""
+    try:
+        return enum(value.value if isinstance(value, Enum) else value).value
+    except ValueError:
+        raise ValueError(f"Недопустимое значение колонки {column}: {value!r}") from None
+
+
+def risk_to_record(item: Union[Risk, Dict[str, Any]]) -> Dict[str, Any]:
+    """Риск в запись таблицы risks
+
+    Многоугольник приводится к JSON; ограничивающий прямоугольник зоны
+    вычисляется здесь, если его нет в переданной записи. Тип и уровень
+    записи-словаря проверяются: неизвестное значение (ValueError) не
+    попадает в базу, где сломало бы чтение моделей.
+    """
+    if isinstance(item, dict):
+        polygon = item.get("polygon")
+        if isinstance(polygon, str):
+            record = dict(item)
+            polygon = decode_polygon(polygon)
+        else:
+            record = {**item, "polygon": encode_polygon(polygon)}
+        record["type"] = _enum_value(RiskType, record.get("type"), "type")
+        record["level"] = _enum_value(RiskLevel, record.get("level"), "level")
+        if record.get("min_lat") is None and record.get("lat") is not None:
+            record.update(
+                risk_zone_bounds(record["lat"], record["lon"], record.get("radius_km"), polygon)
+            )
+        return record
+    zone = item.zone
+    return {
+        "id": item.id,
+        "type": item.type,
+        "level": item.level,
+        "title": item.title,
+        "description": item.description,
+        "lat": zone.latitude,
+        "lon": zone.longitude,
+        "radius_km": zone.radius_km,
+        "polygon": encode_polygon(zone.polygon),
+        **risk_zone_bounds(zone.latitude, zone.longitude, zone.radius_km, zone.polygon),
+        "start_time": item.start_time,
+        "end_time": item.end_time,
+        "source": item.source,
+        "created_at": item.created_at,
+    }
+
+
+def incident_to_record(item: Union[Incident, Dict[str, Any]]) -> Dict[str, Any]:
+    """Происшествие в запись таблицы incidents"""
+    if isinstance(item, dict):
+        return item
+    return {
+        "id": item.id,
+        "title": item.title,
+        "description": item.description,
+        "incident_type": item.incident_type,
+        "lat": item.location.latitude,
+        "lon": item.location.longitude,
+        "address": item.location.address,
+        "region": item.location.region,
+        "is_active": item.is_active,
+        "severity": item.severity,
+        "incident_date": item.incident_date,
+        "created_at": item.reported_at,
+    }
+
+
+def shelter_to_record(item: Union[Shelter, Dict[str, Any]]) -> Dict[str, Any]:
+    """Укрытие в запись таблицы shelters"""
+    if isinstance(item, dict):
+        return item
+    return {
+        "id": item.id,
+        "name": item.name,
+        "shelter_type": item.shelter_type,
+        "lat": item.location.latitude,
+        "lon": item.location.longitude,
+        "address": item.location.address,
+        "capacity_total": item.capacity.total,
+        "capacity_current": item.capacity.current,
+        "is_active": item.is_active,
+        "phone": item.phone,
+        "created_at": item.last_verified,
+    }
+
+
+def notification_to_record(
+    item: Union[Notification, Dict[str, Any]], user_id: str = None
+) -> Dict[str, Any]:
+    """Уведомление в запись таблицы notifications"""
+    if isinstance(item, dict):
+        if user_id is not None and item.get("user_id") is None:
+            return {**item, "user_id": user_id}
+        return item
+    return {
+        "id": item.id,
+        "user_id": user_id,
+        "title": item.title,
+        "message": item.message,
+        "type": item.type,
+        "is_read": item.is_read,
+        "created_at": item.created_at,
+    }
+
+
+def record_to_row(
+    record: Dict[str, Any],
+    columns: Tuple[str, ...],
+    hash_excluded: FrozenSet[str] = HASH_EXCLUDED_COLUMNS,
+) -> Tuple[tuple, str]:
+    """Запись в кортеж значений колонок и хеш содержимого"""
+    row = tuple(_to_db_value(record.get(column)) for column in columns)
+    hashed = [
+        value for column, value in zip(columns, row)
+        if column not in hash_excluded
+    ]
+    payload = json.dumps(hashed, ensure_ascii=False, default=str)
+    content_hash = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    return row, content_hash
+
+
+# Фабрики строк: таблица -> модель без промежуточных словарей.
+# Индексы колонок вычисляются один раз по описанию курсора, после чего
+# фабрика обращается к кортежу строки по готовым позициям.
+
+_RISK_TYPES = {member.value: member for member in RiskType}
+_RISK_LEVELS = {member.value: member for member in RiskLevel}
+_parse_datetime = datetime.fromisoformat
+_parse_date = date.fromisoformat
+
+
+def _column_index(description: Sequence[tuple]) -> Dict[str, int]:
+    """Позиции колонок по описанию курсора"""
+    return {column[0]: i for i, column in enumerate(description)}
+
+
+def _optional(index: Dict[str, int], column: str) -> Callable[[tuple], Any]:
+    """Чтение необязательной колонки"""
+    i = index.get(column)
+    if i is None:
+        return lambda row: None
+    return lambda row: row[i]
+
+
+def risk_row_factory(description: Sequence[tuple]) -> RowFactory:
+    """Фабрика моделей Risk для результата запроса к risks"""
+    index = _column_index(description)
+    i_id, i_type, i_level = index["id"], index["type"], index["level"]
+    i_title, i_description = index["title"], index["description"]
+    i_lat, i_lon, i_radius = index["lat"], index["lon"], index["radius_km"]
+    polygon = _optional(index, "polygon")
+    i_start, i_end = index["start_time"], index["end_time"]
+    i_source, i_created = index["source"], index["created_at"]
+    types, levels, parse = _RISK_TYPES, _RISK_LEVELS, _parse_datetime
+
+    def factory(cursor, row):
+        start, end, created = row[i_start], row[i_end], row[i_created]
+        created_at = parse(created) if created else datetime.now()
+        return Risk(
+            id=row[i_id],
+            type=types[row[i_type]],
+            level=levels[row[i_level]],
+            title=row[i_title],
+            description=row[i_description],
+            zone=RiskZone(
+                latitude=row[i_lat],
+                longitude=row[i_lon],
+                radius_km=row[i_radius],
+                polygon=decode_polygon(polygon(row)),
+            ),
+            start_time=parse(start) if start else None,
+            end_time=parse(end) if end else None,
+            source=row[i_source],
+            created_at=created_at,
+            updated_at=created_at,
+        )
+    return factory
+
+
+def incident_row_factory(description: Sequence[tuple]) -> RowFactory:
+    """Фабрика моделей Incident для результата запроса к incidents"""
+    index = _column_index(description)
+    i_id, i_title = index["id"], index["title"]
+    i_description, i_type = index["description"], index["incident_type"]
+    i_lat, i_lon, i_address = index["lat"], index["lon"], index["address"]
+    i_active, i_severity = index["is_active"], index["severity"]
+    i_date, i_created = index["incident_date"], index["created_at"]
+    region = _optional(index, "region")
+    parse, parse_date = _parse_datetime, _parse_date
+
+    def factory(cursor, row):
+        incident_date, created = row[i_date], row[i_created]
+        return Incident(
+            id=row[i_id],
+            title=row[i_title],
+            description=row[i_description],
+            incident_type=row[i_type],
+            location=IncidentLocation(
+                latitude=row[i_lat],
+                longitude=row[i_lon],
+                address=row[i_address],
+                region=region(row),
+            ),
+            is_active=bool(row[i_active]),
+            severity=row[i_severity],
+            incident_date=parse_date(incident_date[:10]) if incident_date else date.today(),
+            reported_at=parse(created) if created else datetime.now(),
+        )
+    return factory
+
+
+def shelter_row_factory(
+    description: Sequence[tuple], with_distance: bool = False
+) -> RowFactory:
+    """Фабрика моделей Shelter для результата запроса к shelters
+
+    С with_distance фабрика возвращает пары (Shelter, distance_km).
+    """
+    index = _column_index(description)
+    i_id, i_name, i_type = index["id"], index["name"], index["shelter_type"]
+    i_lat, i_lon, i_address = index["lat"], index["lon"], index["address"]
+    i_total, i_current = index["capacity_total"], index["capacity_current"]
+    i_active, i_phone, i_created = index["is_active"], index["phone"], index["created_at"]
+    i_distance = index["distance_km"] if with_distance else None
+    parse = _parse_datetime
+
+    def factory(cursor, row):
+        created = row[i_created]
+        shelter = Shelter(
+            id=row[i_id],
+            name=row[i_name],
+            shelter_type=row[i_type],
+            location=ShelterLocation(
+                latitude=row[i_lat],
+                longitude=row[i_lon],
+                address=row[i_address],
+            ),
+            capacity=ShelterCapacity(
+                total=row[i_total] or 0,
+                current=row[i_current] or 0,
+            ),
+            is_active=bool(row[i_active]),
+            phone=row[i_phone],
+            last_verified=parse(created) if created else datetime.now(),
+        )
+        if i_distance is None:
+            return shelter
+        return shelter, row[i_distance]
+    return factory
@@ -0,0 +1,569 @@
+"""Версионные миграции схемы базы данных"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, List, Dict, Tuple, Callable, Awaitable, Sequence, Collection
+from src.services.db_mapping import decode_polygon, risk_zone_bounds
+
+
+@dataclass
+class Migration:
+    """Миграция схемы
+
+    Выполняет необязательную функцию apply (например, добавление колонок),
+    затем SQL-выражения statements.
+    Миграции должны быть идемпотентными для баз, созданных до появления
+    учёта версий.
+    """
+    version: int
+    description: str
+    statements: Tuple[str, ...] = ()
+    apply: Optional[Callable[..., Awaitable[None]]] = None
+
+
+async def ensure_column(db, table: str, column: str, column_type: str):
+    """Добавление колонки, если её нет в таблице"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = {row[1] for row in await cursor.fetchall()}
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+async def _add_content_hashes(db):
+    """Колонки хешей содержимого для пакетной записи"""
+    for table in ("risks", "incidents", "shelters", "notifications"):
+        await ensure_column(db, table, "content_hash", "TEXT")
+
+
+async def _add_incident_region(db):
+    """Регион происшествия для дневных агрегатов"""
+    await ensure_column(db, "incidents", "region", "TEXT")
+
+
+async def _add_risk_bounds(db):
+    """Многоугольник и ограничивающий прямоугольник зоны риска"""
+    await ensure_column(db, "risks", "polygon", "TEXT")
+    for column in ("min_lat", "max_lat", "min_lon", "max_lon"):
+        await ensure_column(db, "risks", column, "REAL")
+
+    cursor = await db.execute(
+        "SELECT rowid, lat, lon, radius_km, polygon FROM risks "
+        "WHERE min_lat IS NULL AND lat IS NOT NULL AND lon IS NOT NULL"
+    )
+    updates = []
+    for rowid, lat, lon, radius_km, polygon in await cursor.fetchall():
+        bounds = risk_zone_bounds(lat, lon, radius_km, decode_polygon(polygon))
+        updates.append((
+            bounds["min_lat"], bounds["max_lat"],
+            bounds["min_lon"], bounds["max_lon"], rowid,
+        ))
+    if updates:
+        await db.executemany(
+            "UPDATE risks SET min_lat = ?, max_lat = ?, min_lon = ?, max_lon = ? "
+            "WHERE rowid = ?",
+            updates,
+        )
+
+
+
+async def _add_shelter_version(db):
+    """Версия строки укрытия для оптимистичных обновлений"""
+    await ensure_column(db, "shelters", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        description="Базовые таблицы",
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id TEXT PRIMARY KEY,
+                phone TEXT,
+                email TEXT,
+                full_name TEXT,
+                notifications_enabled INTEGER DEFAULT 1,
+                home_lat REAL,
+                home_lon REAL,
+                created_at TEXT,
+                updated_at TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS risks (
+                id TEXT PRIMARY KEY,
+                type TEXT,
+                level TEXT,
+                title TEXT,
+                description TEXT,
+                lat REAL,
+                lon REAL,
+                radius_km REAL,
+                start_time TEXT,
+                end_time TEXT,
+                source TEXT,
+                created_at TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS incidents (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                description TEXT,
+                incident_type TEXT,
+                lat REAL,
+                lon REAL,
+                address TEXT,
+                is_active INTEGER,
+                severity TEXT,
+                incident_date TEXT,
+                created_at TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS shelters (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                shelter_type TEXT,
+                lat REAL,
+                lon REAL,
+                address TEXT,
+                capacity_total INTEGER,
+                capacity_current INTEGER,
+                is_active INTEGER,
+                phone TEXT,
+                created_at TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS notifications (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                title TEXT,
+                message TEXT,
+                type TEXT,
+                is_read INTEGER DEFAULT 0,
+                created_at TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        version=2,
+        description="R*Tree-индекс укрытий",
+        statements=(
+            # Точки хранятся как вырожденные прямоугольники
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS shelters_rtree USING rtree(
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS shelters_rtree_insert
+            AFTER INSERT ON shelters
+            WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO shelters_rtree
+                VALUES (NEW.rowid, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS shelters_rtree_update
+            AFTER UPDATE OF lat, lon ON shelters
+            BEGIN
+                DELETE FROM shelters_rtree WHERE id = OLD.rowid;
+                INSERT INTO shelters_rtree
+                SELECT NEW.rowid, NEW.lat, NEW.lat, NEW.lon, NEW.lon
+                WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS shelters_rtree_delete
+            AFTER DELETE ON shelters
+            BEGIN
+                DELETE FROM shelters_rtree WHERE id = OLD.rowid;
+            END
+            """,
+            """
+            INSERT OR IGNORE INTO shelters_rtree
+            SELECT rowid, lat, lat, lon, lon FROM shelters
+            WHERE lat IS NOT NULL AND lon IS NOT NULL
+            """,
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Хеши содержимого",
+        apply=_add_content_hashes,
+    ),
+    Migration(
+        version=4,
+        description="Индексы горячих запросов",
+        statements=(
+            """
+            CREATE INDEX IF NOT EXISTS idx_incidents_date
+            ON incidents (incident_date, created_at)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_notifications_unread
+            ON notifications (user_id, is_read, created_at)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_risks_end_time
+            ON risks (end_time)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_shelters_active
+            ON shelters (is_active, name)
+            """,
+            # Покрывающие индексы для сверки хешей при пакетной записи
+            """
+            CREATE INDEX IF NOT EXISTS idx_risks_hash
+            ON risks (id, content_hash)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_incidents_hash
+            ON incidents (id, content_hash)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_shelters_hash
+            ON shelters (id, content_hash)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_notifications_hash
+            ON notifications (id, content_hash)
+            """,
+        ),
+    ),
+    Migration(
+        version=5,
+        description="Дневные агрегаты происшествий",
+        apply=_add_incident_region,
+        statements=(
+            # Счётчики по дню, региону, типу и тяжести; максимальная тяжесть
+            # за день выводится из ненулевых счётчиков, поэтому удаление
+            # происшествия обрабатывается инкрементально
+            """
+            CREATE TABLE IF NOT EXISTS incident_daily_counts (
+                day TEXT NOT NULL,
+                region TEXT NOT NULL,
+                incident_type TEXT NOT NULL,
+                severity TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, region, incident_type, severity)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_incident_daily_counts_region
+            ON incident_daily_counts (region, day)
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS incident_daily_counts_insert
+            AFTER INSERT ON incidents
+            WHEN NEW.incident_date IS NOT NULL
+            BEGIN
+                INSERT INTO incident_daily_counts
+                    (day, region, incident_type, severity, count)
+                VALUES (
+                    NEW.incident_date, COALESCE(NEW.region, ''),
+                    COALESCE(NEW.incident_type, ''), COALESCE(NEW.severity, ''), 1
+                )
+                ON CONFLICT (day, region, incident_type, severity)
+                DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS incident_daily_counts_delete
+            AFTER DELETE ON incidents
+            WHEN OLD.incident_date IS NOT NULL
+            BEGIN
+                UPDATE incident_daily_counts SET count = count - 1
+                WHERE day = OLD.incident_date
+                  AND region = COALESCE(OLD.region, '')
+                  AND incident_type = COALESCE(OLD.incident_type, '')
+                  AND severity = COALESCE(OLD.severity, '');
+                DELETE FROM incident_daily_counts
+                WHERE day = OLD.incident_date
+                  AND region = COALESCE(OLD.region, '')
+                  AND incident_type = COALESCE(OLD.incident_type, '')
+                  AND severity = COALESCE(OLD.severity, '')
+                  AND count <= 0;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS incident_daily_counts_update
+            AFTER UPDATE OF incident_date, region, incident_type, severity ON incidents
+            BEGIN
+                UPDATE incident_daily_counts SET count = count - 1
+                WHERE day = OLD.incident_date
+                  AND region = COALESCE(OLD.region, '')
+                  AND incident_type = COALESCE(OLD.incident_type, '')
+                  AND severity = COALESCE(OLD.severity, '');
+                DELETE FROM incident_daily_counts
+                WHERE day = OLD.incident_date
+                  AND region = COALESCE(OLD.region, '')
+                  AND incident_type = COALESCE(OLD.incident_type, '')
+                  AND severity = COALESCE(OLD.severity, '')
+                  AND count <= 0;
+                INSERT INTO incident_daily_counts
+                    (day, region, incident_type, severity, count)
+                SELECT
+                    NEW.incident_date, COALESCE(NEW.region, ''),
+                    COALESCE(NEW.incident_type, ''), COALESCE(NEW.severity, ''), 1
+                WHERE NEW.incident_date IS NOT NULL
+                ON CONFLICT (day, region, incident_type, severity)
+                DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            INSERT OR REPLACE INTO incident_daily_counts
+                (day, region, incident_type, severity, count)
+            SELECT
+                incident_date, COALESCE(region, ''),
+                COALESCE(incident_type, ''), COALESCE(severity, ''), COUNT(*)
+            FROM incidents
+            WHERE incident_date IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+            """,
+        ),
+    ),
+    Migration(
+        version=6,
+        description="Индексы keyset-пагинации",
+        statements=(
+            # id замыкает ключ сортировки, чтобы курсор (created_at, id)
+            # был однозначным и искался по индексу
+            """
+            CREATE INDEX IF NOT EXISTS idx_risks_created
+            ON risks (created_at, id)
+            """,
+            "DROP INDEX IF EXISTS idx_incidents_date",
+            """
+            CREATE INDEX IF NOT EXISTS idx_incidents_date_created
+            ON incidents (incident_date, created_at, id)
+            """,
+            "DROP INDEX IF EXISTS idx_notifications_unread",
+            """
+            CREATE INDEX IF NOT EXISTS idx_notifications_unread_created
+            ON notifications (user_id, is_read, created_at, id)
+            """,
+        ),
+    ),
+    Migration(
+        version=7,
+        description="R*Tree-индекс зон рисков",
+        apply=_add_risk_bounds,
+        statements=(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS risks_rtree USING rtree(
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS risks_rtree_insert
+            AFTER INSERT ON risks
+            WHEN NEW.min_lat IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO risks_rtree
+                VALUES (NEW.rowid, NEW.min_lat, NEW.max_lat, NEW.min_lon, NEW.max_lon);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS risks_rtree_update
+            AFTER UPDATE OF min_lat, max_lat, min_lon, max_lon ON risks
+            BEGIN
+                DELETE FROM risks_rtree WHERE id = OLD.rowid;
+                INSERT INTO risks_rtree
+                SELECT NEW.rowid, NEW.min_lat, NEW.max_lat, NEW.min_lon, NEW.max_lon
+                WHERE NEW.min_lat IS NOT NULL;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS risks_rtree_delete
+            AFTER DELETE ON risks
+            BEGIN
+                DELETE FROM risks_rtree WHERE id = OLD.rowid;
+            END
+            """,
+            """
+            INSERT OR IGNORE INTO risks_rtree
+            SELECT rowid, min_lat, max_lat, min_lon, max_lon FROM risks
+            WHERE min_lat IS NOT NULL
+            """,
+        ),
+    ),
+    Migration(
+        version=8,
+        description="R*Tree-индекс домашних адресов пользователей",
+        statements=(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_rtree USING rtree(
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS users_rtree_insert
+            AFTER INSERT ON users
+            WHEN NEW.home_lat IS NOT NULL AND NEW.home_lon IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO users_rtree
+                VALUES (NEW.rowid, NEW.home_lat, NEW.home_lat, NEW.home_lon, NEW.home_lon);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS users_rtree_update
+            AFTER UPDATE OF home_lat, home_lon ON users
+            BEGIN
+                DELETE FROM users_rtree WHERE id = OLD.rowid;
+                INSERT INTO users_rtree
+                SELECT NEW.rowid, NEW.home_lat, NEW.home_lat, NEW.home_lon, NEW.home_lon
+                WHERE NEW.home_lat IS NOT NULL AND NEW.home_lon IS NOT NULL;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS users_rtree_delete
+            AFTER DELETE ON users
+            BEGIN
+                DELETE FROM users_rtree WHERE id = OLD.rowid;
+            END
+            """,
+            """
+            INSERT OR IGNORE INTO users_rtree
+            SELECT rowid, home_lat, home_lat, home_lon, home_lon FROM users
+            WHERE home_lat IS NOT NULL AND home_lon IS NOT NULL
+            """,
+        ),
+    ),
+    Migration(
+        version=9,
+        description="Бронирование мест в укрытиях",
+        apply=_add_shelter_version,
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS shelter_reservations (
+                id TEXT PRIMARY KEY,
+                shelter_id TEXT NOT NULL,
+                people INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT,
+                expires_at TEXT,
+                FOREIGN KEY (shelter_id) REFERENCES shelters (id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_shelter_reservations_expiry
+            ON shelter_reservations (status, expires_at)
+            """,
+            # Любое изменение вместимости (в том числе пакетной записью)
+            # меняет версию, если запрос не сделал этого сам
+            """
+            CREATE TRIGGER IF NOT EXISTS shelters_version_bump
+            AFTER UPDATE OF capacity_total, capacity_current, is_active ON shelters
+            WHEN NEW.version = OLD.version
+            BEGIN
+                UPDATE shelters SET version = OLD.version + 1 WHERE rowid = NEW.rowid;
+            END
+            """,
+        ),
+    ),
+]
+
+
+async def get_schema_version(db) -> int:
+    """Текущая версия схемы"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+    cursor = await db.execute("SELECT MAX(version) FROM schema_migrations")
+    row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def apply_migrations(
+    db, migrations: Sequence[Migration] = MIGRATIONS
+) -> List[int]:
+    """Применение недостающих миграций по порядку
+
+    Каждая миграция выполняется в отдельной транзакции вместе с записью
+    о своей версии. Возвращает список применённых версий.
+    """
+    if db.in_transaction:
+        await db.commit()
+
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            # Версия перечитывается под блокировкой записи: другой процесс
+            # мог применить миграцию раньше
+            if migration.version <= await get_schema_version(db):
+                await db.rollback()
+                continue
+            if migration.apply is not None:
+                await migration.apply(db)
+            for statement in migration.statements:
+                await db.execute(statement)
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at) "
+                "VALUES (?, ?, ?)",
+                (migration.version, migration.description, datetime.now().isoformat()),
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        applied.append(migration.version)
+    return applied
+
+
+_SCAN_PATTERN = re.compile(r"^SCAN (\S+)")
+# Материализованные CTE и подзапросы: их просмотр — не просмотр таблицы
+_SUBQUERY_PATTERN = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+_LIMIT_PATTERN = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+
+async def find_table_scans(
+    db,
+    queries: Dict[str, Tuple[str, tuple]],
+    allowed: Collection[str] = (),
+) -> Dict[str, List[str]]:
+    """Поиск полных просмотров таблиц в планах запросов
+
+    Для каждого запроса выполняется EXPLAIN QUERY PLAN. Возвращает строки
+    плана с полным просмотром, сгруппированные по имени запроса; пустой
+    словарь означает, что все запросы идут по индексам. В плане таблица
+    может называться псевдонимом, поэтому проверяется любой SCAN, кроме
+    виртуальных таблиц (R*Tree), подзапросов и CTE. Упорядоченный обход
+    индекса (SCAN ... USING INDEX) допустим только в запросах с LIMIT —
+    это первая страница keyset-пагинации. allowed — имена запросов, для
+    которых полный просмотр задуман (например, выгрузка всей таблицы).
+    """
+    problems: Dict[str, List[str]] = {}
+    for name, (sql, params) in queries.items():
+        if name in allowed:
+            continue
+        limited = bool(_LIMIT_PATTERN.search(sql))
+        cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        subqueries = set()
+        for row in await cursor.fetchall():
+            detail = row[3]
+            match = _SUBQUERY_PATTERN.match(detail)
+            if match:
+                subqueries.add(match.group(1))
+                continue
+            match = _SCAN_PATTERN.match(detail)
+            if not match or "VIRTUAL TABLE" in detail:
+                continue
+            target = match.group(1)
+            if target.startswith("(") or target == "CONSTANT" or target in subqueries:
+                continue
+            if limited and "USING" in detail and "INDEX" in detail:
+                continue
+            problems.setdefault(name, []).append(detail)
+    return problems
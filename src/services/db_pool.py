@@ -0,0 +1,226 @@
+"""Пул соединений с базой данных"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Callable, Awaitable, AsyncIterator
+import aiosqlite
+
+
+@dataclass
+class PoolStats:
+    """Счётчики пула соединений"""
+    size: int = 0
+    opened: int = 0
+    in_use: int = 0
+    acquisitions: int = 0
+    waits: int = 0
+    timeouts: int = 0
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    health_check_failures: int = 0
+    reconnects: int = 0
+
+    @property
+    def idle(self) -> int:
+        return self.opened - self.in_use
+
+    @property
+    def utilization(self) -> float:
+        if self.size == 0:
+            return 0.0
+        return self.in_use / self.size
+
+    @property
+    def avg_wait_time(self) -> float:
+        if self.acquisitions == 0:
+            return 0.0
+        return self.total_wait_time / self.acquisitions
+
+    def to_dict(self) -> dict:
+        """Преобразование в словарь"""
+        data = asdict(self)
+        data["idle"] = self.idle
+        data["utilization"] = self.utilization
+        data["avg_wait_time"] = self.avg_wait_time
+        return data
+
+
+class PoolClosedError(RuntimeError):
+    """Пул соединений закрыт"""
+
+
+class ConnectionPool:
+    """Ограниченный пул долгоживущих соединений aiosqlite"""
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 5,
+        acquire_timeout: Optional[float] = 30.0,
+        health_check_interval: float = 60.0,
+        statement_cache_size: int = 256,
+        on_connect: Optional[Callable[[aiosqlite.Connection], Awaitable[None]]] = None,
+    ):
+        if size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+        self.db_path = db_path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.statement_cache_size = statement_cache_size
+        self._on_connect = on_connect
+
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        self._connections: List[aiosqlite.Connection] = []
+        self._last_used: dict = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._closed = False
+        self._stats = PoolStats(size=size)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def get_stats(self) -> dict:
+        """Снимок счётчиков пула"""
+        return self._stats.to_dict()
+
+    async def open(self):
+        """Открытие всех соединений пула заранее"""
+        self._ensure_primitives()
+        async with self._lock:
+            while len(self._connections) < self.size:
+                await self._idle.put(await self._connect())
+
+    async def close(self):
+        """Закрытие пула
+
+        Свободные соединения закрываются сразу, выданные — при возврате:
+        текущие запросы завершаются на своём соединении. Новые и
+        ожидающие получения вызовы получают PoolClosedError.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        idle = []
+        while not self._idle.empty():
+            idle.append(self._idle.get_nowait())
+        for db in idle:
+            await self._discard(db)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Получение соединения из пула"""
+        if self._closed:
+            raise PoolClosedError("Пул соединений закрыт")
+        self._ensure_primitives()
+
+        started = time.perf_counter()
+        if not self._slots.locked():
+            await self._slots.acquire()
+        else:
+            self._stats.waits += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+            except asyncio.TimeoutError:
+                self._stats.timeouts += 1
+                raise
+        if self._closed:
+            # Пул закрыли, пока вызов ждал свободного места
+            self._slots.release()
+            raise PoolClosedError("Пул соединений закрыт")
+        waited = time.perf_counter() - started
+        self._stats.acquisitions += 1
+        self._stats.total_wait_time += waited
+        self._stats.max_wait_time = max(self._stats.max_wait_time, waited)
+
+        db = None
+        try:
+            db = await self._checkout()
+            self._stats.in_use += 1
+            yield db
+        finally:
+            if db is not None:
+                self._stats.in_use -= 1
+                await self._checkin(db)
+            self._slots.release()
+
+    def _ensure_primitives(self):
+        """Создание примитивов синхронизации в текущем цикле событий"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+            self._lock = asyncio.Lock()
+
+    async def _checkout(self) -> aiosqlite.Connection:
+        """Выдача свободного или нового соединения"""
+        if self._idle.empty():
+            return await self._connect()
+
+        db = self._idle.get_nowait()
+        idle_for = time.monotonic() - self._last_used.get(id(db), 0)
+        if idle_for >= self.health_check_interval and not await self._is_healthy(db):
+            self._stats.health_check_failures += 1
+            self._stats.reconnects += 1
+            await self._discard(db)
+            db = await self._connect()
+        return db
+
+    async def _checkin(self, db: aiosqlite.Connection):
+        """Возврат соединения в пул"""
+        if self._closed:
+            await self._discard(db)
+            return
+        try:
+            if db.in_transaction:
+                await db.rollback()
+        except Exception:
+            await self._discard(db)
+            return
+        self._last_used[id(db)] = time.monotonic()
+        self._idle.put_nowait(db)
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открытие нового соединения"""
+        db = await aiosqlite.connect(
+            self.db_path, cached_statements=self.statement_cache_size
+        )
+        db.row_factory = aiosqlite.Row
+        try:
+            if self._on_connect is not None:
+                await self._on_connect(db)
+        except Exception:
+            await db.close()
+            raise
+        self._connections.append(db)
+        self._last_used[id(db)] = time.monotonic()
+        self._stats.opened = len(self._connections)
+        return db
+
+    async def _discard(self, db: aiosqlite.Connection):
+        """Удаление соединения из пула"""
+        if db in self._connections:
+            self._connections.remove(db)
+        self._stats.opened = len(self._connections)
+        await self._close_connection(db)
+
+    async def _close_connection(self, db: aiosqlite.Connection):
+        """Закрытие соединения с подавлением ошибок"""
+        self._last_used.pop(id(db), None)
+        try:
+            await db.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    async def _is_healthy(db: aiosqlite.Connection) -> bool:
+        """Проверка работоспособности соединения"""
+        try:
+            cursor = await db.execute("SELECT 1")
+            await cursor.fetchone()
+            await cursor.close()
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,238 @@
+"""Единственный писатель базы данных с групповой фиксацией"""
+
+import asyncio
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Tuple, Callable, Awaitable, Any
+import aiosqlite
+
+
+WriteOperation = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+@dataclass
+class WriterStats:
+    """Счётчики писателя"""
+    operations: int = 0
+    failed_operations: int = 0
+    batches: int = 0
+    commits: int = 0
+    failed_commits: int = 0
+    max_batch: int = 0
+    queued: int = 0
+
+    @property
+    def avg_batch(self) -> float:
+        if self.batches == 0:
+            return 0.0
+        return self.operations / self.batches
+
+    def to_dict(self) -> dict:
+        """Преобразование в словарь"""
+        data = asdict(self)
+        data["avg_batch"] = self.avg_batch
+        return data
+
+
+class WriterClosedError(RuntimeError):
+    """Писатель остановлен"""
+
+
+_STOP = object()
+
+
+class DatabaseWriter:
+    """Выделенная задача, выполняющая все записи одной транзакцией на группу
+
+    Операции ставятся в очередь и объединяются в группы по времени
+    (max_delay) и размеру (max_batch). Каждая операция выполняется в своей
+    точке сохранения: ошибка одной операции откатывает только её. Будущее
+    операции завершается после COMMIT всей группы, поэтому вызывающий
+    получает результат только когда запись надёжно сохранена.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_batch: int = 256,
+        max_delay: float = 0.002,
+        synchronous: str = "FULL",
+        statement_cache_size: int = 256,
+        on_connect: Optional[Callable[[aiosqlite.Connection], Awaitable[None]]] = None,
+    ):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.synchronous = synchronous
+        self.statement_cache_size = statement_cache_size
+        self._on_connect = on_connect
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._arrived: Optional[asyncio.Event] = None
+        self._inflight: List[Tuple[WriteOperation, asyncio.Future]] = []
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+        self._stats = WriterStats()
+
+    def get_stats(self) -> dict:
+        """Снимок счётчиков писателя"""
+        self._stats.queued = self._queue.qsize() if self._queue else 0
+        return self._stats.to_dict()
+
+    async def start(self):
+        """Открытие соединения и запуск задачи писателя"""
+        if self._closed:
+            raise WriterClosedError("Писатель остановлен")
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._task is not None:
+                return
+            # Транзакциями управляет сам писатель
+            db = await aiosqlite.connect(
+                self.db_path,
+                isolation_level=None,
+                cached_statements=self.statement_cache_size,
+            )
+            db.row_factory = aiosqlite.Row
+            try:
+                if self._on_connect is not None:
+                    await self._on_connect(db)
+                await db.execute(f"PRAGMA synchronous = {self.synchronous}")
+            except Exception:
+                await db.close()
+                raise
+            self._db = db
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, operation: WriteOperation) -> Any:
+        """Постановка операции записи в очередь и ожидание фиксации"""
+        if self._closed:
+            raise WriterClosedError("Писатель остановлен")
+        if self._task is None:
+            await self.start()
+        if self._task.done():
+            raise WriterClosedError("Задача писателя завершилась")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        self._arrived.set()
+        return await future
+
+    async def close(self):
+        """Остановка писателя после выполнения уже поставленных операций"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(_STOP)
+            self._arrived.set()
+            # Ошибка задачи уже передана ожидающим в _run
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def _run(self):
+        """Цикл писателя
+
+        При любом выходе из цикла (остановка, ошибка, отмена) ожидающие
+        операции завершаются WriterClosedError, чтобы вызывающие не зависли.
+        """
+        try:
+            stopping = False
+            while not stopping:
+                item = await self._queue.get()
+                if item is _STOP:
+                    break
+                self._inflight = [item]
+                stopping = await self._collect(self._inflight)
+                await self._run_batch(self._inflight)
+                self._inflight = []
+        finally:
+            self._fail_pending()
+
+    def _fail_pending(self):
+        """Завершение ошибкой операций текущей группы и очереди"""
+        pending = self._inflight
+        self._inflight = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                pending.append(item)
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(WriterClosedError("Писатель остановлен"))
+
+    async def _collect(self, batch: List[Tuple[WriteOperation, asyncio.Future]]) -> bool:
+        """Добор операций в группу в пределах окна; True — получен сигнал остановки"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                # Ждём сигнала, а не самого элемента: по таймауту из очереди
+                # ничего не теряется
+                self._arrived.clear()
+                try:
+                    async with asyncio.timeout(timeout):
+                        await self._arrived.wait()
+                except TimeoutError:
+                    break
+                continue
+            item = self._queue.get_nowait()
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    async def _run_batch(self, batch: List[Tuple[WriteOperation, asyncio.Future]]):
+        """Выполнение группы операций в одной транзакции"""
+        db = self._db
+        # Операции, чьи вызывающие уже отменили ожидание, не выполняются
+        batch = [(op, future) for op, future in batch if not future.done()]
+        if not batch:
+            return
+
+        outcomes = []
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await operation(db)
+                except Exception as e:
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((future, None, e))
+                    self._stats.failed_operations += 1
+                else:
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((future, result, None))
+            await db.execute("COMMIT")
+            self._stats.commits += 1
+        except Exception as e:
+            self._stats.failed_commits += 1
+            if db.in_transaction:
+                try:
+                    await db.execute("ROLLBACK")
+                except Exception:
+                    pass
+            outcomes = [(future, None, e) for _, future in batch]
+
+        self._stats.batches += 1
+        self._stats.operations += len(batch)
+        self._stats.max_batch = max(self._stats.max_batch, len(batch))
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
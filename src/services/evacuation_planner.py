@@ -0,0 +1,392 @@
+"""Распределение населения по укрытиям при эвакуации"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+import numpy as np
+
+from src.models.shelter import Shelter
+from src.services.location_service import EARTH_RADIUS_KM
+
+
+@dataclass
+class PopulationCell:
+    """Участок с населением, подлежащим эвакуации"""
+    id: str
+    latitude: float
+    longitude: float
+    headcount: int
+    needs_accessibility: bool = False  # Только укрытия для маломобильных
+    needs_medical: bool = False  # Только укрытия с медпунктом
+
+
+@dataclass
+class Assignment:
+    """Направление части участка в укрытие"""
+    cell_id: str
+    shelter_id: str
+    people: int
+    distance_km: float
+
+
+@dataclass
+class EvacuationPlan:
+    """План эвакуации"""
+    assignments: List[Assignment] = field(default_factory=list)
+    unassigned: Dict[str, int] = field(default_factory=dict)  # cell_id -> людей без места
+
+    @property
+    def assigned_people(self) -> int:
+        return sum(a.people for a in self.assignments)
+
+    @property
+    def unassigned_people(self) -> int:
+        return sum(self.unassigned.values())
+
+    @property
+    def avg_distance_km(self) -> float:
+        people = self.assigned_people
+        if people == 0:
+            return 0.0
+        return sum(a.people * a.distance_km for a in self.assignments) / people
+
+    @property
+    def max_distance_km(self) -> float:
+        return max((a.distance_km for a in self.assignments), default=0.0)
+
+    def by_shelter(self) -> Dict[str, int]:
+        """Число направленных людей по укрытиям"""
+        load: Dict[str, int] = {}
+        for a in self.assignments:
+            load[a.shelter_id] = load.get(a.shelter_id, 0) + a.people
+        return load
+
+    def to_dict(self) -> dict:
+        """Сводка плана"""
+        return {
+            "assigned_people": self.assigned_people,
+            "unassigned_people": self.unassigned_people,
+            "avg_distance_km": self.avg_distance_km,
+            "max_distance_km": self.max_distance_km,
+            "shelters_used": len(self.by_shelter()),
+        }
+
+
+def _unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Точки (lat, lon) в единичные векторы на сфере"""
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack(
+        (cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad))
+    )
+
+
+class EvacuationPlanner:
+    """Распределение участков по укрытиям с учётом вместимости
+
+    Для каждого участка выбираются candidates ближайших подходящих укрытий
+    (доступность, медпункт, свободные места); расстояния считаются блоками
+    через скалярные произведения единичных векторов. Затем рёбра
+    участок→укрытие обходятся по возрастанию расстояния, и каждое забирает
+    столько людей, сколько позволяют остаток участка и остаток укрытия.
+    Участкам, которым не хватило кандидатов, набор кандидатов расширяется.
+
+    Это жадное приближение задачи минимальной стоимости: оно точно, пока
+    вместимость ближайших укрытий не исчерпана, а при дефиците мест может
+    давать немного большую суммарную дистанцию, чем оптимальный поток.
+
+    Планировщик хранит состояние плана, поэтому закрытие укрытия или
+    изменение его вместимости перераспределяет только затронутых людей.
+    """
+
+    def __init__(
+        self,
+        shelters: Iterable[Shelter],
+        candidates: int = 8,
+        chunk_size: int = 2048,
+    ):
+        self.candidates = candidates
+        self.chunk_size = chunk_size
+
+        shelters = [s for s in shelters if s.is_active]
+        self._shelter_ids = [s.id for s in shelters]
+        self._shelter_index = {s.id: i for i, s in enumerate(shelters)}
+        self._shelter_lat = np.array([s.location.latitude for s in shelters], dtype=float)
+        self._shelter_lon = np.array([s.location.longitude for s in shelters], dtype=float)
+        self._shelter_xyz = _unit_vectors(self._shelter_lat, self._shelter_lon).reshape(-1, 3)
+        self._accessible = np.array([s.is_accessible for s in shelters], dtype=bool)
+        self._medical = np.array([s.has_medical for s in shelters], dtype=bool)
+        self._capacity = np.array(
+            [max(s.capacity.available, 0) for s in shelters], dtype=np.int64
+        )
+        self._remaining = self._capacity.copy()
+
+        self._cells: List[PopulationCell] = []
+        self._cell_lat = np.empty(0)
+        self._cell_lon = np.empty(0)
+        self._cell_xyz = np.empty((0, 3))
+        self._demand = np.empty(0, dtype=np.int64)
+        self._needs_accessibility = np.empty(0, dtype=bool)
+        self._needs_medical = np.empty(0, dtype=bool)
+        # Текущее распределение: участок -> {укрытие: людей} и обратно
+        self._by_cell: List[Dict[int, int]] = []
+        self._by_shelter: List[Dict[int, int]] = [{} for _ in shelters]
+
+    def plan(self, cells: Iterable[PopulationCell]) -> EvacuationPlan:
+        """Построение плана с нуля"""
+        self._cells = list(cells)
+        self._cell_lat = np.array([c.latitude for c in self._cells], dtype=float)
+        self._cell_lon = np.array([c.longitude for c in self._cells], dtype=float)
+        self._cell_xyz = _unit_vectors(self._cell_lat, self._cell_lon).reshape(-1, 3)
+        self._demand = np.array([max(c.headcount, 0) for c in self._cells], dtype=np.int64)
+        self._needs_accessibility = np.array(
+            [c.needs_accessibility for c in self._cells], dtype=bool
+        )
+        self._needs_medical = np.array([c.needs_medical for c in self._cells], dtype=bool)
+        self._remaining = self._capacity.copy()
+        self._by_cell = [{} for _ in self._cells]
+        self._by_shelter = [{} for _ in self._shelter_ids]
+
+        self._assign(np.flatnonzero(self._demand > 0))
+        return self.get_plan()
+
+    def close_shelter(self, shelter_id: str) -> EvacuationPlan:
+        """Закрытие укрытия: его люди перераспределяются по остальным"""
+        return self.update_capacity(shelter_id, 0)
+
+    def update_capacity(self, shelter_id: str, capacity: int) -> EvacuationPlan:
+        """Новая вместимость укрытия для эвакуируемых
+
+        При уменьшении вместимости из укрытия выводятся самые дальние
+        участки, при увеличении — места получают участки без места.
+        Укрытия, неизвестные планировщику (в том числе неактивные при его
+        создании), людей не принимают, и план для них не меняется.
+        """
+        s = self._shelter_index.get(shelter_id)
+        if s is None:
+            return self.get_plan()
+        capacity = max(capacity, 0)
+        assigned = self._capacity[s] - self._remaining[s]
+        self._capacity[s] = capacity
+
+        if capacity < assigned:
+            overflow = assigned - capacity
+            load = self._by_shelter[s]
+            cells = np.fromiter(load, np.int64, len(load))
+            # Дальние участки выводятся первыми
+            order = np.argsort(self._cell_xyz[cells] @ self._shelter_xyz[s], kind="stable")
+            evicted = []
+            for c in cells[order].tolist():
+                if overflow <= 0:
+                    break
+                people = min(load[c], overflow)
+                self._release(c, s, people)
+                overflow -= people
+                evicted.append(c)
+            # _release вернул места укрытию; после вывода оно заполнено ровно
+            self._remaining[s] = 0
+            self._assign(np.array(evicted, dtype=np.int64))
+        else:
+            self._remaining[s] = capacity - assigned
+            self._assign(np.flatnonzero(self._demand > 0))
+        return self.get_plan()
+
+    def get_plan(self) -> EvacuationPlan:
+        """Текущий план"""
+        cells, shelters, people = [], [], []
+        for c, allocation in enumerate(self._by_cell):
+            for s, count in allocation.items():
+                cells.append(c)
+                shelters.append(s)
+                people.append(int(count))
+        distances = self._distances(
+            self._cell_xyz[cells], self._shelter_xyz[shelters]
+        ).tolist()
+
+        plan = EvacuationPlan()
+        cell_list, shelter_ids = self._cells, self._shelter_ids
+        plan.assignments = [
+            Assignment(
+                cell_id=cell_list[c].id,
+                shelter_id=shelter_ids[s],
+                people=count,
+                distance_km=distance,
+            )
+            for c, s, count, distance in zip(cells, shelters, people, distances)
+        ]
+        for c in np.flatnonzero(self._demand > 0).tolist():
+            plan.unassigned[cell_list[c].id] = int(self._demand[c])
+        return plan
+
+    def _assign(self, cells: np.ndarray):
+        """Распределение остатка участков по ближайшим свободным укрытиям"""
+        k = self.candidates
+        while len(cells) and self._remaining.sum() > 0:
+            cell_idx, shelter_idx, distances = self._candidate_edges(cells, k)
+            if len(cell_idx) == 0:
+                break
+            order = np.argsort(distances, kind="stable")
+            demand, remaining = self._demand, self._remaining
+            by_cell, by_shelter = self._by_cell, self._by_shelter
+            for c, s in zip(cell_idx[order].tolist(), shelter_idx[order].tolist()):
+                need = demand[c]
+                if need == 0:
+                    continue
+                free = remaining[s]
+                if free == 0:
+                    continue
+                people = need if need < free else free
+                demand[c] = need - people
+                remaining[s] = free - people
+                by_cell[c][s] = by_cell[c].get(s, 0) + people
+                by_shelter[s][c] = by_shelter[s].get(c, 0) + people
+
+            cells = cells[self._demand[cells] > 0]
+            if k >= len(self._shelter_ids):
+                break
+            k *= 4
+
+    def _release(self, c: int, s: int, people: int):
+        """Возврат людей участка из укрытия в нераспределённые"""
+        left = self._by_cell[c][s] - people
+        if left:
+            self._by_cell[c][s] = left
+            self._by_shelter[s][c] = left
+        else:
+            del self._by_cell[c][s]
+            del self._by_shelter[s][c]
+        self._demand[c] += people
+        self._remaining[s] += people
+
+    def _candidate_edges(self, cells: np.ndarray, k: int):
+        """k ближайших подходящих укрытий со свободными местами для каждого участка
+
+        Участки группируются по плиткам сетки и сравниваются только с
+        укрытиями из блока 3×3 плиток вокруг своей. Результат для участка
+        принимается, если k-й кандидат ближе края блока, — тогда за блоком
+        ближе быть никто не может. Остальные участки сравниваются со всеми
+        свободными укрытиями.
+        """
+        free = np.flatnonzero(self._remaining > 0)
+        if len(free) == 0 or len(cells) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        k = min(k, len(free))
+        if len(cells) * len(free) <= self.chunk_size * 1024:
+            edges, _ = self._nearest_edges(cells, free, k)
+            return edges
+
+        tile = self._tile_size(free, k)
+        rows_count = int(np.ceil(180 / tile))
+        cols_count = int(np.ceil(360 / tile))
+        shelter_rows, shelter_cols = self._tiles(self._shelter_lat[free], self._shelter_lon[free], tile)
+        shelter_keys = shelter_rows * cols_count + shelter_cols
+        order = np.argsort(shelter_keys, kind="stable")
+        keys_sorted = shelter_keys[order]
+        unique_keys, starts = np.unique(keys_sorted, return_index=True)
+        ends = np.append(starts[1:], len(order))
+        by_tile = {
+            key: free[order[start:end]]
+            for key, start, end in zip(unique_keys.tolist(), starts.tolist(), ends.tolist())
+        }
+
+        cell_rows, cell_cols = self._tiles(self._cell_lat[cells], self._cell_lon[cells], tile)
+        cell_keys = cell_rows * cols_count + cell_cols
+        order = np.argsort(cell_keys, kind="stable")
+        unique_keys, starts = np.unique(cell_keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        parts, fallback = [], []
+        for key, start, end in zip(unique_keys.tolist(), starts.tolist(), ends.tolist()):
+            tile_cells = cells[order[start:end]]
+            row, col = divmod(key, cols_count)
+            block = [
+                by_tile.get(r * cols_count + (c % cols_count))
+                for r in range(max(row - 1, 0), min(row + 2, rows_count))
+                for c in range(col - 1, col + 2)
+            ]
+            block = [shelters for shelters in block if shelters is not None]
+            if not block:
+                fallback.append(tile_cells)
+                continue
+            edges, kth = self._nearest_edges(tile_cells, np.concatenate(block), k)
+            # Минимальное расстояние от плитки до точек вне блока
+            edge_lat = (row + 2) * tile - 90, (row - 1) * tile - 90
+            max_abs_lat = min(max(abs(edge_lat[0]), abs(edge_lat[1])), 90.0)
+            margin = EARTH_RADIUS_KM * min(
+                np.radians(tile),
+                np.arcsin(np.cos(np.radians(max_abs_lat)) * np.sin(np.radians(min(tile, 90)))),
+            )
+            exact = kth <= margin
+            if exact.all():
+                parts.append(edges)
+                continue
+            accepted = np.isin(edges[0], tile_cells[exact])
+            parts.append(tuple(part[accepted] for part in edges))
+            fallback.append(tile_cells[~exact])
+
+        if fallback:
+            edges, _ = self._nearest_edges(np.concatenate(fallback), free, k)
+            parts.append(edges)
+        return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+    def _nearest_edges(self, cells: np.ndarray, shelters: np.ndarray, k: int):
+        """Рёбра к k ближайшим подходящим укрытиям из заданных и расстояние k-го
+
+        Для участков, которым нашлось меньше k подходящих укрытий,
+        расстояние k-го кандидата считается бесконечным.
+        """
+        k_local = min(k, len(shelters))
+        shelter_xyz = self._shelter_xyz[shelters]
+        accessible = self._accessible[shelters]
+        medical = self._medical[shelters]
+
+        all_cells, all_shelters, all_distances, kth = [], [], [], []
+        for start in range(0, len(cells), self.chunk_size):
+            chunk = cells[start:start + self.chunk_size]
+            similarity = self._cell_xyz[chunk] @ shelter_xyz.T
+            ineligible = (
+                (self._needs_accessibility[chunk][:, None] & ~accessible[None, :]) |
+                (self._needs_medical[chunk][:, None] & ~medical[None, :])
+            )
+            similarity[ineligible] = -np.inf
+            if k_local < len(shelters):
+                top = np.argpartition(-similarity, k_local - 1, axis=1)[:, :k_local]
+            else:
+                top = np.broadcast_to(np.arange(len(shelters)), (len(chunk), len(shelters)))
+            best = np.take_along_axis(similarity, top, axis=1)
+            valid = np.isfinite(best)
+            distances = EARTH_RADIUS_KM * np.arccos(np.clip(best, -1.0, 1.0))
+            all_cells.append(np.broadcast_to(chunk[:, None], top.shape)[valid])
+            all_shelters.append(shelters[top[valid]])
+            all_distances.append(distances[valid])
+            if k_local < k:
+                kth.append(np.full(len(chunk), np.inf))
+            else:
+                kth.append(np.where(valid.all(axis=1), distances.max(axis=1), np.inf))
+        edges = (
+            np.concatenate(all_cells),
+            np.concatenate(all_shelters),
+            np.concatenate(all_distances),
+        )
+        return edges, np.concatenate(kth)
+
+    def _tile_size(self, shelters: np.ndarray, k: int) -> float:
+        """Размер плитки (градусы), при котором в плитке в среднем около k укрытий"""
+        lats = self._shelter_lat[shelters]
+        lons = self._shelter_lon[shelters]
+        area = max(np.ptp(lats), 0.01) * max(np.ptp(lons), 0.01)
+        return float(np.clip(np.sqrt(area * k / len(shelters)), 0.05, 30.0))
+
+    @staticmethod
+    def _tiles(lats: np.ndarray, lons: np.ndarray, tile: float):
+        """Строка и столбец плитки для точек"""
+        rows = np.floor((lats + 90) / tile).astype(np.int64)
+        cols = np.floor(((lons + 180) % 360) / tile).astype(np.int64)
+        return rows, cols
+
+    @staticmethod
+    def _distances(points: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """Расстояния по большому кругу между парами точек (км)"""
+        dots = np.einsum("ij,ij->i", points.reshape(-1, 3), targets.reshape(-1, 3))
+        return EARTH_RADIUS_KM * np.arccos(np.clip(dots, -1.0, 1.0))
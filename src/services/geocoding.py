@@ -0,0 +1,421 @@
+"""Обратное геокодирование по локальному справочнику
+
+Справочник — JSON-файл со списком объектов:
+
+    [
+        {"name": "Москва", "kind": "region", "lat": 55.75, "lon": 37.62,
+         "polygon": [[55.14, 36.80], [56.02, 37.30], ...]},
+        {"name": "Москва", "kind": "city", "lat": 55.7558, "lon": 37.6173,
+         "region": "Москва"},
+        ...
+    ]
+
+Регион определяется по границе (polygon), а если граница не задана или
+точка не попала ни в одну — по ближайшему центру региона. Населённый
+пункт — ближайший к точке в пределах settlement_radius_km.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+from src.config.settings import Settings
+from src.models.risk import RiskZone
+from src.services.location_service import ArrayLike
+from src.services.spatial_index import SpatialIndex
+from src.services.zone_engine import ZoneMatcher
+
+
+CellKey = Tuple[int, int]
+
+
+@dataclass
+class GeocodeResult:
+    """Результат обратного геокодирования"""
+    city: Optional[str] = None
+    region: Optional[str] = None
+    address: Optional[str] = None
+    source: str = "gazetteer"  # gazetteer, remote
+
+    @property
+    def is_empty(self) -> bool:
+        return self.city is None and self.region is None and self.address is None
+
+
+RemoteBackend = Callable[[float, float], Optional[GeocodeResult]]
+
+
+class Gazetteer:
+    """Справочник регионов и населённых пунктов в памяти"""
+
+    def __init__(
+        self,
+        entries: List[dict],
+        settlement_radius_km: float = 30.0,
+        region_radius_km: float = 500.0,
+        version: str = "",
+    ):
+        self.settlement_radius_km = settlement_radius_km
+        self.region_radius_km = region_radius_km
+        self.version = version
+        self._regions = ZoneMatcher()
+        self._region_centers = SpatialIndex()
+        self._settlements = SpatialIndex()
+
+        settlements = []
+        centers = []
+        for i, entry in enumerate(entries):
+            if entry.get("kind") == "region":
+                if entry.get("polygon"):
+                    zone = RiskZone(
+                        latitude=entry["lat"],
+                        longitude=entry["lon"],
+                        radius_km=0,
+                        polygon=[tuple(point) for point in entry["polygon"]],
+                    )
+                    self._regions.add(i, zone, entry["name"])
+                centers.append((i, entry["lat"], entry["lon"], entry["name"]))
+            else:
+                settlements.append((i, entry["lat"], entry["lon"], entry))
+        self._region_centers.bulk_load(centers)
+        self._settlements.bulk_load(settlements)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "Gazetteer":
+        """Загрузка справочника из файла; отсутствующий файл — пустой справочник"""
+        if not os.path.exists(path):
+            return cls([], **kwargs)
+        with open(path, "rb") as f:
+            raw = f.read()
+        version = hashlib.blake2b(raw, digest_size=8).hexdigest()
+        return cls(json.loads(raw), version=version, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._settlements) + len(self._region_centers)
+
+    def lookup(self, lat: float, lon: float) -> Optional[GeocodeResult]:
+        """Регион и населённый пункт для точки"""
+        return self.lookup_many([lat], [lon])[0]
+
+    def lookup_many(
+        self, lats: ArrayLike, lons: ArrayLike
+    ) -> List[Optional[GeocodeResult]]:
+        """Регион и населённый пункт для набора точек"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        regions = self._regions.zones_containing(lats, lons) if len(self._regions) else None
+
+        results: List[Optional[GeocodeResult]] = []
+        for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist())):
+            region = regions[i][0] if regions and regions[i] else None
+            city = None
+            nearest = self._settlements.nearest(
+                lat, lon, max_distance_km=self.settlement_radius_km
+            )
+            if nearest:
+                settlement = nearest[0][0]
+                city = settlement["name"]
+                region = region or settlement.get("region")
+            if region is None:
+                nearest = self._region_centers.nearest(
+                    lat, lon, max_distance_km=self.region_radius_km
+                )
+                if nearest:
+                    region = nearest[0][0]
+            if city is None and region is None:
+                results.append(None)
+            else:
+                parts = [city] if city else []
+                if region and region != city:
+                    parts.append(region)
+                results.append(GeocodeResult(
+                    city=city, region=region, address=", ".join(parts)
+                ))
+        return results
+
+
+class GeocodeCache:
+    """Постоянный кэш результатов на диске по квантованным координатам
+
+    Кэш привязан к версии справочника: при её смене записи сбрасываются.
+    Отрицательные результаты тоже сохраняются, чтобы не искать повторно.
+    Соединение можно использовать из рабочих потоков: обращения
+    сериализуются блокировкой.
+    """
+
+    def __init__(self, path: str, version: str = ""):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS geocode_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                lat_q INTEGER NOT NULL,
+                lon_q INTEGER NOT NULL,
+                city TEXT,
+                region TEXT,
+                address TEXT,
+                source TEXT,
+                PRIMARY KEY (lat_q, lon_q)
+            ) WITHOUT ROWID;
+        """)
+        row = self._db.execute(
+            "SELECT value FROM geocode_meta WHERE key = 'version'"
+        ).fetchone()
+        if row is None or row[0] != version:
+            with self._db:
+                self._db.execute("DELETE FROM geocode_cache")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode_meta (key, value) VALUES ('version', ?)",
+                    (version,),
+                )
+
+    def get_many(self, keys: List[CellKey]) -> Dict[CellKey, Optional[GeocodeResult]]:
+        """Чтение записей; отсутствующие ключи в ответ не попадают"""
+        found: Dict[CellKey, Optional[GeocodeResult]] = {}
+        # Ограничение SQLite на число параметров запроса
+        for start in range(0, len(keys), 400):
+            chunk = keys[start:start + 400]
+            placeholders = ", ".join("(?, ?)" for _ in chunk)
+            params = [value for key in chunk for value in key]
+            with self._lock:
+                rows = self._db.execute(
+                    f"""
+                    SELECT lat_q, lon_q, city, region, address, source
+                    FROM geocode_cache WHERE (lat_q, lon_q) IN (VALUES {placeholders})
+                    """,
+                    params,
+                ).fetchall()
+            for lat_q, lon_q, city, region, address, source in rows:
+                result = GeocodeResult(city, region, address, source) if source else None
+                found[(lat_q, lon_q)] = result
+        return found
+
+    def put_many(self, items: Dict[CellKey, Optional[GeocodeResult]]):
+        """Запись результатов одной транзакцией"""
+        with self._lock, self._db:
+            self._db.executemany(
+                """
+                INSERT OR REPLACE INTO geocode_cache
+                    (lat_q, lon_q, city, region, address, source)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (key[0], key[1], None, None, None, None) if result is None else
+                    (key[0], key[1], result.city, result.region, result.address, result.source)
+                    for key, result in items.items()
+                ],
+            )
+
+    def close(self):
+        """Закрытие файла кэша"""
+        with self._lock:
+            self._db.close()
+
+
+class GeopyBackend:
+    """Удалённое геокодирование через geopy (Nominatim)"""
+
+    def __init__(self, user_agent: str = "mnur", min_delay_seconds: float = 1.0):
+        from geopy.extra.rate_limiter import RateLimiter
+        from geopy.geocoders import Nominatim
+
+        geolocator = Nominatim(user_agent=user_agent)
+        self._reverse = RateLimiter(
+            geolocator.reverse, min_delay_seconds=min_delay_seconds
+        )
+
+    def __call__(self, lat: float, lon: float) -> Optional[GeocodeResult]:
+        location = self._reverse((lat, lon), language="ru")
+        if location is None:
+            return None
+        address = location.raw.get("address", {})
+        return GeocodeResult(
+            city=address.get("city") or address.get("town") or address.get("village"),
+            region=address.get("state") or address.get("region"),
+            address=location.address,
+            source="remote",
+        )
+
+
+class ReverseGeocoder:
+    """Обратное геокодирование с многоуровневым кэшем
+
+    Порядок поиска: LRU в памяти → кэш на диске → справочник → удалённый
+    сервис (если задан и справочник ничего не нашёл). Координаты
+    квантуются до precision знаков после запятой (2 знака ≈ 1 км),
+    поэтому соседние точки разделяют одну запись кэша.
+    
+    Обращения к диску и удалённому сервису блокирующие; из асинхронного
+    кода используйте reverse_async/reverse_many_async, которые выполняют
+    поиск в рабочем потоке.
+    """
+
+    def __init__(
+        self,
+        gazetteer: Gazetteer,
+        cache_path: Optional[str] = None,
+        precision: int = 2,
+        lru_size: int = 100_000,
+        remote: Optional[RemoteBackend] = None,
+    ):
+        self.gazetteer = gazetteer
+        self.precision = precision
+        self.lru_size = lru_size
+        self.remote = remote
+        self._scale = 10 ** precision
+        self._lru: "OrderedDict[CellKey, Optional[GeocodeResult]]" = OrderedDict()
+        self._disk = GeocodeCache(cache_path, gazetteer.version) if cache_path else None
+        self._lock = threading.RLock()
+        # remote_errors — неудачные запросы к удалённому сервису
+        self.hits = {"lru": 0, "disk": 0, "gazetteer": 0, "remote": 0, "remote_errors": 0}
+
+    @classmethod
+    def from_settings(
+        cls, settings: Settings, remote: Optional[RemoteBackend] = None
+    ) -> "ReverseGeocoder":
+        """Создание по настройкам приложения"""
+        gazetteer = Gazetteer.load(
+            settings.gazetteer_path,
+            settlement_radius_km=settings.geocoding_settlement_radius_km,
+        )
+        return cls(
+            gazetteer,
+            cache_path=settings.geocoding_cache_path,
+            precision=settings.geocoding_precision,
+            remote=remote,
+        )
+
+    def close(self):
+        """Закрытие кэша на диске"""
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def reverse(
+        self, lat: float, lon: float, use_remote: bool = True
+    ) -> Optional[GeocodeResult]:
+        """Адрес точки"""
+        return self.reverse_many([lat], [lon], use_remote=use_remote)[0]
+
+    async def reverse_async(
+        self, lat: float, lon: float, use_remote: bool = True
+    ) -> Optional[GeocodeResult]:
+        """reverse() в рабочем потоке, не блокируя цикл событий"""
+        return await asyncio.to_thread(self.reverse, lat, lon, use_remote)
+
+    async def reverse_many_async(
+        self, lats: ArrayLike, lons: ArrayLike, use_remote: bool = False
+    ) -> List[Optional[GeocodeResult]]:
+        """reverse_many() в рабочем потоке, не блокируя цикл событий"""
+        return await asyncio.to_thread(self.reverse_many, lats, lons, use_remote)
+
+    def reverse_many(
+        self, lats: ArrayLike, lons: ArrayLike, use_remote: bool = False
+    ) -> List[Optional[GeocodeResult]]:
+        """Адреса набора точек
+
+        Точки группируются по ячейкам, и каждая ячейка ищется один раз.
+        По умолчанию удалённый сервис не используется, чтобы массовая
+        обработка работала без сети.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if len(lats) == 0:
+            return []
+        lat_q = np.round(lats * self._scale).astype(np.int64)
+        lon_q = np.round(lons * self._scale).astype(np.int64)
+        # Одномерный ключ ячейки: np.unique по нему быстрее, чем по парам
+        packed = (lat_q << 32) + (lon_q & 0xFFFFFFFF)
+        _, first, inverse = np.unique(packed, return_index=True, return_inverse=True)
+        keys = list(zip(lat_q[first].tolist(), lon_q[first].tolist()))
+
+        # LRU и счётчики общие для потоков reverse_async
+        with self._lock:
+            resolved: Dict[CellKey, Optional[GeocodeResult]] = {}
+            missing = []
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    resolved[key] = self._lru[key]
+                    self.hits["lru"] += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._disk is not None:
+                from_disk = self._disk.get_many(missing)
+                self.hits["disk"] += len(from_disk)
+                resolved.update(from_disk)
+                self._remember(from_disk)
+                missing = [key for key in missing if key not in from_disk]
+
+            if missing:
+                computed = self._lookup(missing)
+                resolved.update(computed)
+                self._remember(computed)
+                if self._disk is not None:
+                    self._disk.put_many(computed)
+
+        # Сеть — без блокировки: ожидание сервиса не задерживает
+        # параллельные запросы, отвечаемые из кэша
+        if use_remote and self.remote is not None:
+            fetched = self._fetch_remote([key for key in keys if resolved[key] is None])
+            if fetched:
+                resolved.update(fetched)
+                with self._lock:
+                    self._remember(fetched)
+                    if self._disk is not None:
+                        self._disk.put_many(fetched)
+
+        per_cell = [resolved[key] for key in keys]
+        return [per_cell[i] for i in inverse.reshape(-1).tolist()]
+
+    def _lookup(self, keys: List[CellKey]) -> Dict[CellKey, Optional[GeocodeResult]]:
+        """Поиск ячеек в справочнике"""
+        lats = np.array([key[0] for key in keys], dtype=float) / self._scale
+        lons = np.array([key[1] for key in keys], dtype=float) / self._scale
+        found = dict(zip(keys, self.gazetteer.lookup_many(lats, lons)))
+        self.hits["gazetteer"] += sum(1 for result in found.values() if result)
+        return found
+
+    def _fetch_remote(self, keys: List[CellKey]) -> Dict[CellKey, GeocodeResult]:
+        """Запрос ячеек, не найденных локально, у удалённого сервиса
+
+        Сохраняются только найденные адреса: неудачный запрос будет
+        повторён при следующем обращении.
+        """
+        fetched = {}
+        for key in keys:
+            try:
+                result = self.remote(key[0] / self._scale, key[1] / self._scale)
+            except Exception:
+                with self._lock:
+                    self.hits["remote_errors"] += 1
+                continue
+            if result is not None:
+                fetched[key] = result
+                with self._lock:
+                    self.hits["remote"] += 1
+        return fetched
+
+    def _remember(self, items: Dict[CellKey, Optional[GeocodeResult]]):
+        """Добавление в LRU с вытеснением самых старых записей"""
+        for key, result in items.items():
+            self._lru[key] = result
+            self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
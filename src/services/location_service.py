@@ -1,8 +1,74 @@
 """Сервис геолокации"""
 
+import asyncio
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from typing import TYPE_CHECKING, Any, Iterable, Optional, List, Tuple, Union, Sequence
 import math
+import numpy as np
+from src.models.risk import RiskZone
+
+if TYPE_CHECKING:
+    from src.services.geocoding import ReverseGeocoder
+
+
+ArrayLike = Union[np.ndarray, Sequence[float]]
+
+EARTH_RADIUS_KM = 6371  # Радиус Земли в км
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по большому кругу (км); аргументы — числа или массивы"""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    delta_lat = lat2_rad - lat1_rad
+    delta_lon = np.radians(np.subtract(lon2, lon1))
+    
+    a = (
+        np.sin(delta_lat / 2) ** 2 +
+        np.cos(lat1_rad) * np.cos(lat2_rad) *
+        np.sin(delta_lon / 2) ** 2
+    )
+    a = np.clip(a, 0.0, 1.0)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def _haversine_km_scalar(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу (км) для одной пары точек
+
+    Для одиночных вызовов (в том числе SQL-функции на каждую строку)
+    math заметно быстрее numpy.
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = lat2_rad - lat1_rad
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = (
+        math.sin(delta_lat / 2) ** 2 +
+        math.cos(lat1_rad) * math.cos(lat2_rad) *
+        math.sin(delta_lon / 2) ** 2
+    )
+    a = min(max(a, 0.0), 1.0)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def _initial_bearing(lat1, lon1, lat2, lon2):
+    """Начальное направление (градусы); аргументы — числа или массивы"""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    delta_lon = np.radians(np.subtract(lon2, lon1))
+    
+    x = np.sin(delta_lon) * np.cos(lat2_rad)
+    y = (
+        np.cos(lat1_rad) * np.sin(lat2_rad) -
+        np.sin(lat1_rad) * np.cos(lat2_rad) * np.cos(delta_lon)
+    )
+    
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
 
 
 @dataclass
@@ -19,7 +85,8 @@ class Location:
 class LocationService: 
     """Сервис для работы с геолокацией"""
     
-    def __init__(self):
+    def __init__(self, geocoder: Optional["ReverseGeocoder"] = None):
+        self._geocoder = geocoder
         self._current_location: Optional[Location] = None
         self._default_location = Location(
             latitude=55.7558,
@@ -41,48 +108,266 @@ class LocationService:
             longitude=lon,
         )
     
+    def get_geocoder(self) -> "ReverseGeocoder":
+        """Обратный геокодер; по умолчанию создаётся по настройкам"""
+        if self._geocoder is None:
+            from src.config.settings import Settings
+            from src.services.geocoding import ReverseGeocoder
+            self._geocoder = ReverseGeocoder.from_settings(Settings.load())
+        return self._geocoder
+    
+    def reverse_geocode(self, lat: float, lon: float) -> Location:
+        """Локация с адресом, городом и регионом для координат"""
+        result = self.get_geocoder().reverse(lat, lon)
+        if result is None:
+            return Location(latitude=lat, longitude=lon)
+        return Location(
+            latitude=lat,
+            longitude=lon,
+            address=result.address,
+            city=result.city,
+            region=result.region,
+        )
+    
+    async def reverse_geocode_async(self, lat: float, lon: float) -> Location:
+        """reverse_geocode() в рабочем потоке, не блокируя цикл событий"""
+        return await asyncio.to_thread(self.reverse_geocode, lat, lon)
+    
+    def enrich_locations(
+        self, locations: Iterable[Any], overwrite: bool = False
+    ) -> int:
+        """Заполнение address/city/region у объектов с latitude и longitude
+        
+        Подходит для Location, UserLocation и IncidentLocation. Работает
+        без сети: используется только локальный справочник и кэши.
+        Возвращает число изменённых объектов.
+        """
+        locations = list(locations)
+        if not locations:
+            return 0
+        lats = np.fromiter((item.latitude for item in locations), float, len(locations))
+        lons = np.fromiter((item.longitude for item in locations), float, len(locations))
+        results = self.get_geocoder().reverse_many(lats, lons)
+        
+        changed = 0
+        for item, result in zip(locations, results):
+            if result is None:
+                continue
+            updated = False
+            for field_name in ("address", "city", "region"):
+                value = getattr(result, field_name)
+                if value is None or not hasattr(item, field_name):
+                    continue
+                if overwrite or not getattr(item, field_name):
+                    setattr(item, field_name, value)
+                    updated = True
+            changed += updated
+        return changed
+    
     @staticmethod
     def calculate_distance(
         lat1: float, lon1: float, lat2: float, lon2: float
     ) -> float:
         """Расчёт расстояния между двумя точками (км)"""
-        R = 6371  # Радиус Земли в км
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        a = (
-            math.sin(delta_lat / 2) ** 2 +
-            math. cos(lat1_rad) * math.cos(lat2_rad) *
-            math.sin(delta_lon / 2) ** 2
-        )
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        return _haversine_km_scalar(lat1, lon1, lat2, lon2)
     
     @staticmethod
     def get_bearing(
         lat1: float, lon1: float, lat2: float, lon2: float
     ) -> float:
         """Расчёт направления между двумя точками (градусы)"""
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        x = math.sin(delta_lon) * math.cos(lat2_rad)
-        y = (
-            math.cos(lat1_rad) * math.sin(lat2_rad) -
-            math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(delta_lon)
+        return float(_initial_bearing(lat1, lon1, lat2, lon2))
+    
+    @staticmethod
+    def calculate_distances(
+        lat: float, lon: float, lats: ArrayLike, lons: ArrayLike
+    ) -> np.ndarray:
+        """Расстояния от одной точки до N точек (км)"""
+        return _haversine_km(
+            lat, lon, np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        )
+    
+    @staticmethod
+    def get_bearings(
+        lat: float, lon: float, lats: ArrayLike, lons: ArrayLike
+    ) -> np.ndarray:
+        """Направления от одной точки на N точек (градусы)"""
+        return _initial_bearing(
+            lat, lon, np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
         )
-        
-        bearing = math. atan2(x, y)
-        bearing = math.degrees(bearing)
-        bearing = (bearing + 360) % 360
-        
-        return bearing
     
+    @staticmethod
+    def distance_matrix(
+        lats1: ArrayLike, lons1: ArrayLike, lats2: ArrayLike, lons2: ArrayLike
+    ) -> np.ndarray:
+        """Матрица расстояний N×M между двумя наборами точек (км)"""
+        return _haversine_km(
+            np.asarray(lats1, dtype=float)[:, None],
+            np.asarray(lons1, dtype=float)[:, None],
+            np.asarray(lats2, dtype=float)[None, :],
+            np.asarray(lons2, dtype=float)[None, :],
+        )
+    
+    @staticmethod
+    def bearing_matrix(
+        lats1: ArrayLike, lons1: ArrayLike, lats2: ArrayLike, lons2: ArrayLike
+    ) -> np.ndarray:
+        """Матрица направлений N×M между двумя наборами точек (градусы)"""
+        return _initial_bearing(
+            np.asarray(lats1, dtype=float)[:, None],
+            np.asarray(lons1, dtype=float)[:, None],
+            np.asarray(lats2, dtype=float)[None, :],
+            np.asarray(lons2, dtype=float)[None, :],
+        )
+    
+    @staticmethod
+    def rank_by_distance(
+        lat: float, lon: float, lats: ArrayLike, lons: ArrayLike,
+        limit: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Индексы и расстояния limit ближайших точек по возрастанию расстояния
+
+        Полная сортировка не выполняется: сначала argpartition отбирает
+        limit кандидатов, затем сортируются только они.
+        """
+        distances = LocationService.calculate_distances(lat, lon, lats, lons)
+        if limit is not None and limit < len(distances):
+            if limit <= 0:
+                return np.empty(0, dtype=int), np.empty(0)
+            candidates = np.argpartition(distances, limit - 1)[:limit]
+            order = candidates[np.argsort(distances[candidates], kind="stable")]
+        else:
+            order = np.argsort(distances, kind="stable")
+        return order, distances[order]
+    
+    @staticmethod
+    def get_bounding_box(
+        lat: float, lon: float, radius_km: float
+    ) -> Tuple[float, float, float, float]:
+        """Ограничивающий прямоугольник круга (min_lat, max_lat, min_lon, max_lon)
+
+        Долготы не нормализуются: у круга, пересекающего антимеридиан,
+        min_lon < -180 или max_lon > 180.
+        """
+        angular = radius_km / EARTH_RADIUS_KM
+        delta_lat = math.degrees(angular)
+        min_lat = lat - delta_lat
+        max_lat = lat + delta_lat
+
+        if min_lat <= -90 or max_lat >= 90 or angular >= math.pi / 2:
+            # Круг накрывает полюс — подходят все долготы
+            return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+        delta_lon = math.degrees(
+            math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat))))
+        )
+        return min_lat, max_lat, lon - delta_lon, lon + delta_lon
+
+    @staticmethod
+    def split_longitude_range(
+        min_lon: float, max_lon: float
+    ) -> List[Tuple[float, float]]:
+        """Разбиение диапазона долгот по антимеридиану"""
+        if max_lon - min_lon >= 360:
+            return [(-180.0, 180.0)]
+        if min_lon < -180:
+            return [(min_lon + 360, 180.0), (-180.0, max_lon)]
+        if max_lon > 180:
+            return [(min_lon, 180.0), (-180.0, max_lon - 360)]
+        return [(min_lon, max_lon)]
+
+    @staticmethod
+    def get_polygon_bounding_box(
+        polygon: List[Tuple[float, float]]
+    ) -> Tuple[float, float, float, float]:
+        """Ограничивающий прямоугольник многоугольника из точек (lat, lon)"""
+        lats = [point[0] for point in polygon]
+        lons = [point[1] for point in polygon]
+        return min(lats), max(lats), min(lons), max(lons)
+
+    @staticmethod
+    def point_in_polygon(
+        lat: float, lon: float, polygon: List[Tuple[float, float]]
+    ) -> bool:
+        """Проверка попадания точки в многоугольник (метод луча)"""
+        inside = False
+        count = len(polygon)
+        for i in range(count):
+            lat1, lon1 = polygon[i]
+            lat2, lon2 = polygon[i - 1]
+            if (lat1 > lat) != (lat2 > lat):
+                cross_lon = lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1)
+                if lon < cross_lon:
+                    inside = not inside
+        return inside
+
+    @staticmethod
+    def distance_to_polygon_edge(
+        lat: float, lon: float, polygon: List[Tuple[float, float]]
+    ) -> float:
+        """Расстояние от точки до границы многоугольника (км)
+
+        Используется локальная равнопромежуточная проекция вокруг точки,
+        что достаточно точно для зон до нескольких сотен километров.
+        """
+        kx = EARTH_RADIUS_KM * math.radians(1) * math.cos(math.radians(lat))
+        ky = EARTH_RADIUS_KM * math.radians(1)
+        best = float('inf')
+        count = len(polygon)
+        for i in range(count):
+            ax = (polygon[i - 1][1] - lon) * kx
+            ay = (polygon[i - 1][0] - lat) * ky
+            bx = (polygon[i][1] - lon) * kx
+            by = (polygon[i][0] - lat) * ky
+            dx, dy = bx - ax, by - ay
+            length = dx * dx + dy * dy
+            t = 0.0 if length == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length))
+            px, py = ax + t * dx, ay + t * dy
+            best = min(best, math.hypot(px, py))
+        return best
+
+    @staticmethod
+    def has_polygon(zone: RiskZone) -> bool:
+        """Зона задана многоугольником; меньше трёх вершин — проверяется как круг"""
+        return bool(zone.polygon) and len(zone.polygon) >= 3
+
+    @staticmethod
+    def get_zone_bounding_box(zone: RiskZone) -> Tuple[float, float, float, float]:
+        """Ограничивающий прямоугольник зоны риска
+
+        Для зоны, пересекающей антимеридиан, диапазон долгот расширяется
+        до полного.
+        """
+        if LocationService.has_polygon(zone):
+            return LocationService.get_polygon_bounding_box(zone.polygon)
+        min_lat, max_lat, min_lon, max_lon = LocationService.get_bounding_box(
+            zone.latitude, zone.longitude, zone.radius_km
+        )
+        if min_lon < -180 or max_lon > 180:
+            min_lon, max_lon = -180.0, 180.0
+        return min_lat, max_lat, min_lon, max_lon
+
+    @staticmethod
+    def zone_intersects(
+        zone: RiskZone, lat: float, lon: float, radius_km: float = 0
+    ) -> bool:
+        """Проверка, что зона риска содержит точку или пересекает круг вокруг неё
+
+        Зона с многоугольником (от трёх вершин) проверяется по многоугольнику,
+        иначе — по кругу.
+        """
+        if LocationService.has_polygon(zone):
+            if LocationService.point_in_polygon(lat, lon, zone.polygon):
+                return True
+            return (
+                radius_km > 0 and
+                LocationService.distance_to_polygon_edge(lat, lon, zone.polygon) <= radius_km
+            )
+        distance = LocationService.calculate_distance(
+            zone.latitude, zone.longitude, lat, lon
+        )
+        return distance <= zone.radius_km + radius_km
+
     @staticmethod
     def get_direction_name(bearing: float) -> str:
         """Получение названия направления"""
@@ -100,13 +385,9 @@ class LocationService:
         if not points:
             return None
         
-        min_distance = float('inf')
-        min_index = 0
-        
-        for i, (lat, lon) in enumerate(points):
-            distance = self.calculate_distance(from_lat, from_lon, lat, lon)
-            if distance < min_distance: 
-                min_distance = distance
-                min_index = i
-        
-        return min_index, min_distance
\ No newline at end of file
+        coords = np.asarray(points, dtype=float)
+        distances = self.calculate_distances(
+            from_lat, from_lon, coords[:, 0], coords[:, 1]
+        )
+        min_index = int(np.argmin(distances))
+        return min_index, float(distances[min_index])
@@ -1,9 +1,11 @@
 """Сервис управления рисками"""
 
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
 from src.models.risk import Risk, RiskLevel, RiskType, RiskZone
 from src.services.database_service import DatabaseService
+from src.services.location_service import LocationService
+from src.services.zone_engine import ZoneMatcher
 
 
 class RiskService:
@@ -12,6 +14,7 @@ class RiskService:
     def __init__(self, db_service:  Optional[DatabaseService] = None):
         self.db_service = db_service or DatabaseService()
         self._cache:  Dict[str, Risk] = {}
+        self._zone_matcher = ZoneMatcher()
     
     async def get_active_risks(
         self, lat:  Optional[float] = None, lon: Optional[float] = None
@@ -30,9 +33,33 @@ class RiskService:
         self, lat: float, lon: float, radius_km: float = 50
     ) -> List[Risk]:
         """Получение рисков для локации"""
-        all_risks = await self.get_active_risks()
-        # В реальном приложении здесь была бы фильтрация по расстоянию
-        return all_risks
+        all_risks = await self.get_active_risks(lat, lon)
+        return [
+            risk for risk in all_risks
+            if LocationService.zone_intersects(risk.zone, lat, lon, radius_km)
+        ]
+    
+    async def get_risks_at_locations(
+        self, points: List[Tuple[float, float]]
+    ) -> List[List[Risk]]:
+        """Получение рисков, зоны которых содержат каждую из точек"""
+        if not points:
+            return []
+        matcher = self._sync_zone_matcher(await self.get_active_risks())
+        lats = [point[0] for point in points]
+        lons = [point[1] for point in points]
+        return matcher.zones_containing(lats, lons)
+    
+    def _sync_zone_matcher(self, risks: List[Risk]) -> ZoneMatcher:
+        """Обновление подготовленных зон: заново готовятся только изменённые"""
+        matcher = self._zone_matcher
+        current = {risk.id: risk for risk in risks}
+        for risk_id in matcher.keys():
+            if risk_id not in current:
+                matcher.remove(risk_id)
+        for risk_id, risk in current.items():
+            matcher.add(risk_id, risk.zone, risk)
+        return matcher
     
     async def get_risk_statistics(self) -> Dict:
         """Получение статистики по рискам"""
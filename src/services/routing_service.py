@@ -0,0 +1,522 @@
+"""Маршрутизация эвакуации по локальному графу дорог
+
+Граф хранится в сжатом виде (CSR) в файле .npz: координаты узлов,
+смещения и цели рёбер, длины и стоимости рёбер, а также предрасчёт
+ориентиров (landmarks) для ускорения A*. Файл готовится заранее,
+например из выгрузки OSM, через RoadGraph.from_edges(...).save(path).
+"""
+
+import heapq
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+from src.config.settings import Settings
+from src.models.risk import RiskZone
+from src.models.shelter import Shelter
+from src.services.location_service import (
+    ArrayLike, LocationService, _haversine_km, _haversine_km_scalar,
+)
+from src.services.spatial_index import SpatialIndex
+from src.services.zone_engine import ZoneMatcher
+
+
+@dataclass
+class Route:
+    """Маршрут по дорогам"""
+    nodes: List[int]
+    points: List[Tuple[float, float]]
+    length_km: float
+    cost: float  # минуты при заданных скоростях, иначе км
+    shelter_id: Optional[str] = None
+
+
+@dataclass
+class ShelterDistanceField:
+    """Расстояния от каждого узла до ближайшего укрытия по дорогам"""
+    cost: np.ndarray  # стоимость пути до ближайшего укрытия, inf — недостижимо
+    shelter: np.ndarray  # индекс укрытия в shelter_ids, -1 — недостижимо
+    next_node: np.ndarray  # следующий узел на пути к укрытию, -1 — конец пути
+    shelter_ids: List[str] = field(default_factory=list)
+
+
+class RoadGraph:
+    """Ориентированный граф дорог в формате CSR"""
+
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        length_km: np.ndarray,
+        cost: Optional[np.ndarray] = None,
+        landmarks: Optional[np.ndarray] = None,
+        landmark_from: Optional[np.ndarray] = None,
+        landmark_to: Optional[np.ndarray] = None,
+    ):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.length_km = np.asarray(length_km, dtype=float)
+        self.cost = self.length_km if cost is None else np.asarray(cost, dtype=float)
+        self.landmarks = landmarks
+        self.landmark_from = landmark_from  # стоимость от ориентира до узла
+        self.landmark_to = landmark_to  # стоимость от узла до ориентира
+
+        # Обратный граф: рёбра, входящие в узел, с номерами прямых рёбер
+        sources = self.edge_sources()
+        order = np.argsort(self.indices, kind="stable")
+        self.reverse_indptr = np.searchsorted(
+            self.indices[order], np.arange(self.node_count + 1)
+        )
+        self.reverse_indices = sources[order]
+        self.reverse_edges = order
+
+        # Нижняя оценка стоимости на километр для эвристики A*
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = self.cost / self.length_km
+        ratio = ratio[np.isfinite(ratio)]
+        self.min_cost_per_km = float(ratio.min()) if len(ratio) else 1.0
+        self._lists = None
+        self._landmark_views = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def edge_sources(self) -> np.ndarray:
+        """Начальный узел каждого ребра"""
+        return np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+
+    @classmethod
+    def from_edges(
+        cls,
+        lat: ArrayLike,
+        lon: ArrayLike,
+        sources: ArrayLike,
+        targets: ArrayLike,
+        length_km: Optional[ArrayLike] = None,
+        speed_kmh: Optional[ArrayLike] = None,
+        bidirectional: bool = True,
+    ) -> "RoadGraph":
+        """Построение графа из списка рёбер
+
+        Длины по умолчанию — расстояния по большому кругу между узлами.
+        Если заданы скорости, стоимость ребра — время в пути в минутах.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if length_km is None:
+            length = _haversine_km(lat[sources], lon[sources], lat[targets], lon[targets])
+        else:
+            length = np.asarray(length_km, dtype=float)
+        cost = None
+        if speed_kmh is not None:
+            cost = length / np.asarray(speed_kmh, dtype=float) * 60
+
+        if bidirectional:
+            sources, targets = (
+                np.concatenate((sources, targets)), np.concatenate((targets, sources))
+            )
+            length = np.concatenate((length, length))
+            if cost is not None:
+                cost = np.concatenate((cost, cost))
+
+        order = np.lexsort((targets, sources))
+        indptr = np.searchsorted(sources[order], np.arange(len(lat) + 1))
+        return cls(
+            lat, lon, indptr, targets[order], length[order],
+            None if cost is None else cost[order],
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Загрузка графа из файла .npz"""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(**arrays)
+
+    def save(self, path: str):
+        """Сохранение графа в файл .npz"""
+        arrays = {
+            "lat": self.lat,
+            "lon": self.lon,
+            "indptr": self.indptr,
+            "indices": self.indices.astype(np.int32),
+            "length_km": self.length_km.astype(np.float32),
+            "cost": self.cost.astype(np.float32),
+        }
+        if self.landmarks is not None:
+            arrays.update(
+                landmarks=self.landmarks,
+                landmark_from=self.landmark_from,
+                landmark_to=self.landmark_to,
+            )
+        np.savez_compressed(path, **arrays)
+
+    def precompute_landmarks(self, count: int = 8, seed: int = 0):
+        """Предрасчёт ориентиров для A* (алгоритм ALT)
+
+        Ориентиры выбираются последовательно как самые удалённые от уже
+        выбранных. Для каждого запоминаются стоимости путей до всех узлов
+        и от всех узлов; по неравенству треугольника они дают нижнюю
+        оценку остатка пути, которая остаётся допустимой и при
+        перекрытых рёбрах.
+        """
+        count = min(count, self.node_count)
+        rng = np.random.default_rng(seed)
+        chosen = [int(rng.integers(self.node_count))]
+        from_rows, to_rows = [], []
+        closest = np.full(self.node_count, np.inf)
+        while len(from_rows) < count:
+            landmark = chosen[-1]
+            from_rows.append(self._dijkstra_all([landmark], reverse=False))
+            to_rows.append(self._dijkstra_all([landmark], reverse=True))
+            closest = np.minimum(closest, from_rows[-1])
+            reachable = np.where(np.isfinite(closest), closest, -1)
+            if len(from_rows) < count:
+                chosen.append(int(np.argmax(reachable)))
+        self.landmarks = np.array(chosen, dtype=np.int64)
+        self.landmark_from = np.array(from_rows, dtype=np.float32)
+        self.landmark_to = np.array(to_rows, dtype=np.float32)
+        self._landmark_views = None
+
+    def _as_lists(self):
+        """Массивы графа в виде списков Python для быстрого обхода"""
+        if self._lists is None:
+            self._lists = (
+                self.indptr.tolist(), self.indices.tolist(), self.cost.tolist(),
+                self.reverse_indptr.tolist(), self.reverse_indices.tolist(),
+                self.reverse_edges.tolist(),
+            )
+        return self._lists
+
+    def _landmarks_by_node(self):
+        """Стоимости ориентиров построчно по узлам для поэлементного доступа
+
+        Плоские массивы узлы × ориентиры без копирования в списки Python:
+        индексация memoryview сразу даёт float.
+        """
+        if self._landmark_views is None and self.landmarks is not None:
+            self._landmark_views = (
+                len(self.landmarks),
+                memoryview(np.ascontiguousarray(self.landmark_from.T).ravel()),
+                memoryview(np.ascontiguousarray(self.landmark_to.T).ravel()),
+            )
+        return self._landmark_views
+
+    def _dijkstra_all(
+        self,
+        sources: Sequence[int],
+        reverse: bool,
+        blocked: Optional[List[bool]] = None,
+    ) -> np.ndarray:
+        """Стоимости от источников до всех узлов (или от всех узлов до источников)"""
+        dist, _, _ = _search(self, sources, reverse=reverse, blocked=blocked)
+        result = np.full(self.node_count, np.inf)
+        if dist:
+            nodes = np.fromiter(dist.keys(), np.int64, len(dist))
+            result[nodes] = np.fromiter(dist.values(), float, len(dist))
+        return result
+
+
+def _search(
+    graph: RoadGraph,
+    sources: Sequence[int],
+    reverse: bool = False,
+    blocked: Optional[List[bool]] = None,
+    target: Optional[int] = None,
+    targets: Optional[set] = None,
+    heuristic: Optional[Callable[[int], float]] = None,
+):
+    """Дейкстра/A* по графу
+
+    reverse=True — обход по входящим рёбрам (стоимость от узла до
+    источников). blocked — маска запрещённых прямых рёбер. Поиск
+    останавливается на target или на первом узле из targets.
+    heuristic(node) — нижняя оценка остатка пути; считается только для
+    узлов, попавших в очередь, по одному разу.
+    Возвращает словарь стоимостей, словарь предков и достигнутую цель.
+    """
+    indptr, indices, cost, r_indptr, r_indices, r_edges = graph._as_lists()
+    if reverse:
+        indptr, indices = r_indptr, r_indices
+    estimates: Dict[int, float] = {}
+
+    def h(node: int) -> float:
+        if heuristic is None:
+            return 0.0
+        value = estimates.get(node)
+        if value is None:
+            value = estimates[node] = heuristic(node)
+        return value
+
+    dist: Dict[int, float] = {}
+    parent: Dict[int, int] = {}
+    best: Dict[int, float] = {}
+    heap = []
+    for source in sources:
+        best[source] = 0.0
+        parent[source] = -1
+        heap.append((h(source), 0.0, source))
+    heapq.heapify(heap)
+
+    while heap:
+        _, d, node = heapq.heappop(heap)
+        if node in dist:
+            continue
+        dist[node] = d
+        if node == target or (targets is not None and node in targets):
+            return dist, parent, node
+        for i in range(indptr[node], indptr[node + 1]):
+            edge = r_edges[i] if reverse else i
+            if blocked is not None and blocked[edge]:
+                continue
+            neighbour = indices[i]
+            if neighbour in dist:
+                continue
+            candidate = d + cost[edge]
+            if candidate < best.get(neighbour, float("inf")):
+                best[neighbour] = candidate
+                parent[neighbour] = node
+                estimate = candidate + h(neighbour)
+                heapq.heappush(heap, (estimate, candidate, neighbour))
+    return dist, parent, None
+
+
+class RoutingService:
+    """Маршруты от человека до укрытия по дорогам
+
+    Зоны, которых нужно избегать, задаются во время запроса: по ним
+    строится маска рёбер, входящих в зону снаружи. Путь, начатый вне зон,
+    в них не заходит; путь, начатый внутри зоны, может из неё выйти.
+    """
+
+    def __init__(self, graph: RoadGraph):
+        self.graph = graph
+        self._nodes = SpatialIndex()
+        self._nodes.bulk_load(
+            (i, lat, lon, None)
+            for i, (lat, lon) in enumerate(zip(graph.lat.tolist(), graph.lon.tolist()))
+        )
+        self._avoid_mask: Optional[List[bool]] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Optional["RoutingService"]:
+        """Создание по настройкам; без файла графа маршрутизация недоступна"""
+        if not os.path.exists(settings.road_graph_path):
+            return None
+        return cls(RoadGraph.load(settings.road_graph_path))
+
+    def nearest_node(self, lat: float, lon: float) -> Optional[int]:
+        """Ближайший к точке узел графа"""
+        found = self._nodes.nearest(lat, lon)
+        return found[0][0] if found else None
+
+    def set_avoid_zones(self, zones: Iterable[RiskZone]):
+        """Зоны, которых избегают все последующие запросы"""
+        self._avoid_mask = self.blocked_edges(zones)
+
+    def clear_avoid_zones(self):
+        """Отмена обхода зон"""
+        self._avoid_mask = None
+
+    def blocked_edges(self, zones: Iterable[RiskZone]) -> Optional[List[bool]]:
+        """Маска рёбер, ведущих снаружи внутрь зон"""
+        matcher = ZoneMatcher()
+        for i, zone in enumerate(zones):
+            matcher.add(i, zone)
+        if not len(matcher):
+            return None
+        graph = self.graph
+        inside = np.zeros(graph.node_count, dtype=bool)
+        pairs = matcher.match_pairs(graph.lat, graph.lon)
+        if pairs:
+            inside[[node for node, _ in pairs]] = True
+        mask = ~inside[graph.edge_sources()] & inside[graph.indices]
+        return mask.tolist()
+
+    def route(
+        self,
+        from_lat: float,
+        from_lon: float,
+        to_lat: float,
+        to_lon: float,
+        avoid_zones: Optional[Iterable[RiskZone]] = None,
+    ) -> Optional[Route]:
+        """Кратчайший маршрут между точками (A*)"""
+        source = self.nearest_node(from_lat, from_lon)
+        target = self.nearest_node(to_lat, to_lon)
+        if source is None or target is None:
+            return None
+        blocked = self._blocked(avoid_zones)
+        dist, parent, reached = _search(
+            self.graph, [source], blocked=blocked, target=target,
+            heuristic=self._heuristic(target),
+        )
+        if reached is None:
+            return None
+        return self._build_route(self._path(parent, reached), dist[reached])
+
+    def route_to_nearest_shelter(
+        self,
+        lat: float,
+        lon: float,
+        shelters: Iterable[Shelter],
+        avoid_zones: Optional[Iterable[RiskZone]] = None,
+    ) -> Optional[Route]:
+        """Маршрут до ближайшего по дорогам укрытия"""
+        source = self.nearest_node(lat, lon)
+        if source is None:
+            return None
+        by_node: Dict[int, str] = {}
+        for shelter in shelters:
+            node = self.nearest_node(shelter.location.latitude, shelter.location.longitude)
+            by_node.setdefault(node, shelter.id)
+        if not by_node:
+            return None
+        dist, parent, reached = _search(
+            self.graph, [source], blocked=self._blocked(avoid_zones),
+            targets=set(by_node),
+        )
+        if reached is None:
+            return None
+        route = self._build_route(self._path(parent, reached), dist[reached])
+        route.shelter_id = by_node[reached]
+        return route
+
+    def shelter_distance_field(
+        self,
+        shelters: Iterable[Shelter],
+        avoid_zones: Optional[Iterable[RiskZone]] = None,
+    ) -> ShelterDistanceField:
+        """Поиск сразу от всех укрытий: ближайшее укрытие для каждого узла
+
+        Один обход по обратным рёбрам даёт для любого узла стоимость пути
+        до ближайшего укрытия и следующий шаг к нему.
+        """
+        shelters = list(shelters)
+        graph = self.graph
+        owner: Dict[int, int] = {}
+        for i, shelter in enumerate(shelters):
+            node = self.nearest_node(shelter.location.latitude, shelter.location.longitude)
+            owner.setdefault(node, i)
+        dist, parent, _ = _search(
+            graph, list(owner), reverse=True, blocked=self._blocked(avoid_zones)
+        )
+
+        cost = np.full(graph.node_count, np.inf)
+        nearest = np.full(graph.node_count, -1, dtype=np.int64)
+        next_node = np.full(graph.node_count, -1, dtype=np.int64)
+        # Узлы в порядке возрастания стоимости: укрытие предка уже известно
+        for node in sorted(dist, key=dist.get):
+            cost[node] = dist[node]
+            step = parent[node]
+            next_node[node] = step
+            nearest[node] = owner[node] if step == -1 else nearest[step]
+        return ShelterDistanceField(
+            cost=cost,
+            shelter=nearest,
+            next_node=next_node,
+            shelter_ids=[shelter.id for shelter in shelters],
+        )
+
+    def route_from_field(
+        self, field: ShelterDistanceField, lat: float, lon: float
+    ) -> Optional[Route]:
+        """Маршрут до ближайшего укрытия по готовому полю расстояний"""
+        node = self.nearest_node(lat, lon)
+        if node is None or field.shelter[node] < 0:
+            return None
+        path = [node]
+        while field.next_node[path[-1]] >= 0:
+            path.append(int(field.next_node[path[-1]]))
+        route = self._build_route(path, float(field.cost[node]))
+        route.shelter_id = field.shelter_ids[field.shelter[node]]
+        return route
+
+    def _blocked(self, avoid_zones: Optional[Iterable[RiskZone]]) -> Optional[List[bool]]:
+        """Маска рёбер для запроса"""
+        if avoid_zones is None:
+            return self._avoid_mask
+        return self.blocked_edges(avoid_zones)
+
+    def _heuristic(self, target: int) -> Callable[[int], float]:
+        """Нижняя оценка стоимости пути от узла до цели
+
+        Оценка считается по требованию для каждого узла, который
+        просматривает поиск, а не для всего графа: стоимость запроса не
+        зависит от размера графа.
+        """
+        graph = self.graph
+        lat = memoryview(np.ascontiguousarray(graph.lat))
+        lon = memoryview(np.ascontiguousarray(graph.lon))
+        target_lat, target_lon = lat[target], lon[target]
+        per_km = graph.min_cost_per_km
+
+        def straight(node: int) -> float:
+            return _haversine_km_scalar(target_lat, target_lon, lat[node], lon[node]) * per_km
+
+        views = graph._landmarks_by_node()
+        if views is None:
+            return straight
+        count, cost_from, cost_to = views
+        base = target * count
+        from_target = cost_from[base:base + count].tolist()
+        to_target = cost_to[base:base + count].tolist()
+        inf = float("inf")
+
+        def estimate(node: int) -> float:
+            best = straight(node)
+            offset = node * count
+            for i in range(count):
+                # Недостижимые ориентиры дают inf или inf - inf = nan: пропускаются
+                bound = from_target[i] - cost_from[offset + i]
+                if best < bound < inf:
+                    best = bound
+                bound = cost_to[offset + i] - to_target[i]
+                if best < bound < inf:
+                    best = bound
+            return best
+
+        return estimate
+
+    @staticmethod
+    def _path(parent: Dict[int, int], node: int) -> List[int]:
+        """Восстановление пути по предкам"""
+        path = []
+        while node != -1:
+            path.append(node)
+            node = parent[node]
+        path.reverse()
+        return path
+
+    def _build_route(self, path: List[int], cost: float) -> Route:
+        """Маршрут по списку узлов"""
+        graph = self.graph
+        nodes = np.asarray(path, dtype=np.int64)
+        return Route(
+            nodes=path,
+            points=list(zip(graph.lat[nodes].tolist(), graph.lon[nodes].tolist())),
+            length_km=self._path_length(path),
+            cost=float(cost),
+        )
+
+    def _path_length(self, path: List[int]) -> float:
+        """Длина пути по длинам рёбер графа"""
+        graph = self.graph
+        total = 0.0
+        for u, v in zip(path[:-1], path[1:]):
+            start, end = graph.indptr[u], graph.indptr[u + 1]
+            edges = np.flatnonzero(graph.indices[start:end] == v) + start
+            total += float(graph.length_km[edges].min())
+        return total
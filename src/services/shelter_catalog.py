@@ -0,0 +1,166 @@
+"""Каталог укрытий со вторичными индексами"""
+
+from bisect import bisect_left
+from itertools import islice
+from types import MappingProxyType
+from typing import (
+    Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple,
+)
+from src.models.shelter import Shelter
+
+
+class CapacityView(Sequence):
+    """Укрытия с достаточной вместимостью в порядке возрастания свободных мест
+
+    Представление только для чтения поверх отсортированного индекса:
+    граница ищется двоичным поиском при каждом обращении, список не
+    копируется.
+    """
+
+    def __init__(self, catalog: "ShelterCatalog", min_capacity: int):
+        self._catalog = catalog
+        self._key = (min_capacity, "")
+
+    @property
+    def _start(self) -> int:
+        return bisect_left(self._catalog._capacity_keys, self._key)
+
+    def __len__(self) -> int:
+        return len(self._catalog._capacity_keys) - self._start
+
+    def __getitem__(self, index):
+        start = self._start
+        count = len(self._catalog._capacity_keys) - start
+        if isinstance(index, slice):
+            return [
+                self._catalog._capacity_shelters[start + i]
+                for i in range(*index.indices(count))
+            ]
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError(index)
+        return self._catalog._capacity_shelters[start + index]
+
+    def __iter__(self) -> Iterator[Shelter]:
+        return islice(self._catalog._capacity_shelters, self._start, None)
+
+
+class ShelterCatalog:
+    """Укрытия с индексами по ID, типу, активности и свободным местам
+
+    Индексы обновляются при добавлении, удалении и reindex — его нужно
+    вызвать после изменения типа, активности или вместимости укрытия.
+    Методы выборки возвращают представления только для чтения, которые
+    отражают последующие изменения каталога.
+    """
+
+    def __init__(self, shelters: Iterable[Shelter] = ()):
+        self._by_id: Dict[str, Shelter] = {}
+        self._by_type: Dict[str, Dict[str, Shelter]] = {}
+        self._active: Dict[str, Shelter] = {}
+        # Активные укрытия, отсортированные по (свободные места, ID)
+        self._capacity_keys: List[Tuple[int, str]] = []
+        self._capacity_shelters: List[Shelter] = []
+        # Ключи, под которыми укрытие сейчас лежит в индексах
+        self._indexed: Dict[str, Tuple[str, bool, int]] = {}
+        for shelter in {s.id: s for s in shelters}.values():
+            self._by_id[shelter.id] = shelter
+            self._index(shelter, sorted_insert=False)
+        # Индекс вместимости при начальной загрузке сортируется один раз
+        order = sorted(range(len(self._capacity_keys)), key=self._capacity_keys.__getitem__)
+        self._capacity_keys = [self._capacity_keys[i] for i in order]
+        self._capacity_shelters = [self._capacity_shelters[i] for i in order]
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, shelter_id: str) -> bool:
+        return shelter_id in self._by_id
+
+    def __iter__(self) -> Iterator[Shelter]:
+        return iter(self._by_id.values())
+
+    def add(self, shelter: Shelter):
+        """Добавление или замена укрытия"""
+        if shelter.id in self._by_id:
+            self._unindex(shelter.id)
+        self._by_id[shelter.id] = shelter
+        self._index(shelter)
+
+    def remove(self, shelter_id: str) -> Optional[Shelter]:
+        """Удаление укрытия; возвращает удалённое"""
+        if shelter_id not in self._by_id:
+            return None
+        self._unindex(shelter_id)
+        return self._by_id.pop(shelter_id)
+
+    def reindex(self, shelter_id: str) -> bool:
+        """Обновление индексов после изменения укрытия на месте"""
+        shelter = self._by_id.get(shelter_id)
+        if shelter is None:
+            return False
+        if self._indexed[shelter_id] != self._keys(shelter):
+            self._unindex(shelter_id)
+            self._index(shelter)
+        return True
+
+    def get(self, shelter_id: str) -> Optional[Shelter]:
+        """Укрытие по ID"""
+        return self._by_id.get(shelter_id)
+
+    def all(self) -> Collection[Shelter]:
+        """Все укрытия"""
+        return MappingProxyType(self._by_id).values()
+
+    def active(self) -> Collection[Shelter]:
+        """Активные укрытия"""
+        return MappingProxyType(self._active).values()
+
+    def by_type(self, shelter_type: str) -> Collection[Shelter]:
+        """Укрытия заданного типа"""
+        shelters = self._by_type.get(shelter_type)
+        if shelters is None:
+            # Пустой индекс создаётся, чтобы представление видело будущие добавления
+            shelters = self._by_type.setdefault(shelter_type, {})
+        return MappingProxyType(shelters).values()
+
+    def types(self) -> Mapping[str, int]:
+        """Число укрытий по типам"""
+        return {name: len(items) for name, items in self._by_type.items() if items}
+
+    def with_capacity(self, min_capacity: int = 1) -> CapacityView:
+        """Активные укрытия, где свободно не меньше min_capacity мест"""
+        return CapacityView(self, min_capacity)
+
+    def count_with_capacity(self, min_capacity: int = 1) -> int:
+        """Число активных укрытий с не меньше чем min_capacity свободными местами"""
+        return len(self.with_capacity(min_capacity))
+
+    @staticmethod
+    def _keys(shelter: Shelter) -> Tuple[str, bool, int]:
+        return shelter.shelter_type, shelter.is_active, shelter.capacity.available
+
+    def _index(self, shelter: Shelter, sorted_insert: bool = True):
+        keys = self._keys(shelter)
+        shelter_type, is_active, available = keys
+        self._indexed[shelter.id] = keys
+        self._by_type.setdefault(shelter_type, {})[shelter.id] = shelter
+        if is_active:
+            self._active[shelter.id] = shelter
+            key = (available, shelter.id)
+            if sorted_insert:
+                position = bisect_left(self._capacity_keys, key)
+            else:
+                position = len(self._capacity_keys)
+            self._capacity_keys.insert(position, key)
+            self._capacity_shelters.insert(position, shelter)
+
+    def _unindex(self, shelter_id: str):
+        shelter_type, is_active, available = self._indexed.pop(shelter_id)
+        self._by_type[shelter_type].pop(shelter_id, None)
+        if is_active:
+            del self._active[shelter_id]
+            position = bisect_left(self._capacity_keys, (available, shelter_id))
+            del self._capacity_keys[position]
+            del self._capacity_shelters[position]
@@ -0,0 +1,252 @@
+"""Бронирование мест в укрытиях и текущая заполненность"""
+
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Mapping, Optional
+
+from src.config.settings import Settings
+
+if TYPE_CHECKING:
+    from src.services.database_service import DatabaseService
+
+
+class ReservationError(RuntimeError):
+    """Бронирование невозможно"""
+
+
+class ShelterFullError(ReservationError):
+    """В укрытии недостаточно свободных мест"""
+
+
+class ReservationNotFoundError(ReservationError):
+    """Бронь не найдена, уже снята или истекла"""
+
+
+class VersionConflictError(ReservationError):
+    """Укрытие изменено другим запросом"""
+
+
+@dataclass
+class Reservation:
+    """Бронь мест в укрытии"""
+    id: str
+    shelter_id: str
+    people: int
+    status: str  # held, confirmed, released, expired
+    created_at: Optional[str] = None
+    expires_at: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Occupancy:
+    """Заполненность укрытия с версией строки"""
+    shelter_id: str
+    current: int
+    total: int
+    version: int
+    is_active: bool = True
+
+    @property
+    def available(self) -> int:
+        return self.total - self.current
+
+    @property
+    def occupancy_percent(self) -> float:
+        if self.total == 0:
+            return 0
+        return (self.current / self.total) * 100
+
+    @classmethod
+    def from_row(cls, row) -> "Occupancy":
+        return cls(
+            shelter_id=row["id"],
+            current=row["capacity_current"] or 0,
+            total=row["capacity_total"] or 0,
+            version=row["version"],
+            is_active=bool(row["is_active"]),
+        )
+
+
+OccupancyListener = Callable[[Occupancy], None]
+
+
+class ShelterReservations:
+    """Бронирование мест с атомарными изменениями заполненности
+
+    Все изменения идут через писателя базы одним условным UPDATE с
+    проверкой свободных мест и увеличением версии, поэтому параллельные
+    брони не превышают вместимость. Занятые места (capacity_current)
+    включают удерживаемые и подтверждённые брони; удержание без
+    подтверждения снимается по истечении срока.
+
+    Чтение заполненности идёт из представления в памяти, которое
+    обновляется по результатам записей. Изменения рассылаются подписчикам
+    через очереди: при переполнении очереди отбрасываются самые старые
+    события, карте достаточно последнего состояния.
+    """
+
+    def __init__(
+        self,
+        db_service: "DatabaseService",
+        hold_ttl: float = 900.0,
+        sweep_interval: float = 30.0,
+        queue_size: int = 1000,
+    ):
+        self.db_service = db_service
+        self.hold_ttl = hold_ttl
+        self.sweep_interval = sweep_interval
+        self.queue_size = queue_size
+        self._view: Dict[str, Occupancy] = {}
+        self._subscribers: List[asyncio.Queue] = []
+        self._listeners: List[OccupancyListener] = []
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(
+        cls, db_service: "DatabaseService", settings: Settings
+    ) -> "ShelterReservations":
+        """Создание по настройкам приложения"""
+        return cls(
+            db_service,
+            hold_ttl=settings.reservation_hold_ttl,
+            sweep_interval=settings.reservation_sweep_interval,
+        )
+
+    async def start(self):
+        """Загрузка заполненности и запуск снятия просроченных броней"""
+        await self.refresh()
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        """Остановка фоновой задачи"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def refresh(self, shelter_ids: Optional[Iterable[str]] = None):
+        """Перечитывание заполненности из базы (например, после пакетной записи)"""
+        rows = await self.db_service.get_shelter_occupancy(
+            None if shelter_ids is None else list(shelter_ids)
+        )
+        self._apply(rows)
+
+    async def reserve(
+        self, shelter_id: str, people: int, ttl: Optional[float] = None
+    ) -> Reservation:
+        """Удержание мест до подтверждения или истечения срока"""
+        if people <= 0:
+            raise ValueError("Количество мест должно быть положительным")
+        now = datetime.now()
+        hold = self.hold_ttl if ttl is None else ttl
+        reservation = Reservation(
+            id=uuid.uuid4().hex,
+            shelter_id=shelter_id,
+            people=people,
+            status="held",
+            created_at=now.isoformat(),
+            expires_at=(now + timedelta(seconds=hold)).isoformat(),
+        )
+        row = await self.db_service.reserve_shelter_places(reservation)
+        self._apply([row])
+        return reservation
+
+    async def confirm(self, reservation_id: str) -> Reservation:
+        """Подтверждение удерживаемой брони: места остаются занятыми"""
+        return await self.db_service.confirm_shelter_reservation(
+            reservation_id, datetime.now().isoformat()
+        )
+
+    async def release(self, reservation_id: str) -> Reservation:
+        """Снятие брони с освобождением мест"""
+        reservation, row = await self.db_service.release_shelter_reservation(
+            reservation_id
+        )
+        self._apply([row])
+        return reservation
+
+    async def set_capacity(
+        self, shelter_id: str, total: int, expected_version: int
+    ) -> Occupancy:
+        """Изменение вместимости при совпадении версии
+
+        expected_version — версия, которую видел вызывающий; если укрытие
+        успели изменить, возникает VersionConflictError.
+        """
+        row = await self.db_service.update_shelter_capacity(
+            shelter_id, total, expected_version
+        )
+        return self._apply([row])[0]
+
+    async def expire_stale(self) -> int:
+        """Снятие просроченных удержаний; возвращает число броней"""
+        expired, rows = await self.db_service.expire_shelter_reservations(
+            datetime.now().isoformat()
+        )
+        self._apply(rows)
+        return expired
+
+    def get_occupancy(self, shelter_id: str) -> Optional[Occupancy]:
+        """Заполненность укрытия из памяти"""
+        return self._view.get(shelter_id)
+
+    def get_occupancy_view(self) -> Mapping[str, Occupancy]:
+        """Заполненность всех укрытий (только чтение)"""
+        return MappingProxyType(self._view)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Очередь изменений заполненности"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Отписка от изменений"""
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def add_listener(self, listener: OccupancyListener):
+        """Синхронный обработчик изменений (вызывается до рассылки в очереди)"""
+        self._listeners.append(listener)
+
+    def _apply(self, rows) -> List[Occupancy]:
+        """Обновление представления; устаревшие версии игнорируются"""
+        changes = []
+        for row in rows:
+            occupancy = Occupancy.from_row(row)
+            known = self._view.get(occupancy.shelter_id)
+            if known is not None and known.version >= occupancy.version:
+                changes.append(known)
+                continue
+            self._view[occupancy.shelter_id] = occupancy
+            changes.append(occupancy)
+            self._publish(occupancy)
+        return changes
+
+    def _publish(self, occupancy: Occupancy):
+        """Рассылка изменения"""
+        for listener in self._listeners:
+            listener(occupancy)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(occupancy)
+
+    async def _sweep_loop(self):
+        """Периодическое снятие просроченных удержаний"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.expire_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Ошибка одного прохода не останавливает задачу
+                continue
@@ -1,16 +1,32 @@
 """Сервис укрытий"""
 
-from typing import List, Optional
+from typing import Collection, Iterable, List, Optional, Sequence, Tuple
 from src.models.shelter import Shelter, ShelterLocation, ShelterCapacity
 from src. services.location_service import LocationService
+from src.services.spatial_index import SpatialIndex
+from src.services.shelter_catalog import ShelterCatalog
+from src.services.evacuation_planner import (
+    EvacuationPlan, EvacuationPlanner, PopulationCell,
+)
+from src.services.shelter_reservations import (
+    Occupancy, Reservation, ReservationError, ShelterReservations,
+)
 
 
 class ShelterService:
     """Сервис для работы с укрытиями"""
     
-    def __init__(self):
+    def __init__(self, reservations: Optional[ShelterReservations] = None):
         self. location_service = LocationService()
-        self._shelters = self._load_mock_shelters()
+        self._catalog = ShelterCatalog(self._load_mock_shelters())
+        self._index = SpatialIndex()
+        self._index.bulk_load(
+            (s.id, s.location.latitude, s.location.longitude, s)
+            for s in self._catalog
+        )
+        self.reservations = reservations
+        if reservations is not None:
+            reservations.add_listener(self._apply_occupancy)
     
     def _load_mock_shelters(self) -> List[Shelter]: 
         """Загрузка моковых данных об укрытиях"""
@@ -62,45 +78,108 @@ class ShelterService:
             ),
         ]
     
-    def get_all_shelters(self) -> List[Shelter]:
-        """Получение всех укрытий"""
-        return self._shelters
+    def get_all_shelters(self) -> Collection[Shelter]:
+        """Получение всех укрытий (представление только для чтения)"""
+        return self._catalog.all()
     
-    def get_active_shelters(self) -> List[Shelter]:
-        """Получение активных укрытий"""
-        return [s for s in self._shelters if s.is_active]
+    def get_active_shelters(self) -> Collection[Shelter]:
+        """Получение активных укрытий (представление только для чтения)"""
+        return self._catalog.active()
     
     def get_shelter_by_id(self, shelter_id:  str) -> Optional[Shelter]:
         """Получение укрытия по ID"""
-        for shelter in self._shelters:
-            if shelter.id == shelter_id:
-                return shelter
-        return None
+        return self._catalog.get(shelter_id)
     
-    def get_shelters_by_type(self, shelter_type: str) -> List[Shelter]: 
-        """Получение укрытий по типу"""
-        return [s for s in self._shelters if s.shelter_type == shelter_type]
+    def get_shelters_by_type(self, shelter_type: str) -> Collection[Shelter]: 
+        """Получение укрытий по типу (представление только для чтения)"""
+        return self._catalog.by_type(shelter_type)
+    
+    def update_shelter(self, shelter_id: str) -> bool:
+        """Обновление индексов после изменения типа, статуса или вместимости"""
+        return self._catalog.reindex(shelter_id)
+    
+    @staticmethod
+    def _is_available(min_capacity: int):
+        """Условие: укрытие активно и вмещает не меньше min_capacity человек"""
+        return lambda shelter: (
+            shelter.is_active and shelter.capacity.available >= min_capacity
+        )
+    
+    def add_shelter(self, shelter: Shelter):
+        """Добавление или замена укрытия"""
+        self._catalog.add(shelter)
+        self._index.insert(
+            shelter.id, shelter.location.latitude, shelter.location.longitude, shelter
+        )
+    
+    def remove_shelter(self, shelter_id: str) -> bool:
+        """Удаление укрытия"""
+        if self._catalog.remove(shelter_id) is None:
+            return False
+        self._index.remove(shelter_id)
+        return True
     
     def get_nearest_shelters(
-        self, lat: float, lon: float, limit: int = 5
+        self, lat: float, lon: float, limit: int = 5, min_capacity: int = 0
+    ) -> List[tuple]:
+        """Получение ближайших укрытий с расстоянием
+        
+        Активность и вместимость проверяются в момент запроса, поэтому
+        изменение статуса укрытия не требует обновления индекса.
+        """
+        return self._index.nearest(
+            lat, lon, k=limit, predicate=self._is_available(min_capacity)
+        )
+    
+    def get_shelters_within_radius(
+        self, lat: float, lon: float, radius_km: float, min_capacity: int = 0
     ) -> List[tuple]:
-        """Получение ближайших укрытий с расстоянием"""
-        shelters_with_distance = []
+        """Получение укрытий в радиусе с расстоянием"""
+        return self._index.within_radius(
+            lat, lon, radius_km, predicate=self._is_available(min_capacity)
+        )
+    
+    def get_shelters_with_capacity(self, min_capacity: int = 1) -> Sequence[Shelter]: 
+        """Получение укрытий с доступной вместимостью
         
-        for shelter in self. get_active_shelters():
-            distance = self.location_service.calculate_distance(
-                lat, lon,
-                shelter.location.latitude,
-                shelter.location.longitude
-            )
-            shelters_with_distance.append((shelter, distance))
+        Активные укрытия в порядке возрастания свободных мест.
+        """
+        return self._catalog.with_capacity(min_capacity)
+    
+    def plan_evacuation(
+        self, cells: Iterable[PopulationCell]
+    ) -> Tuple[EvacuationPlanner, EvacuationPlan]:
+        """Распределение участков населения по активным укрытиям
         
-        shelters_with_distance.sort(key=lambda x: x[1])
-        return shelters_with_distance[:limit]
+        Планировщик возвращается вместе с планом, чтобы перераспределять
+        людей при закрытии или заполнении укрытий.
+        """
+        planner = EvacuationPlanner(self.get_active_shelters())
+        return planner, planner.plan(cells)
     
-    def get_shelters_with_capacity(self, min_capacity: int = 1) -> List[Shelter]: 
-        """Получение укрытий с доступной вместимостью"""
-        return [
-            s for s in self. get_active_shelters()
-            if s.capacity.available >= min_capacity
-        ]
\ No newline at end of file
+    def _require_reservations(self) -> ShelterReservations:
+        if self.reservations is None:
+            raise ReservationError("Бронирование мест не подключено")
+        return self.reservations
+    
+    async def reserve_places(
+        self, shelter_id: str, people: int, ttl: Optional[float] = None
+    ) -> Reservation:
+        """Удержание мест в укрытии до подтверждения"""
+        return await self._require_reservations().reserve(shelter_id, people, ttl)
+    
+    async def confirm_reservation(self, reservation_id: str) -> Reservation:
+        """Подтверждение брони (человек прибыл в укрытие)"""
+        return await self._require_reservations().confirm(reservation_id)
+    
+    async def release_reservation(self, reservation_id: str) -> Reservation:
+        """Снятие брони с освобождением мест"""
+        return await self._require_reservations().release(reservation_id)
+    
+    def _apply_occupancy(self, occupancy: Occupancy):
+        """Перенос заполненности из бронирования в модель укрытия"""
+        shelter = self.get_shelter_by_id(occupancy.shelter_id)
+        if shelter is not None:
+            shelter.capacity.current = occupancy.current
+            shelter.capacity.total = occupancy.total
+            self._catalog.reindex(shelter.id)
@@ -0,0 +1,61 @@
+"""Объединение одновременных одинаковых запросов"""
+
+import asyncio
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+@dataclass
+class SingleFlightStats:
+    """Счётчики объединения запросов"""
+    calls: int = 0  # обращений к do()
+    executions: int = 0  # реально выполненных запросов
+    saved: int = 0  # обращений, получивших результат чужого запроса
+    errors: int = 0  # выполненных запросов, завершившихся ошибкой
+
+    def to_dict(self) -> dict:
+        """Преобразование в словарь"""
+        return asdict(self)
+
+
+class SingleFlight:
+    """Один выполняющийся запрос на ключ
+
+    Вызовы do() с одинаковым ключом, пока запрос выполняется, ждут его
+    же результата или ошибки. Запрос выполняется отдельной задачей:
+    отмена одного из ожидающих не отменяет его для остальных.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = SingleFlightStats()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат fetch() для ключа с объединением одновременных вызовов"""
+        self.stats.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            self.stats.executions += 1
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        else:
+            self.stats.saved += 1
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> dict:
+        """Снимок счётчиков"""
+        data = self.stats.to_dict()
+        data["inflight"] = len(self._inflight)
+        return data
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.stats.errors += 1
@@ -0,0 +1,327 @@
+"""Пространственный индекс точек для поиска ближайших соседей"""
+
+import heapq
+import math
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import numpy as np
+
+from src.services.location_service import EARTH_RADIUS_KM
+
+
+Predicate = Callable[[Any], bool]
+
+
+def _to_unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Точки (lat, lon) в единичные векторы на сфере"""
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((
+        cos_lat * np.cos(lon_rad),
+        cos_lat * np.sin(lon_rad),
+        np.sin(lat_rad),
+    ))
+
+
+def _chord_to_km(chord_sq: np.ndarray) -> np.ndarray:
+    """Квадрат длины хорды в расстояние по большому кругу (км)"""
+    half = np.sqrt(np.asarray(chord_sq)) / 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(half, 1.0))
+
+
+def _km_to_chord_sq(distance_km: float) -> float:
+    """Расстояние по большому кругу (км) в квадрат длины хорды"""
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return (2 * math.sin(angle / 2)) ** 2
+
+
+class SpatialIndex:
+    """k-d дерево по трёхмерным единичным векторам точек на сфере
+
+    Евклидово расстояние между единичными векторами (хорда) монотонно
+    связано с расстоянием по большому кругу, поэтому дерево корректно
+    работает по всей сфере, включая антимеридиан и полюса.
+
+    Вставки попадают в небольшой буфер, который просматривается векторно
+    и вливается в дерево при перестройке; удаления помечают точку
+    удалённой. Дерево перестраивается, когда буфер превышает max_pending
+    точек или доля удалённых точек превышает rebuild_ratio.
+    """
+
+    def __init__(
+        self,
+        leaf_size: int = 32,
+        rebuild_ratio: float = 0.1,
+        max_pending: int = 4096,
+    ):
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.max_pending = max_pending
+
+        self._xyz = np.empty((0, 3))
+        self._keys: List[Hashable] = []
+        self._payloads: List[Any] = []
+        self._alive: List[bool] = []
+        self._slots: Dict[Hashable, int] = {}
+        self._dead = 0
+
+        # Дерево: узлы в плоских списках, листья ссылаются на отрезок _perm
+        self._perm = np.empty(0, dtype=np.int64)
+        self._lo: List[Tuple[float, float, float]] = []
+        self._hi: List[Tuple[float, float, float]] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._start: List[int] = []
+        self._end: List[int] = []
+
+        # Буфер вставок после последней перестройки
+        self._pending: List[int] = []
+        self._pending_xyz = np.empty((0, 3))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def get(self, key: Hashable) -> Any:
+        """Полезная нагрузка точки по ключу"""
+        return self._payloads[self._slots[key]]
+
+    def bulk_load(self, items: Iterable[Tuple[Hashable, float, float, Any]]):
+        """Загрузка множества точек (key, lat, lon, payload) с перестройкой"""
+        items = list(items)
+        if not items:
+            return
+        for key, *_ in items:
+            self._discard(key)
+        lats = np.fromiter((item[1] for item in items), float, len(items))
+        lons = np.fromiter((item[2] for item in items), float, len(items))
+        first = len(self._keys)
+        self._append_xyz(_to_unit_vectors(lats, lons))
+        for offset, (key, _, _, payload) in enumerate(items):
+            self._keys.append(key)
+            self._payloads.append(key if payload is None else payload)
+            self._alive.append(True)
+            self._slots[key] = first + offset
+        self.rebuild()
+
+    def insert(self, key: Hashable, lat: float, lon: float, payload: Any = None):
+        """Добавление или перемещение точки"""
+        self._discard(key)
+        slot = len(self._keys)
+        xyz = _to_unit_vectors(np.array([lat]), np.array([lon]))
+        self._append_xyz(xyz)
+        self._keys.append(key)
+        self._payloads.append(key if payload is None else payload)
+        self._alive.append(True)
+        self._slots[key] = slot
+        self._pending.append(slot)
+        self._pending_xyz = np.vstack((self._pending_xyz, xyz))
+        self._maybe_rebuild()
+
+    def remove(self, key: Hashable) -> bool:
+        """Удаление точки"""
+        if not self._discard(key):
+            return False
+        self._maybe_rebuild()
+        return True
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 1,
+        predicate: Optional[Predicate] = None,
+        max_distance_km: Optional[float] = None,
+    ) -> List[Tuple[Any, float]]:
+        """k ближайших точек: список (payload, расстояние в км) по возрастанию
+
+        predicate вызывается только для точек, которые могут попасть
+        в ответ, поэтому дорогие условия проверяются редко.
+        """
+        if k <= 0 or not self._slots:
+            return []
+        q = tuple(_to_unit_vectors(np.array([lat]), np.array([lon]))[0])
+        limit = _km_to_chord_sq(max_distance_km) if max_distance_km is not None else math.inf
+
+        # Макс-куча лучших кандидатов: (-квадрат хорды, слот)
+        best: List[Tuple[float, int]] = []
+
+        def bound() -> float:
+            return -best[0][0] if len(best) == k else limit
+
+        def offer(slots: np.ndarray, dist_sq: np.ndarray):
+            mask = dist_sq <= bound()
+            if not mask.any():
+                return
+            candidates, candidate_dist = slots[mask], dist_sq[mask]
+            order = np.argsort(candidate_dist, kind="stable")
+            for slot, d in zip(candidates[order].tolist(), candidate_dist[order].tolist()):
+                if d > bound():
+                    break
+                if not self._alive[slot]:
+                    continue
+                if predicate is not None and not predicate(self._payloads[slot]):
+                    continue
+                if len(best) == k:
+                    heapq.heapreplace(best, (-d, slot))
+                else:
+                    heapq.heappush(best, (-d, slot))
+
+        if self._pending:
+            pending = np.asarray(self._pending)
+            offer(pending, ((self._pending_xyz - q) ** 2).sum(axis=1))
+
+        if self._left:
+            heap = [(self._min_dist_sq(0, q), 0)]
+            while heap:
+                d, node = heapq.heappop(heap)
+                if d > bound():
+                    break
+                left = self._left[node]
+                if left < 0:
+                    slots = self._perm[self._start[node]:self._end[node]]
+                    offer(slots, ((self._xyz[slots] - q) ** 2).sum(axis=1))
+                    continue
+                for child in (left, self._right[node]):
+                    child_d = self._min_dist_sq(child, q)
+                    if child_d <= bound():
+                        heapq.heappush(heap, (child_d, child))
+
+        best.sort(reverse=True)
+        return [
+            (self._payloads[slot], float(_chord_to_km(-neg_d)))
+            for neg_d, slot in best
+        ]
+
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        predicate: Optional[Predicate] = None,
+    ) -> List[Tuple[Any, float]]:
+        """Все точки в радиусе: список (payload, расстояние в км) по возрастанию"""
+        if not self._slots:
+            return []
+        q = tuple(_to_unit_vectors(np.array([lat]), np.array([lon]))[0])
+        limit = _km_to_chord_sq(radius_km)
+        found_slots: List[np.ndarray] = []
+        found_dist: List[np.ndarray] = []
+
+        def collect(slots: np.ndarray, dist_sq: np.ndarray):
+            mask = dist_sq <= limit
+            if mask.any():
+                found_slots.append(slots[mask])
+                found_dist.append(dist_sq[mask])
+
+        if self._pending:
+            collect(np.asarray(self._pending), ((self._pending_xyz - q) ** 2).sum(axis=1))
+
+        if self._left:
+            stack = [0]
+            while stack:
+                node = stack.pop()
+                if self._min_dist_sq(node, q) > limit:
+                    continue
+                left = self._left[node]
+                if left < 0:
+                    slots = self._perm[self._start[node]:self._end[node]]
+                    collect(slots, ((self._xyz[slots] - q) ** 2).sum(axis=1))
+                else:
+                    stack.append(left)
+                    stack.append(self._right[node])
+
+        if not found_slots:
+            return []
+        slots = np.concatenate(found_slots)
+        dist_sq = np.concatenate(found_dist)
+        order = np.argsort(dist_sq, kind="stable")
+        distances = _chord_to_km(dist_sq[order])
+        result = []
+        for slot, distance in zip(slots[order].tolist(), distances.tolist()):
+            if not self._alive[slot]:
+                continue
+            payload = self._payloads[slot]
+            if predicate is not None and not predicate(payload):
+                continue
+            result.append((payload, distance))
+        return result
+
+    def rebuild(self):
+        """Перестройка дерева по живым точкам с уплотнением хранилища"""
+        alive = [slot for slot, flag in enumerate(self._alive) if flag]
+        self._xyz = self._xyz[alive] if alive else np.empty((0, 3))
+        self._keys = [self._keys[slot] for slot in alive]
+        self._payloads = [self._payloads[slot] for slot in alive]
+        self._alive = [True] * len(alive)
+        self._slots = {key: slot for slot, key in enumerate(self._keys)}
+        self._dead = 0
+        self._pending = []
+        self._pending_xyz = np.empty((0, 3))
+
+        self._perm = np.arange(len(alive), dtype=np.int64)
+        self._lo, self._hi = [], []
+        self._left, self._right = [], []
+        self._start, self._end = [], []
+        if alive:
+            self._build(0, len(alive))
+
+    def _build(self, start: int, end: int) -> int:
+        """Рекурсивное построение поддерева над отрезком _perm[start:end]"""
+        points = self._xyz[self._perm[start:end]]
+        node = len(self._left)
+        self._lo.append(tuple(points.min(axis=0)))
+        self._hi.append(tuple(points.max(axis=0)))
+        self._left.append(-1)
+        self._right.append(-1)
+        self._start.append(start)
+        self._end.append(end)
+        if end - start <= self.leaf_size:
+            return node
+
+        axis = int(np.argmax(np.subtract(self._hi[node], self._lo[node])))
+        middle = (end - start) // 2
+        order = np.argpartition(points[:, axis], middle)
+        self._perm[start:end] = self._perm[start:end][order]
+        self._left[node] = self._build(start, start + middle)
+        self._right[node] = self._build(start + middle, end)
+        return node
+
+    def _min_dist_sq(self, node: int, q: Tuple[float, float, float]) -> float:
+        """Квадрат расстояния от точки до прямоугольника узла"""
+        lo, hi = self._lo[node], self._hi[node]
+        total = 0.0
+        for i in range(3):
+            if q[i] < lo[i]:
+                total += (lo[i] - q[i]) ** 2
+            elif q[i] > hi[i]:
+                total += (q[i] - hi[i]) ** 2
+        return total
+
+    def _append_xyz(self, xyz: np.ndarray):
+        """Добавление векторов в хранилище с удвоением ёмкости"""
+        used = len(self._keys)
+        needed = used + len(xyz)
+        if needed > len(self._xyz):
+            grown = np.empty((max(needed, 2 * len(self._xyz), 64), 3))
+            grown[:used] = self._xyz[:used]
+            self._xyz = grown
+        self._xyz[used:needed] = xyz
+
+    def _discard(self, key: Hashable) -> bool:
+        """Пометка точки удалённой"""
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        self._alive[slot] = False
+        self._dead += 1
+        return True
+
+    def _maybe_rebuild(self):
+        """Перестройка при переполнении буфера или накоплении удалённых"""
+        threshold = max(self.leaf_size, int(len(self._keys) * self.rebuild_ratio))
+        pending_limit = max(self.leaf_size, min(self.max_pending, threshold))
+        if len(self._pending) > pending_limit or self._dead > threshold:
+            self.rebuild()
@@ -0,0 +1,434 @@
+"""Двухуровневый кэш погоды по ячейкам сетки"""
+
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.config.settings import Settings
+from src.models.risk import RiskZone
+from src.services.location_service import LocationService
+
+
+CellKey = Tuple[int, int]
+
+# Виды данных и их время жизни по умолчанию, секунды
+CURRENT = "current"
+FORECAST = "forecast"
+ALERTS = "alerts"
+DEFAULT_TTL = {CURRENT: 600.0, FORECAST: 3600.0, ALERTS: 300.0}
+
+
+def grid_cell(lat: float, lon: float, cell_deg: float) -> CellKey:
+    """Ячейка сетки cell_deg × cell_deg градусов, содержащая точку"""
+    lon = (lon + 180) % 360 - 180
+    return math.floor(lat / cell_deg), math.floor(lon / cell_deg)
+
+
+def grid_cell_center(key: CellKey, cell_deg: float) -> Tuple[float, float]:
+    """Центр ячейки сетки"""
+    return (key[0] + 0.5) * cell_deg, (key[1] + 0.5) * cell_deg
+
+
+@dataclass
+class CacheEntry:
+    """Запись кэша: ответ API и время его получения"""
+    payload: Any
+    stored_at: float
+
+    def age(self, now: float) -> float:
+        return max(now - self.stored_at, 0.0)
+
+
+@dataclass
+class CacheStats:
+    """Счётчики кэша"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    stores: int = 0
+    evictions: int = 0
+    invalidated: int = 0
+    disk_writes: int = 0
+    disk_errors: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses + self.expired
+        if lookups == 0:
+            return 0.0
+        return (self.memory_hits + self.disk_hits) / lookups
+
+    def to_dict(self) -> dict:
+        """Преобразование в словарь"""
+        data = asdict(self)
+        data["hit_ratio"] = self.hit_ratio
+        return data
+
+
+class WeatherCache:
+    """Кэш ответов API погоды: LRU в памяти и SQLite на диске
+
+    Ключ — вид данных (текущая погода, прогноз, предупреждения) и ячейка
+    сетки cell_deg × cell_deg градусов: все точки ячейки получают один
+    ответ, запрошенный для её центра. Срок жизни задаётся по виду данных;
+    просроченные записи не удаляются сразу, их можно прочитать с
+    allow_stale=True.
+
+    Диск не блокирует цикл событий: чтение и удаление выполняются в
+    потоке, а put только обновляет память и ставит запись в очередь —
+    очередь сбрасывается на диск одной транзакцией через flush_delay.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        cell_deg: float = 0.1,
+        memory_size: int = 10000,
+        ttl: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.time,
+        flush_delay: float = 0.05,
+    ):
+        self.cell_deg = cell_deg
+        self.memory_size = memory_size
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self._clock = clock
+        self._lru: "OrderedDict[Tuple[str, CellKey], CacheEntry]" = OrderedDict()
+        self.stats = CacheStats()
+        self.flush_delay = flush_delay
+        # Записи, ещё не сохранённые на диск (включая сохраняемые сейчас)
+        self._pending: Dict[Tuple[str, CellKey], CacheEntry] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_wake: Optional[asyncio.Event] = None
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Соединением пользуются потоки asyncio.to_thread под self._lock
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS weather_cache (
+                    kind TEXT NOT NULL,
+                    lat_q INTEGER NOT NULL,
+                    lon_q INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (kind, lat_q, lon_q)
+                ) WITHOUT ROWID
+            """)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "WeatherCache":
+        """Создание кэша по настройкам приложения"""
+        return cls(
+            path=settings.weather_cache_path,
+            cell_deg=settings.weather_cell_deg,
+            memory_size=settings.weather_cache_size,
+            ttl={
+                CURRENT: settings.weather_ttl_current,
+                FORECAST: settings.cache_ttl,
+                ALERTS: settings.weather_ttl_alerts,
+            },
+        )
+
+    def cell(self, lat: float, lon: float) -> CellKey:
+        """Ячейка сетки, содержащая точку"""
+        return grid_cell(lat, lon, self.cell_deg)
+
+    def cell_center(self, key: CellKey) -> Tuple[float, float]:
+        """Центр ячейки — точка, для которой запрашиваются данные"""
+        return grid_cell_center(key, self.cell_deg)
+
+    def now(self) -> float:
+        return self._clock()
+
+    async def get(
+        self, kind: str, key: CellKey, allow_stale: bool = False
+    ) -> Optional[CacheEntry]:
+        """Запись ячейки; просроченная возвращается только при allow_stale"""
+        entry = self._lru.get((kind, key)) or self._pending.get((kind, key))
+        source = "memory"
+        if entry is not None:
+            self._remember(kind, key, entry)
+        elif self._db is not None:
+            entry = await self._load(kind, key)
+            # Пока шло чтение, ячейку могли обновить
+            if (kind, key) in self._lru:
+                entry = self._lru[(kind, key)]
+                self._lru.move_to_end((kind, key))
+            elif entry is not None:
+                self._remember(kind, key, entry)
+                source = "disk"
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        if entry.age(self.now()) >= self.ttl[kind]:
+            self.stats.expired += 1
+            return entry if allow_stale else None
+        if source == "memory":
+            self.stats.memory_hits += 1
+        else:
+            self.stats.disk_hits += 1
+        return entry
+
+    async def peek(self, kind: str, key: CellKey) -> Optional[CacheEntry]:
+        """Запись ячейки любого возраста без учёта в статистике и LRU"""
+        entry = self._lru.get((kind, key)) or self._pending.get((kind, key))
+        if entry is None and self._db is not None:
+            entry = await self._load(kind, key)
+            entry = self._lru.get((kind, key)) or entry
+        return entry
+
+    async def peek_many(
+        self, kind: str, keys: Iterable[CellKey]
+    ) -> Dict[CellKey, Optional[CacheEntry]]:
+        """peek для многих ячеек с одним обращением к диску"""
+        found: Dict[CellKey, Optional[CacheEntry]] = {}
+        missing = []
+        for key in keys:
+            found[key] = self._lru.get((kind, key)) or self._pending.get((kind, key))
+            if found[key] is None:
+                missing.append(key)
+        if missing and self._db is not None:
+            try:
+                loaded = await asyncio.to_thread(self._locked, self._select_many, kind, missing)
+            except (sqlite3.Error, ValueError):
+                self.stats.disk_errors += 1
+                loaded = {}
+            for key in missing:
+                found[key] = self._lru.get((kind, key)) or loaded.get(key)
+        return found
+
+    def put(self, kind: str, key: CellKey, payload: Any) -> CacheEntry:
+        """Сохранение ответа API для ячейки
+
+        В памяти запись доступна сразу, на диск попадает при ближайшем
+        сбросе очереди. Вне цикла событий пишется на диск немедленно.
+        """
+        entry = CacheEntry(payload, self.now())
+        self._remember(kind, key, entry)
+        self.stats.stores += 1
+        if self._db is None:
+            return entry
+        self._pending[(kind, key)] = entry
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_pending(self._pending)
+            self._pending = {}
+            return entry
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_wake = asyncio.Event()
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+        return entry
+
+    async def flush(self):
+        """Сохранение на диск всех записей очереди"""
+        if self._flush_wake is not None:
+            self._flush_wake.set()
+        while self._flush_task is not None and not self._flush_task.done():
+            await asyncio.shield(self._flush_task)
+        if self._pending:
+            self._flush_task = asyncio.ensure_future(self._flush_now())
+            await asyncio.shield(self._flush_task)
+
+    async def invalidate(
+        self,
+        kinds: Optional[Iterable[str]] = None,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+    ) -> int:
+        """Сброс записей указанных видов (по умолчанию всех)
+
+        bounds — (min_lat, max_lat, min_lon, max_lon): сбрасываются только
+        ячейки, пересекающие прямоугольник. Возвращает число удалённых
+        записей (на диске, а без диска — в памяти).
+        """
+        kinds = list(kinds) if kinds is not None else list(self.ttl)
+        ranges = self._cell_ranges(bounds) if bounds is not None else None
+
+        def matches(kind: str, key: CellKey) -> bool:
+            if kind not in kinds:
+                return False
+            if ranges is None:
+                return True
+            return any(
+                lat_lo <= key[0] <= lat_hi and lon_lo <= key[1] <= lon_hi
+                for lat_lo, lat_hi, lon_lo, lon_hi in ranges
+            )
+
+        stale = [item for item in self._lru if matches(*item)]
+        for item in stale:
+            del self._lru[item]
+        removed = len(stale)
+
+        if self._db is not None:
+            # Все записи памяти есть и на диске после сброса очереди
+            await self.flush()
+            removed = await asyncio.to_thread(self._delete, kinds, ranges)
+        self.stats.invalidated += removed
+        return removed
+
+    async def invalidate_zone(
+        self, zone: RiskZone, kinds: Optional[Iterable[str]] = None
+    ) -> int:
+        """Сброс записей ячеек, пересекающих зону (например, при штормовом предупреждении)"""
+        return await self.invalidate(kinds, LocationService.get_zone_bounding_box(zone))
+
+    async def purge_expired(self, keep_stale: float = 0.0) -> int:
+        """Удаление с диска записей старше срока жизни плюс keep_stale секунд"""
+        if self._db is None:
+            return 0
+        cutoffs = [(kind, self.now() - ttl - keep_stale) for kind, ttl in self.ttl.items()]
+        return await asyncio.to_thread(self._purge, cutoffs)
+
+    def get_stats(self) -> dict:
+        """Снимок счётчиков кэша"""
+        data = self.stats.to_dict()
+        data["memory_entries"] = len(self._lru)
+        data["pending_writes"] = len(self._pending)
+        return data
+
+    async def close(self):
+        """Сохранение очереди и закрытие файла кэша"""
+        if self._db is not None:
+            await self.flush()
+            db, self._db = self._db, None
+            await asyncio.to_thread(self._locked, db.close)
+
+    async def _flush_later(self):
+        """Сброс очереди через flush_delay или по запросу flush"""
+        try:
+            async with asyncio.timeout(self.flush_delay):
+                await self._flush_wake.wait()
+        except TimeoutError:
+            pass
+        await self._flush_now()
+
+    async def _flush_now(self):
+        """Сохранение текущего содержимого очереди одной транзакцией"""
+        batch = dict(self._pending)
+        if batch and self._db is not None:
+            await asyncio.to_thread(self._write_pending, batch)
+        # Записи, обновлённые во время сохранения, остаются в очереди
+        for item, entry in batch.items():
+            if self._pending.get(item) is entry:
+                del self._pending[item]
+
+    def _locked(self, fn: Callable[..., Any], *args) -> Any:
+        """Вызов под блокировкой соединения (выполняется в потоке)"""
+        with self._lock:
+            return fn(*args)
+
+    def _write_pending(self, batch: Dict[Tuple[str, CellKey], CacheEntry]):
+        """Запись группы на диск; при ошибке записи остаются только в памяти"""
+        rows = [
+            (kind, key[0], key[1], entry.stored_at, json.dumps(entry.payload))
+            for (kind, key), entry in batch.items()
+        ]
+        try:
+            with self._lock, self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO weather_cache "
+                    "(kind, lat_q, lon_q, stored_at, payload) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except (sqlite3.Error, TypeError, ValueError):
+            self.stats.disk_errors += 1
+        else:
+            self.stats.disk_writes += 1
+
+    async def _load(self, kind: str, key: CellKey) -> Optional[CacheEntry]:
+        """Чтение записи с диска в потоке"""
+        try:
+            return await asyncio.to_thread(self._locked, self._select, kind, key)
+        except (sqlite3.Error, ValueError):
+            self.stats.disk_errors += 1
+            return None
+
+    def _select(self, kind: str, key: CellKey) -> Optional[CacheEntry]:
+        row = self._db.execute(
+            "SELECT stored_at, payload FROM weather_cache "
+            "WHERE kind = ? AND lat_q = ? AND lon_q = ?",
+            (kind, key[0], key[1]),
+        ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(json.loads(row[1]), row[0])
+
+    def _select_many(
+        self, kind: str, keys: List[CellKey]
+    ) -> Dict[CellKey, CacheEntry]:
+        loaded = {}
+        for key in keys:
+            entry = self._select(kind, key)
+            if entry is not None:
+                loaded[key] = entry
+        return loaded
+
+    def _delete(
+        self, kinds: List[str], ranges: Optional[List[Tuple[int, int, int, int]]]
+    ) -> int:
+        """Удаление записей видов kinds в диапазонах ячеек (выполняется в потоке)"""
+        removed = 0
+        kind_list = ", ".join("?" for _ in kinds)
+        with self._lock, self._db:
+            if ranges is None:
+                cursor = self._db.execute(
+                    f"DELETE FROM weather_cache WHERE kind IN ({kind_list})", kinds
+                )
+                removed += cursor.rowcount
+            else:
+                for lat_lo, lat_hi, lon_lo, lon_hi in ranges:
+                    cursor = self._db.execute(
+                        f"DELETE FROM weather_cache WHERE kind IN ({kind_list}) "
+                        "AND lat_q BETWEEN ? AND ? AND lon_q BETWEEN ? AND ?",
+                        (*kinds, lat_lo, lat_hi, lon_lo, lon_hi),
+                    )
+                    removed += cursor.rowcount
+        return removed
+
+    def _purge(self, cutoffs: List[Tuple[str, float]]) -> int:
+        """Удаление записей старше границ по видам (выполняется в потоке)"""
+        removed = 0
+        with self._lock, self._db:
+            for kind, cutoff in cutoffs:
+                cursor = self._db.execute(
+                    "DELETE FROM weather_cache WHERE kind = ? AND stored_at < ?",
+                    (kind, cutoff),
+                )
+                removed += cursor.rowcount
+        return removed
+
+    def _remember(self, kind: str, key: CellKey, entry: CacheEntry):
+        """Запись в LRU с вытеснением самых давно использованных"""
+        self._lru[(kind, key)] = entry
+        self._lru.move_to_end((kind, key))
+        while len(self._lru) > self.memory_size:
+            self._lru.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _cell_ranges(
+        self, bounds: Tuple[float, float, float, float]
+    ) -> List[Tuple[int, int, int, int]]:
+        """Диапазоны ячеек прямоугольника с учётом перехода через 180°"""
+        min_lat, max_lat, min_lon, max_lon = bounds
+        size = self.cell_deg
+        last_lon = math.floor(180 / size) - (180 / size).is_integer()
+        return [
+            (
+                math.floor(min_lat / size), math.floor(max_lat / size),
+                math.floor(lo / size), min(math.floor(hi / size), last_lon),
+            )
+            for lo, hi in LocationService.split_longitude_range(min_lon, max_lon)
+        ]
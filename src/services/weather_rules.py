@@ -0,0 +1,374 @@
+"""Пороговые правила погодных рисков
+
+Правило записывается строкой вида
+
+    temp_max >= 35 for 2d -> heat/high
+    wind_speed >= 20 -> storm/high
+
+поле прогноза, сравнение, порог, необязательная длительность (d — сутки
+подряд, h — часы подряд по слотам прогноза) и тип/уровень риска. Правила
+разбираются один раз; проверка идёт над матрицами ячейки × слоты прогноза
+сразу для всех ячеек, соседние сработавшие ячейки объединяются в одну
+зону риска.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+
+from src.models.risk import Risk, RiskLevel, RiskType, RiskZone
+from src.services.location_service import _haversine_km
+
+
+# Поля прогноза: название и единица измерения
+FIELDS = {
+    "temp": ("Температура", "°C"),
+    "temp_min": ("Минимальная температура", "°C"),
+    "temp_max": ("Максимальная температура", "°C"),
+    "feels_like": ("Температура по ощущениям", "°C"),
+    "humidity": ("Влажность", "%"),
+    "pressure": ("Давление", "гПа"),
+    "wind_speed": ("Скорость ветра", "м/с"),
+    "pop": ("Вероятность осадков", ""),
+}
+
+_OPERATORS: Dict[str, Callable] = {
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "<=": np.less_equal,
+    "<": np.less,
+}
+_SIGNS = {">=": "≥", ">": ">", "<=": "≤", "<": "<"}
+
+_RULE_RE = re.compile(
+    r"^\s*(?P<field>\w+)\s*(?P<op>>=|<=|>|<|≥|≤)\s*(?P<threshold>-?\d+(?:\.\d+)?)"
+    r"(?:\s+for\s+(?P<duration>\d+)\s*(?P<unit>d|h))?"
+    r"\s*->\s*(?P<type>\w+)\s*/\s*(?P<level>\w+)\s*$"
+)
+
+_TITLES = {
+    RiskType.HEAT: "Аномальная жара",
+    RiskType.COLD: "Аномальный холод",
+    RiskType.STORM: "Сильный ветер",
+    RiskType.FLOOD: "Сильные осадки",
+}
+
+_INSTRUCTIONS = {
+    RiskType.HEAT: [
+        "Избегайте длительного пребывания на солнце",
+        "Пейте больше воды",
+        "Носите головной убор",
+    ],
+    RiskType.COLD: [
+        "Ограничьте время пребывания на улице",
+        "Одевайтесь многослойно",
+        "Не оставляйте без присмотра обогревательные приборы",
+    ],
+    RiskType.STORM: [
+        "Не укрывайтесь под деревьями и рекламными щитами",
+        "Уберите с балконов незакреплённые предметы",
+        "Следите за сообщениями МЧС",
+    ],
+}
+
+DEFAULT_RULES = [
+    "temp_max >= 35 for 2d -> heat/high",
+    "temp_max >= 30 for 3d -> heat/medium",
+    "temp_min <= -35 for 1d -> cold/high",
+    "temp_min <= -25 for 3d -> cold/medium",
+    "wind_speed >= 25 -> storm/critical",
+    "wind_speed >= 20 -> storm/high",
+    "wind_speed >= 15 for 6h -> storm/medium",
+]
+
+_LEVEL_ORDER = {level: i for i, level in enumerate(RiskLevel)}
+
+
+@dataclass(frozen=True)
+class WeatherRule:
+    """Правило: поле op порог не менее duration подряд → риск"""
+    field: str
+    op: str
+    threshold: float
+    risk_type: RiskType
+    level: RiskLevel
+    duration: int = 0
+    unit: str = "h"  # d — сутки подряд, h — часы подряд
+    title: str = ""
+    instructions: Tuple[str, ...] = ()
+
+    @classmethod
+    def parse(cls, text: str) -> "WeatherRule":
+        """Разбор строки правила; ValueError при ошибке"""
+        match = _RULE_RE.match(text)
+        if match is None:
+            raise ValueError(f"Не удалось разобрать правило: {text!r}")
+        op = {"≥": ">=", "≤": "<="}.get(match["op"], match["op"])
+        if match["field"] not in FIELDS:
+            raise ValueError(f"Неизвестное поле прогноза: {match['field']}")
+        try:
+            risk_type = RiskType(match["type"].lower())
+            level = RiskLevel(match["level"].lower())
+        except ValueError:
+            raise ValueError(f"Неизвестный тип или уровень риска: {text!r}")
+        return cls(
+            field=match["field"],
+            op=op,
+            threshold=float(match["threshold"]),
+            risk_type=risk_type,
+            level=level,
+            duration=int(match["duration"] or 0),
+            unit=match["unit"] or "h",
+        )
+
+    def get_title(self) -> str:
+        return self.title or _TITLES.get(self.risk_type, "Погодный риск")
+
+    def describe(self) -> str:
+        """Условие правила текстом"""
+        name, unit = FIELDS[self.field]
+        text = f"{name} {_SIGNS[self.op]} {self.threshold:g}"
+        if unit:
+            text += f" {unit}"
+        if self.duration and self.unit == "d":
+            text += f" не менее {self.duration} сут. подряд"
+        elif self.duration:
+            text += f" не менее {self.duration} ч подряд"
+        return text
+
+
+@dataclass
+class RuleHit:
+    """Срабатывание правила: маска ячеек и время первого окна по ячейкам"""
+    rule: WeatherRule
+    mask: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+
+
+@dataclass
+class _Compiled:
+    rule: WeatherRule
+    compare: Callable
+    daily: bool
+    window: Optional[int] = None  # окно в сутках; для часовых считается по шагу
+
+
+class RuleEngine:
+    """Проверка набора правил по прогнозу всех ячеек сетки
+
+    Для суточных правил сутки засчитываются, если условие выполнено хотя
+    бы в одном слоте (сутки — по местному времени utc_offset). Если для
+    одного типа риска сработало несколько правил, ячейка остаётся только
+    у правила наивысшего уровня. Пропуски (NaN) условие не выполняют.
+    """
+
+    def __init__(self, rules: Optional[Iterable[Union[str, WeatherRule]]] = None):
+        rules = DEFAULT_RULES if rules is None else rules
+        parsed = [WeatherRule.parse(r) if isinstance(r, str) else r for r in rules]
+        # Сначала более высокие уровни: они вытесняют низкие того же типа
+        parsed.sort(key=lambda rule: -_LEVEL_ORDER[rule.level])
+        self.rules = parsed
+        self._compiled = [
+            _Compiled(
+                rule=rule,
+                compare=_OPERATORS[rule.op],
+                daily=rule.unit == "d",
+                window=max(rule.duration, 1) if rule.unit == "d" else None,
+            )
+            for rule in parsed
+        ]
+
+    def evaluate(
+        self,
+        timestamps: np.ndarray,
+        values: Dict[str, np.ndarray],
+        utc_offset: int = 0,
+    ) -> List[RuleHit]:
+        """Срабатывания правил по матрицам ячейки × слоты
+
+        timestamps — отсортированные метки слотов (секунды UTC), values —
+        матрицы по полям. Ячейки без нужного поля правило не выполняют.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        cell_count = next(iter(values.values())).shape[0] if values else 0
+        if not len(timestamps) or not cell_count:
+            return []
+        step = int(np.median(np.diff(timestamps))) if len(timestamps) > 1 else 10800
+        day_keys = (timestamps + utc_offset) // 86400
+        day_starts = np.flatnonzero(np.r_[True, day_keys[1:] != day_keys[:-1]])
+        day_times = np.unique(day_keys) * 86400 - utc_offset
+
+        covered: Dict[RiskType, np.ndarray] = {}
+        hits = []
+        for compiled in self._compiled:
+            rule = compiled.rule
+            if rule.field not in values:
+                continue
+            with np.errstate(invalid="ignore"):
+                mask = compiled.compare(values[rule.field], rule.threshold)
+            if compiled.daily:
+                mask = np.logical_or.reduceat(mask, day_starts, axis=1)
+                window = compiled.window
+                starts, ends = day_times, day_times + 86400
+            else:
+                window = max(math.ceil(rule.duration * 3600 / step), 1)
+                starts, ends = timestamps, timestamps + step
+            if mask.shape[1] < window:
+                continue
+            runs = np.lib.stride_tricks.sliding_window_view(mask, window, axis=1).all(axis=2)
+            triggered = runs.any(axis=1)
+            seen = covered.setdefault(rule.risk_type, np.zeros(cell_count, dtype=bool))
+            triggered &= ~seen
+            seen |= triggered
+            if not triggered.any():
+                continue
+            first = runs.argmax(axis=1)
+            hits.append(RuleHit(
+                rule=rule,
+                mask=triggered,
+                start=starts[first],
+                end=ends[first + window - 1],
+            ))
+        return hits
+
+    def alerts(
+        self,
+        timestamps: np.ndarray,
+        values: Dict[str, np.ndarray],
+        utc_offset: int = 0,
+    ) -> List[str]:
+        """Тексты предупреждений для первой ячейки матриц"""
+        alerts = []
+        for hit in self.evaluate(timestamps, values, utc_offset):
+            if hit.mask[0]:
+                start = datetime.fromtimestamp(int(hit.start[0]))
+                alerts.append(
+                    f"{hit.rule.get_title()}: {hit.rule.describe()}, с {start:%d.%m %H:%M}"
+                )
+        return alerts
+
+    def risks(
+        self,
+        cells: np.ndarray,
+        timestamps: np.ndarray,
+        values: Dict[str, np.ndarray],
+        cell_deg: float,
+        utc_offset: int = 0,
+        source: str = "Прогноз погоды",
+    ) -> List[Risk]:
+        """Риски по всем ячейкам: на каждую связную область сработавших ячеек — один"""
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        risks = []
+        for hit in self.evaluate(timestamps, values, utc_offset):
+            rule = hit.rule
+            indices = np.flatnonzero(hit.mask)
+            labels = _label_cells(cells[indices])
+            order = np.argsort(labels, kind="stable")
+            bounds = np.flatnonzero(np.r_[True, labels[order][1:] != labels[order][:-1], True])
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                members = indices[order[lo:hi]]
+                component = cells[members]
+                anchor = component[np.lexsort((component[:, 1], component[:, 0]))[0]]
+                risks.append(Risk(
+                    id=f"weather_{rule.risk_type.value}_{rule.level.value}_{anchor[0]}_{anchor[1]}",
+                    type=rule.risk_type,
+                    level=rule.level,
+                    title=rule.get_title(),
+                    description=rule.describe(),
+                    zone=_component_zone(component, cell_deg),
+                    start_time=datetime.fromtimestamp(int(hit.start[members].min())),
+                    end_time=datetime.fromtimestamp(int(hit.end[members].max())),
+                    instructions=list(rule.instructions or _INSTRUCTIONS.get(rule.risk_type, [])),
+                    source=source,
+                ))
+        return risks
+
+
+# Соседи для связности по 8 направлениям (каждая пара учитывается один раз)
+_NEIGHBOURS = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def _label_cells(cells: np.ndarray) -> np.ndarray:
+    """Метки связных областей ячеек (соседство по сторонам и углам)
+
+    Минимальная метка распространяется по рёбрам со сжатием путей, пока
+    метки не перестанут меняться.
+    """
+    count = len(cells)
+    labels = np.arange(count)
+    if count < 2:
+        return labels
+    keys = cells[:, 0] * (1 << 32) + cells[:, 1]
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    sources, targets = [], []
+    for dlat, dlon in _NEIGHBOURS:
+        wanted = (cells[:, 0] + dlat) * (1 << 32) + cells[:, 1] + dlon
+        position = np.minimum(np.searchsorted(sorted_keys, wanted), count - 1)
+        found = sorted_keys[position] == wanted
+        sources.append(np.flatnonzero(found))
+        targets.append(order[position[found]])
+    u = np.concatenate(sources)
+    v = np.concatenate(targets)
+    while True:
+        low = np.minimum(labels[u], labels[v])
+        updated = labels.copy()
+        np.minimum.at(updated, u, low)
+        np.minimum.at(updated, v, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _component_zone(cells: np.ndarray, cell_deg: float) -> RiskZone:
+    """Зона области ячеек: выпуклая оболочка углов, центр и охватывающий радиус"""
+    lats = (cells[:, 0] + 0.5) * cell_deg
+    lons = (cells[:, 1] + 0.5) * cell_deg
+    center_lat, center_lon = float(lats.mean()), float(lons.mean())
+    half_diagonal = float(_haversine_km(0.0, 0.0, cell_deg / 2, cell_deg / 2))
+    radius = float(np.max(_haversine_km(center_lat, center_lon, lats, lons))) + half_diagonal
+
+    # Кандидаты в оболочку — крайние ячейки каждого ряда
+    order = np.lexsort((cells[:, 1], cells[:, 0]))
+    rows = cells[order, 0]
+    first = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    last = np.r_[first[1:] - 1, len(rows) - 1]
+    points = []
+    for lo, hi in zip(order[first], order[last]):
+        lat_q, west, east = int(cells[lo, 0]), int(cells[lo, 1]), int(cells[hi, 1])
+        for lat in (lat_q, lat_q + 1):
+            points.append((round(lat * cell_deg, 6), round(west * cell_deg, 6)))
+            points.append((round(lat * cell_deg, 6), round((east + 1) * cell_deg, 6)))
+    return RiskZone(
+        latitude=center_lat,
+        longitude=center_lon,
+        radius_km=radius,
+        polygon=_convex_hull(points),
+    )
+
+
+def _convex_hull(points: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Выпуклая оболочка точек (lat, lon), обход против часовой стрелки"""
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower: List[Tuple[float, float]] = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper: List[Tuple[float, float]] = []
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
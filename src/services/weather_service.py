@@ -1,9 +1,32 @@
 """Сервис погоды"""
 
+import asyncio
+import importlib.util
+import time
 from dataclasses import dataclass
-from typing import Optional, List
-from datetime import datetime
+from typing import (
+    Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Set,
+    Tuple,
+)
+from datetime import datetime, timedelta
 import httpx
+import numpy as np
+from src.config.settings import Settings
+from src.services.weather_cache import (
+    ALERTS, CURRENT, FORECAST, WeatherCache, grid_cell, grid_cell_center,
+)
+from src.services.single_flight import SingleFlight
+from src.services.rate_limit import TokenBucket
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.weather_timeseries import (
+    DAY, OBSERVATION, Series, WeatherSeriesStore, rollup,
+)
+from src.services.weather_rules import RuleEngine
+from src.models.risk import Risk, RiskZone
+
+
+# Методы API для видов данных кэша
+_ENDPOINTS = {CURRENT: "weather", FORECAST: "forecast"}
 
 
 @dataclass
@@ -21,6 +44,10 @@ class WeatherData:
     # Предупреждения
     alerts: List[str] = None
     
+    # Возраст данных: устаревшие отдаются, пока API недоступен или обновляется
+    age_seconds: float = 0.0
+    is_stale: bool = False
+    
     def __post_init__(self):
         if self.alerts is None:
             self. alerts = []
@@ -35,26 +62,329 @@ class WeatherForecast:
     description: str
     icon: str
     precipitation_probability: float = 0
+    age_seconds: float = 0.0
+    is_stale: bool = False
 
 
 class WeatherService: 
-    """Сервис для получения данных о погоде"""
+    """Сервис для получения данных о погоде
+    
+    Все запросы идут через один долгоживущий httpx.AsyncClient с пулом
+    соединений: DNS, TCP и TLS устанавливаются один раз, дальше
+    соединения переиспользуются. Клиент создаётся в start() (или при
+    первом запросе) и закрывается в close(); сервис можно использовать
+    как асинхронный контекстный менеджер. Для тестов можно передать
+    base_url локальной заглушки или transport.
+    
+    Точки одной ячейки сетки получают данные, запрошенные для её
+    центра: одновременные запросы одной ячейки и вида данных
+    объединяются в один запрос к API, а с кэшем ответы хранятся по
+    ячейкам. Без кэша размер ячейки задаёт cell_deg.
+    
+    Частота запросов к API ограничивается ведром токенов по квоте
+    провайдера, пакетная загрузка — числом одновременных запросов.
     
-    def __init__(self, api_key:  Optional[str] = None):
+    Устаревшая запись кэша (не старше max_stale) отдаётся сразу с
+    отметкой возраста, а обновление идёт в фоне. Каждый метод API имеет
+    бюджет времени и свой выключатель: при серии ошибок запросы к нему
+    отклоняются сразу, пока пробный запрос не пройдёт. Моковые данные
+    используются только без ключа API.
+    
+    С хранилищем рядов каждый полученный ответ (наблюдение и все
+    трёхчасовые слоты прогноза) сохраняется по ячейке для трендов.
+    
+    Предупреждения и риски выводятся пороговыми правилами (RuleEngine)
+    из прогноза: для точки — по прогнозу её ячейки, для страны — сразу
+    по всем ячейкам хранилища рядов.
+    """
+    
+    def __init__(
+        self,
+        api_key:  Optional[str] = None,
+        base_url: Optional[str] = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[WeatherCache] = None,
+        rate_limit: Optional[float] = None,
+        rate_burst: Optional[float] = None,
+        max_concurrency: int = 32,
+        latency_budgets: Optional[Dict[str, float]] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_stale: float = 21600.0,
+        series: Optional[WeatherSeriesStore] = None,
+        rules: Optional[RuleEngine] = None,
+        series_flush_delay: float = 1.0,
+        cell_deg: Optional[float] = None,
+    ):
         self.api_key = api_key
-        self.base_url = "https://api.openweathermap. org/data/2.5"
+        self.base_url = (base_url or Settings.weather_api_url).rstrip("/")
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=connect_timeout, pool=connect_timeout
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # HTTP/2 требует пакета h2; без него остаётся HTTP/1.1 с keep-alive
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.cache = cache
+        # Ключи объединения запросов совпадают с ячейками кэша
+        if cache is not None:
+            self.cell_deg = cache.cell_deg
+        else:
+            self.cell_deg = cell_deg or Settings.weather_cell_deg
+        self._flights = SingleFlight()
+        self._bucket = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self.max_concurrency = max_concurrency
+        self.last_refresh: Dict[str, Any] = {}
+        self.latency_budgets = {"weather": 3.0, "forecast": 5.0, **(latency_budgets or {})}
+        self._breakers = {
+            endpoint: CircuitBreaker(
+                endpoint, failure_threshold=failure_threshold, reset_timeout=reset_timeout
+            )
+            for endpoint in _ENDPOINTS.values()
+        }
+        self.max_stale = max_stale
+        self._revalidations: Set[asyncio.Task] = set()
+        self.served = {"fresh": 0, "stale": 0, "unavailable": 0}
+        self.series = series
+        self.rules = rules or RuleEngine()
+        # Ответы копятся и пишутся в хранилище рядов группами в потоке
+        self.series_flush_delay = series_flush_delay
+        self._series_pending: List[Tuple[str, Any, Any, Dict[str, Any]]] = []
+        self._series_task: Optional[asyncio.Task] = None
+        self._series_lock = asyncio.Lock()
+        self._series_errors = 0
     
-    async def get_current_weather(
-        self, lat:  float, lon: float
-    ) -> Optional[WeatherData]: 
-        """Получение текущей погоды"""
-        if not self.api_key:
-            return self._get_mock_weather()
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "WeatherService":
+        """Создание сервиса по настройкам приложения"""
+        return cls(
+            api_key=settings.weather_api_key,
+            base_url=settings.weather_api_url,
+            connect_timeout=settings.weather_connect_timeout,
+            read_timeout=settings.weather_read_timeout,
+            max_connections=settings.weather_max_connections,
+            max_keepalive=settings.weather_max_keepalive,
+            keepalive_expiry=settings.weather_keepalive_expiry,
+            http2=settings.weather_http2,
+            cache=WeatherCache.from_settings(settings),
+            rate_limit=settings.weather_rate_limit,
+            rate_burst=settings.weather_rate_burst,
+            max_concurrency=settings.weather_max_concurrency,
+            latency_budgets={
+                "weather": settings.weather_budget_current,
+                "forecast": settings.weather_budget_forecast,
+            },
+            failure_threshold=settings.weather_failure_threshold,
+            reset_timeout=settings.weather_reset_timeout,
+            max_stale=settings.weather_max_stale,
+            series=WeatherSeriesStore.from_settings(settings),
+            cell_deg=settings.weather_cell_deg,
+        )
+    
+    async def __aenter__(self) -> "WeatherService":
+        await self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def start(self):
+        """Создание общего HTTP-клиента"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self._transport,
+            )
+    
+    async def close(self):
+        """Остановка фоновых обновлений, закрытие клиента и его соединений"""
+        for task in list(self._revalidations):
+            task.cancel()
+        if self._revalidations:
+            await asyncio.gather(*self._revalidations, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.series is not None:
+            await self.flush_series()
+            if self._series_task is not None:
+                self._series_task.cancel()
+        if self.cache is not None:
+            await self.cache.flush()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Метрики кэша погоды"""
+        return self.cache.get_stats() if self.cache is not None else {}
+    
+    def get_request_stats(self) -> Dict[str, Any]:
+        """Метрики запросов к API
         
+        saved — запросы, сэкономленные объединением; served — ответы
+        свежими, устаревшими данными и отказы; breakers — состояние
+        выключателей по методам API.
+        """
+        data = self._flights.get_stats()
+        data["served"] = dict(self.served)
+        data["revalidating"] = len(self._revalidations)
+        data["series_errors"] = self._series_errors
+        data["breakers"] = {
+            endpoint: breaker.get_stats() for endpoint, breaker in self._breakers.items()
+        }
+        return data
+    
+    async def invalidate_area(self, zone: RiskZone) -> int:
+        """Сброс кэша в зоне (например, при штормовом предупреждении)"""
+        if self.cache is None:
+            return 0
+        return await self.cache.invalidate_zone(zone, (CURRENT, FORECAST, ALERTS))
+    
+    async def _fetch(
+        self, kind: str, endpoint: str, lat: float, lon: float
+    ) -> Tuple[Dict[str, Any], float, bool]:
+        """Ответ API через кэш по ячейке сетки
+        
+        Возвращает ответ, его возраст в секундах и признак устаревания.
+        """
+        key = grid_cell(lat, lon, self.cell_deg)
+        if self.cache is None:
+            payload = await self._flights.do(
+                (kind, key),
+                lambda: self._request(endpoint, *grid_cell_center(key, self.cell_deg)),
+            )
+            self.served["fresh"] += 1
+            return payload, 0.0, False
+        
+        entry = await self.cache.get(kind, key, allow_stale=True)
+        if entry is not None:
+            age = entry.age(self.cache.now())
+            if age < self.cache.ttl[kind]:
+                self.served["fresh"] += 1
+                return entry.payload, age, False
+            if age <= self.max_stale:
+                self._revalidate(kind, endpoint, key)
+                self.served["stale"] += 1
+                return entry.payload, age, True
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/weather",
+            payload = await self._flights.do(
+                (kind, key), lambda: self._fetch_cell(kind, endpoint, key)
+            )
+        except Exception:
+            if entry is None:
+                self.served["unavailable"] += 1
+                raise
+            # Лучше очень старые данные с отметкой возраста, чем никаких
+            self.served["stale"] += 1
+            return entry.payload, entry.age(self.cache.now()), True
+        self.served["fresh"] += 1
+        return payload, 0.0, False
+    
+    def _revalidate(self, kind: str, endpoint: str, key):
+        """Фоновое обновление устаревшей записи (одно на ячейку)"""
+        task = asyncio.ensure_future(self._flights.do(
+            (kind, key), lambda: self._fetch_cell(kind, endpoint, key)
+        ))
+        self._revalidations.add(task)
+        task.add_done_callback(self._revalidation_done)
+    
+    def _revalidation_done(self, task: asyncio.Task):
+        self._revalidations.discard(task)
+        if not task.cancelled():
+            # Ошибка учтена выключателем; устаревшие данные остаются в кэше
+            task.exception()
+    
+    async def _fetch_cell(self, kind: str, endpoint: str, key) -> Dict[str, Any]:
+        """Запрос данных для центра ячейки с сохранением в кэш"""
+        payload = await self._request(endpoint, *self.cache.cell_center(key))
+        self.cache.put(kind, key, payload)
+        if self.series is not None:
+            self._record_series(kind, key, payload)
+        return payload
+    
+    def _record_series(self, kind: str, key, payload: Dict[str, Any]):
+        """Постановка ответа в очередь записи рядов ячейки"""
+        if kind == CURRENT:
+            record = (OBSERVATION, key, [payload.get("dt", self.cache.now())], {
+                "temp": [payload["main"]["temp"]],
+                "feels_like": [payload["main"]["feels_like"]],
+                "humidity": [payload["main"]["humidity"]],
+                "pressure": [payload["main"]["pressure"]],
+                "wind_speed": [payload["wind"]["speed"]],
+            })
+        elif kind == FORECAST:
+            series = self._forecast_series(payload)
+            record = (FORECAST, key, series.timestamps, series.values)
+        else:
+            return
+        self._series_pending.append(record)
+        if self._series_task is None or self._series_task.done():
+            self._series_task = asyncio.ensure_future(self._flush_series_later())
+    
+    async def _flush_series_later(self):
+        await asyncio.sleep(self.series_flush_delay)
+        await self.flush_series()
+    
+    async def flush_series(self):
+        """Запись накопленных ответов в хранилище рядов одной транзакцией
+        
+        Группы пишутся по очереди, чтобы более новый ответ не был
+        перезаписан более старым.
+        """
+        async with self._series_lock:
+            while self._series_pending:
+                batch, self._series_pending = self._series_pending, []
+                try:
+                    await asyncio.to_thread(self.series.append_many, batch)
+                except Exception:
+                    self._series_errors += 1
+    
+    async def get_trend(
+        self,
+        lat: float,
+        lon: float,
+        start: float,
+        end: float,
+        resolution: str = DAY,
+        kind: str = OBSERVATION,
+    ) -> Series:
+        """Агрегаты ряда ячейки точки за период [start, end)"""
+        if self.series is None or self.cache is None:
+            return Series.empty()
+        await self.flush_series()
+        return await asyncio.to_thread(
+            self.series.rollup, kind, self.cache.cell(lat, lon), start, end, resolution
+        )
+    
+    async def _request(self, endpoint: str, lat: float, lon: float) -> Dict[str, Any]:
+        """GET-запрос к API погоды через общий клиент
+        
+        Запрос ограничен бюджетом времени метода. Таймауты, сетевые ошибки,
+        ответы 5xx и 429 считаются отказами для выключателя.
+        """
+        if self._client is None:
+            await self.start()
+        breaker = self._breakers.get(endpoint)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            response = await asyncio.wait_for(
+                self._client.get(
+                    f"/{endpoint}",
                     params={
                         "lat": lat,
                         "lon": lon,
@@ -62,63 +392,339 @@ class WeatherService:
                         "units":  "metric",
                         "lang": "ru",
                     }
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                return WeatherData(
-                    temperature=data["main"]["temp"],
-                    feels_like=data["main"]["feels_like"],
-                    humidity=data["main"]["humidity"],
-                    pressure=data["main"]["pressure"],
-                    wind_speed=data["wind"]["speed"],
-                    wind_direction=self._get_wind_direction(data["wind"]. get("deg", 0)),
-                    description=data["weather"][0]["description"],
-                    icon=data["weather"][0]["icon"],
-                )
-        except Exception: 
+                ),
+                self.latency_budgets.get(endpoint),
+            )
+            if breaker is not None and (
+                response.status_code >= 500 or response.status_code == 429
+            ):
+                breaker.record_failure()
+                breaker = None
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.TransportError, asyncio.TimeoutError):
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.record_cancel()
+            raise
+        except Exception:
+            # Ошибки запроса (4xx, разбор ответа) не говорят о недоступности API
+            if breaker is not None:
+                breaker.record_success()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return data
+    
+    async def get_current_weather(
+        self, lat:  float, lon: float
+    ) -> Optional[WeatherData]: 
+        """Получение текущей погоды; None — данных нет и API недоступен"""
+        if not self.api_key:
             return self._get_mock_weather()
+        
+        try:
+            data, age, stale = await self._fetch(CURRENT, "weather", lat, lon)
+            weather = self._parse_weather(data)
+        except Exception: 
+            return None
+        try:
+            weather.alerts = await self._alerts_for(lat, lon, data)
+        except Exception:
+            # Сбой правил или неполный ответ не отменяет саму погоду
+            weather.alerts = []
+        weather.age_seconds = age
+        weather.is_stale = stale
+        return weather
+    
+    async def get_weather_batch(
+        self,
+        locations: Iterable[Tuple[float, float]],
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[int, Optional[WeatherData]]]:
+        """Текущая погода для многих точек по мере получения
+        
+        Точки группируются по ячейкам сетки: на ячейку — один запрос.
+        Выдаёт пары (индекс точки во входном списке, погода).
+        """
+        groups: Dict[Any, List[int]] = {}
+        first_point: Dict[Any, Tuple[float, float]] = {}
+        for i, (lat, lon) in enumerate(locations):
+            key = grid_cell(lat, lon, self.cell_deg)
+            groups.setdefault(key, []).append(i)
+            first_point.setdefault(key, (lat, lon))
+        
+        async for key, weather in self._run_bounded(
+            list(groups),
+            lambda key: self.get_current_weather(*first_point[key]),
+            concurrency or self.max_concurrency,
+        ):
+            if isinstance(weather, BaseException):
+                weather = None
+            for i in groups[key]:
+                yield i, weather
+    
+    async def refresh_cells(
+        self,
+        points: Iterable[Tuple[float, float]],
+        kinds: Iterable[str] = (CURRENT,),
+        horizon: float = 0.0,
+    ) -> Dict[str, Any]:
+        """Обновление кэша для ячеек, где есть точки (например, жители)
+        
+        Запрашиваются только ячейки без данных или с данными, которые
+        устареют в ближайшие horizon секунд. Возвращает статистику прохода.
+        """
+        if self.cache is None:
+            return {}
+        started = time.monotonic()
+        cells = {self.cache.cell(lat, lon) for lat, lon in points}
+        now = self.cache.now()
+        due = []
+        for kind in kinds:
+            for key, entry in (await self.cache.peek_many(kind, cells)).items():
+                if entry is None or entry.age(now) + horizon >= self.cache.ttl[kind]:
+                    due.append((kind, key))
+        
+        refreshed = errors = 0
+        async for _, result in self._run_bounded(
+            due,
+            lambda item: self._flights.do(
+                item, lambda: self._fetch_cell(item[0], _ENDPOINTS[item[0]], item[1])
+            ),
+            self.max_concurrency,
+        ):
+            if isinstance(result, BaseException):
+                errors += 1
+            else:
+                refreshed += 1
+        return {
+            "cells": len(cells),
+            "due": len(due),
+            "refreshed": refreshed,
+            "errors": errors,
+            "duration": time.monotonic() - started,
+        }
+    
+    async def run_refresh_loop(
+        self,
+        load_points: Callable[[], Awaitable[Iterable[Tuple[float, float]]]],
+        interval: float = 300.0,
+        kinds: Iterable[str] = (CURRENT,),
+    ):
+        """Периодическое обновление всех заселённых ячеек
+        
+        За каждый интервал (обычно notification_check_interval) заранее
+        обновляются ячейки, данные которых устареют до следующего прохода.
+        Если их больше, чем позволяет квота за интервал, в статистике
+        прохода выставляется over_quota.
+        """
+        kinds = tuple(kinds)
+        while True:
+            started = time.monotonic()
+            stats = await self.refresh_cells(await load_points(), kinds, horizon=interval)
+            if self._bucket is not None:
+                stats["quota"] = int(self._bucket.rate * interval)
+                stats["over_quota"] = stats.get("due", 0) > stats["quota"]
+            if self.series is not None:
+                await self.flush_series()
+                stats["downsampled"] = await asyncio.to_thread(self.series.apply_retention)
+            self.last_refresh = stats
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0.0))
+    
+    async def _run_bounded(
+        self,
+        items: List[Any],
+        call: Callable[[Any], Awaitable[Any]],
+        concurrency: int,
+    ) -> AsyncIterator[Tuple[Any, Any]]:
+        """call(item) для всех элементов не более чем concurrency одновременно
+        
+        Результаты (или исключения) выдаются по мере готовности. На каждый
+        элемент выдаётся ровно один результат — и тогда, когда вызов
+        завершился отменой (например, отменён общий запрос SingleFlight).
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(items)
+        
+        async def worker():
+            for item in pending:
+                try:
+                    result = await call(item)
+                except (Exception, asyncio.CancelledError) as e:
+                    results.put_nowait((item, e))
+                    # Отменён сам обработчик, а не только вызов
+                    if asyncio.current_task().cancelling():
+                        raise
+                else:
+                    results.put_nowait((item, result))
+        
+        workers = [
+            asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))
+        ]
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+    
+    def _parse_weather(self, data: Dict[str, Any]) -> WeatherData:
+        """Текущая погода из ответа API"""
+        return WeatherData(
+            temperature=data["main"]["temp"],
+            feels_like=data["main"]["feels_like"],
+            humidity=data["main"]["humidity"],
+            pressure=data["main"]["pressure"],
+            wind_speed=data["wind"]["speed"],
+            wind_direction=self._get_wind_direction(data["wind"]. get("deg", 0)),
+            description=data["weather"][0]["description"],
+            icon=data["weather"][0]["icon"],
+        )
     
     async def get_forecast(
         self, lat: float, lon:  float, days: int = 5
     ) -> List[WeatherForecast]:
-        """Получение прогноза погоды"""
+        """Получение прогноза погоды; пустой список — данных нет и API недоступен"""
         if not self.api_key:
             return self._get_mock_forecast(days)
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/forecast",
-                    params={
-                        "lat": lat,
-                        "lon": lon,
-                        "appid": self.api_key,
-                        "units": "metric",
-                        "lang": "ru",
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                forecasts = []
-                for item in data["list"][:days * 8: 8]: 
-                    forecasts. append(WeatherForecast(
-                        date=datetime.fromtimestamp(item["dt"]),
-                        temp_min=item["main"]["temp_min"],
-                        temp_max=item["main"]["temp_max"],
-                        description=item["weather"][0]["description"],
-                        icon=item["weather"][0]["icon"],
-                        precipitation_probability=item.get("pop", 0) * 100,
-                    ))
-                return forecasts
+            data, age, stale = await self._fetch(FORECAST, "forecast", lat, lon)
+            forecasts = self._daily_forecast(data, days)
         except Exception:
-            return self._get_mock_forecast(days)
+            return []
+        for forecast in forecasts:
+            forecast.age_seconds = age
+            forecast.is_stale = stale
+        return forecasts
+    
+    @staticmethod
+    def _forecast_series(data: Dict[str, Any]) -> Series:
+        """Все трёхчасовые слоты прогноза в виде ряда"""
+        items = data["list"]
+        return Series(
+            np.array([item["dt"] for item in items], dtype=np.int64),
+            {
+                "temp": np.array([item["main"]["temp"] for item in items], dtype=np.float32),
+                "temp_min": np.array([item["main"]["temp_min"] for item in items], dtype=np.float32),
+                "temp_max": np.array([item["main"]["temp_max"] for item in items], dtype=np.float32),
+                "humidity": np.array([item["main"]["humidity"] for item in items], dtype=np.float32),
+                "pressure": np.array([item["main"]["pressure"] for item in items], dtype=np.float32),
+                "wind_speed": np.array([item["wind"]["speed"] for item in items], dtype=np.float32),
+                "pop": np.array([item.get("pop", 0) for item in items], dtype=np.float32),
+            },
+        )
+    
+    def _daily_forecast(self, data: Dict[str, Any], days: int) -> List[WeatherForecast]:
+        """Суточный прогноз по всем слотам в местном времени точки
+        
+        Минимум и максимум — по всем слотам суток, вероятность осадков —
+        наибольшая; описание и значок — слота, ближайшего к полудню.
+        """
+        if not data["list"]:
+            return []
+        utc_offset = data.get("city", {}).get("timezone", 0)
+        series = self._forecast_series(data)
+        daily = rollup(series, 86400, utc_offset)
+        
+        local = series.timestamps + utc_offset
+        day_of_slot = local // 86400
+        # Ключ сортировки: сутки, затем удалённость от полудня
+        order = np.lexsort((np.abs(local % 86400 - 43200), day_of_slot))
+        first = np.r_[True, day_of_slot[order][1:] != day_of_slot[order][:-1]]
+        midday = order[first]
+        
+        forecasts = []
+        for i, day_start in enumerate(daily.timestamps[:days].tolist()):
+            item = data["list"][midday[i]]
+            forecasts.append(WeatherForecast(
+                date=datetime(1970, 1, 1) + timedelta(seconds=day_start + utc_offset),
+                temp_min=float(daily.values["temp_min_min"][i]),
+                temp_max=float(daily.values["temp_max_max"][i]),
+                description=item["weather"][0]["description"],
+                icon=item["weather"][0]["icon"],
+                precipitation_probability=round(float(daily.values["pop_max"][i]) * 100, 1),
+            ))
+        return forecasts
     
     async def get_weather_alerts(self, lat: float, lon: float) -> List[str]: 
-        """Получение погодных предупреждений"""
-        # В реальном приложении здесь был бы запрос к API
-        return []
+        """Получение погодных предупреждений по прогнозу для точки"""
+        if not self.api_key:
+            return []
+        try:
+            data, _, _ = await self._fetch(FORECAST, "forecast", lat, lon)
+            series = self._forecast_series(data)
+            return self.rules.alerts(
+                series.timestamps,
+                {name: column[np.newaxis, :] for name, column in series.values.items()},
+                data.get("city", {}).get("timezone", 0),
+            )
+        except Exception:
+            # Нет данных или неполный ответ — предупреждений нет
+            return []
+    
+    async def _alerts_for(
+        self, lat: float, lon: float, current: Dict[str, Any]
+    ) -> List[str]:
+        """Предупреждения к текущей погоде: наблюдение и прогноз из кэша
+        
+        Прогноз не запрашивается: берётся сохранённый для ячейки, если есть.
+        """
+        parts = [Series(
+            np.array([current.get("dt", time.time())], dtype=np.int64),
+            {
+                "temp": np.array([current["main"]["temp"]], dtype=np.float32),
+                "temp_min": np.array([current["main"]["temp"]], dtype=np.float32),
+                "temp_max": np.array([current["main"]["temp"]], dtype=np.float32),
+                "feels_like": np.array([current["main"]["feels_like"]], dtype=np.float32),
+                "wind_speed": np.array([current["wind"]["speed"]], dtype=np.float32),
+            },
+        )]
+        utc_offset = current.get("timezone", 0)
+        entry = None
+        if self.cache is not None:
+            entry = await self.cache.peek(FORECAST, self.cache.cell(lat, lon))
+        if entry is not None:
+            forecast = self._forecast_series(entry.payload)
+            later = forecast.timestamps > parts[0].timestamps[0]
+            parts.append(forecast.select(later))
+        timestamps = np.concatenate([part.timestamps for part in parts])
+        values = {}
+        for name in parts[-1].values:
+            values[name] = np.concatenate([
+                part.values.get(name, np.full(len(part), np.nan, dtype=np.float32))
+                for part in parts
+            ])[np.newaxis, :]
+        return self.rules.alerts(timestamps, values, utc_offset)
+    
+    async def evaluate_risks(
+        self, now: Optional[float] = None, horizon_days: int = 5
+    ) -> List[Risk]:
+        """Погодные риски по прогнозам всех ячеек хранилища рядов
+        
+        Соседние ячейки, где сработало одно правило, объединяются в одну
+        зону риска.
+        """
+        if self.series is None or self.cache is None:
+            return []
+        now = time.time() if now is None else now
+        await self.flush_series()
+        
+        def evaluate() -> List[Risk]:
+            # Слот, идущий сейчас, тоже учитывается
+            cells, timestamps, values = self.series.load_grid(
+                FORECAST, now - 3 * 3600, now + horizon_days * 86400
+            )
+            return self.rules.risks(
+                cells, timestamps, values, self.cache.cell_deg, self.series.utc_offset
+            )
+        
+        # Чтение всей сетки и правила — в потоке, чтобы не держать цикл событий
+        return await asyncio.to_thread(evaluate)
     
     def _get_wind_direction(self, degrees: int) -> str:
         """Преобразование градусов в направление ветра"""
@@ -133,7 +739,7 @@ class WeatherService:
             feels_like=-10,
             humidity=75,
             pressure=1013,
-            wind_speed=5. 2,
+            wind_speed=5.2,
             wind_direction="СВ",
             description="облачно с прояснениями",
             icon="03d",
@@ -142,8 +748,6 @@ class WeatherService:
     
     def _get_mock_forecast(self, days: int) -> List[WeatherForecast]: 
         """Моковый прогноз погоды"""
-        from datetime import timedelta
-        
         forecasts = []
         base_date = datetime. now()
         
@@ -0,0 +1,464 @@
+"""Компактное хранилище временных рядов погоды по ячейкам сетки
+
+Ряды хранятся в SQLite кусками (chunk) фиксированной длительности:
+метки времени — первая метка и разности (int32), значения — столбцы
+float32; оба блока сжаты zlib. Регулярный шаг (3 часа у прогноза)
+сжимается почти до нуля. Старые данные прореживаются до часовых, затем
+до суточных агрегатов (min/max/среднее и число наблюдений).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+from src.config.settings import Settings
+from src.services.location_service import ArrayLike
+
+
+CellKey = Tuple[int, int]
+
+# Виды рядов
+OBSERVATION = "observation"
+FORECAST = "forecast"
+
+# Разрешения хранения
+RAW = "raw"
+HOUR = "hour"
+DAY = "day"
+
+BUCKET_SECONDS = {HOUR: 3600, DAY: 86400}
+# Длительность куска: кратна неделе, чтобы границы кусков совпадали с часами
+CHUNK_SECONDS = {RAW: 7 * 86400, HOUR: 28 * 86400, DAY: 364 * 86400}
+
+STATS = ("mean", "min", "max", "count")
+
+
+@dataclass
+class Series:
+    """Отрезок ряда: отсортированные метки времени и столбцы значений
+
+    У сырых рядов столбцы — поля (temp, humidity...), у агрегированных —
+    поле_mean, поле_min, поле_max, поле_count.
+    """
+    timestamps: np.ndarray
+    values: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def empty(cls) -> "Series":
+        return cls(np.empty(0, dtype=np.int64), {})
+
+    def fields(self) -> List[str]:
+        """Поля ряда без суффиксов агрегатов"""
+        if not self.is_rolled():
+            return list(self.values)
+        names = []
+        for name in self.values:
+            base = _base_field(name)
+            if base not in names:
+                names.append(base)
+        return names
+
+    def is_rolled(self) -> bool:
+        return any(name.endswith("_count") for name in self.values)
+
+    def select(self, mask: np.ndarray) -> "Series":
+        return Series(
+            self.timestamps[mask], {name: col[mask] for name, col in self.values.items()}
+        )
+
+
+def _base_field(name: str) -> str:
+    for stat in STATS:
+        if name.endswith("_" + stat):
+            return name[: -len(stat) - 1]
+    return name
+
+
+def _concat(parts: Sequence[Series]) -> Series:
+    """Склейка отрезков; отсутствующие столбцы заполняются NaN (count — нулём)"""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return Series.empty()
+    names: List[str] = []
+    for part in parts:
+        names.extend(name for name in part.values if name not in names)
+    values = {}
+    for name in names:
+        fill = 0.0 if name.endswith("_count") else np.nan
+        values[name] = np.concatenate([
+            part.values.get(name, np.full(len(part), fill, dtype=np.float32))
+            for part in parts
+        ]).astype(np.float32)
+    return Series(np.concatenate([part.timestamps for part in parts]), values)
+
+
+def _as_stats(series: Series) -> Series:
+    """Сырой ряд в форму агрегатов (каждое наблюдение — агрегат из одного)"""
+    if series.is_rolled():
+        return series
+    values = {}
+    for name, column in series.values.items():
+        valid = ~np.isnan(column)
+        values[f"{name}_mean"] = column
+        values[f"{name}_min"] = column
+        values[f"{name}_max"] = column
+        values[f"{name}_count"] = valid.astype(np.float32)
+    return Series(series.timestamps, values)
+
+
+def rollup(series: Series, bucket: int, utc_offset: int = 0) -> Series:
+    """Агрегаты min/max/среднее по интервалам bucket секунд
+
+    Интервалы выравниваются по местному времени (utc_offset секунд),
+    метка интервала — его начало в UTC. Принимает сырые и уже
+    агрегированные ряды: средние взвешиваются числом наблюдений.
+    """
+    if not len(series):
+        return Series.empty()
+    stats = _as_stats(series)
+    order = np.argsort(stats.timestamps, kind="stable")
+    timestamps = stats.timestamps[order]
+    keys = (timestamps + utc_offset) // bucket
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    result = Series(keys[starts] * bucket - utc_offset, {})
+
+    for name in stats.fields():
+        count = stats.values[f"{name}_count"][order].astype(np.float64)
+        mean = stats.values[f"{name}_mean"][order].astype(np.float64)
+        has = count > 0
+        total_count = np.add.reduceat(count, starts)
+        total = np.add.reduceat(np.where(has, mean * count, 0.0), starts)
+        low = np.minimum.reduceat(
+            np.where(has, stats.values[f"{name}_min"][order], np.inf), starts
+        )
+        high = np.maximum.reduceat(
+            np.where(has, stats.values[f"{name}_max"][order], -np.inf), starts
+        )
+        empty = total_count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result.values[f"{name}_mean"] = np.where(empty, np.nan, total / total_count).astype(np.float32)
+        result.values[f"{name}_min"] = np.where(empty, np.nan, low).astype(np.float32)
+        result.values[f"{name}_max"] = np.where(empty, np.nan, high).astype(np.float32)
+        result.values[f"{name}_count"] = total_count.astype(np.float32)
+    return result
+
+
+def _encode(series: Series) -> Tuple[int, str, bytes, bytes]:
+    """Кусок в (первая метка, список столбцов, блок меток, блок значений)"""
+    timestamps = series.timestamps
+    deltas = np.diff(timestamps).astype(np.int32)
+    names = list(series.values)
+    matrix = np.stack([series.values[name] for name in names]).astype(np.float32)
+    return (
+        int(timestamps[0]),
+        ",".join(names),
+        zlib.compress(deltas.tobytes()),
+        zlib.compress(matrix.tobytes()),
+    )
+
+
+def _decode(first_ts: int, count: int, columns: str, t_blob: bytes, v_blob: bytes) -> Series:
+    deltas = np.frombuffer(zlib.decompress(t_blob), dtype=np.int32)
+    timestamps = np.empty(count, dtype=np.int64)
+    timestamps[0] = first_ts
+    np.cumsum(deltas, out=timestamps[1:])
+    timestamps[1:] += first_ts
+    names = columns.split(",") if columns else []
+    matrix = np.frombuffer(zlib.decompress(v_blob), dtype=np.float32).reshape(len(names), count)
+    return Series(timestamps, {name: matrix[i] for i, name in enumerate(names)})
+
+
+class WeatherSeriesStore:
+    """Ряды наблюдений и прогнозов по ячейкам сетки
+
+    Запись объединяется с уже сохранённым куском: для сырых рядов новое
+    значение заменяет старое с той же меткой (переизданный прогноз), для
+    агрегатов — объединяется с ним. Суточные интервалы считаются по
+    местному времени utc_offset.
+
+    Методы синхронные и потокобезопасные: из асинхронного кода их
+    вызывают через asyncio.to_thread.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        utc_offset: int = 3 * 3600,
+        raw_retention_days: float = 14,
+        hourly_retention_days: float = 180,
+        daily_retention_days: float = 1826,
+    ):
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.utc_offset = utc_offset
+        self.retention = {
+            RAW: raw_retention_days * 86400,
+            HOUR: hourly_retention_days * 86400,
+            DAY: daily_retention_days * 86400,
+        }
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS weather_series (
+                kind TEXT NOT NULL,
+                lat_q INTEGER NOT NULL,
+                lon_q INTEGER NOT NULL,
+                resolution TEXT NOT NULL,
+                chunk_start INTEGER NOT NULL,
+                first_ts INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                columns TEXT NOT NULL,
+                t_blob BLOB NOT NULL,
+                v_blob BLOB NOT NULL,
+                PRIMARY KEY (kind, lat_q, lon_q, resolution, chunk_start)
+            ) WITHOUT ROWID
+        """)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "WeatherSeriesStore":
+        """Создание хранилища по настройкам приложения"""
+        return cls(
+            path=settings.weather_series_path,
+            utc_offset=settings.weather_utc_offset,
+            raw_retention_days=settings.weather_raw_retention_days,
+            hourly_retention_days=settings.weather_hourly_retention_days,
+            daily_retention_days=settings.weather_daily_retention_days,
+        )
+
+    def close(self):
+        """Закрытие файла хранилища"""
+        with self._lock:
+            self._db.close()
+
+    def append(
+        self,
+        kind: str,
+        cell: CellKey,
+        timestamps: ArrayLike,
+        values: Dict[str, ArrayLike],
+    ):
+        """Добавление сырых значений (метки — секунды UTC)"""
+        self.append_many([(kind, cell, timestamps, values)])
+
+    def append_many(
+        self, items: Iterable[Tuple[str, CellKey, ArrayLike, Dict[str, ArrayLike]]]
+    ):
+        """Добавление рядов многих ячеек одной транзакцией
+
+        items — кортежи (вид, ячейка, метки, значения) как у append.
+        """
+        with self._lock, self._db:
+            for kind, cell, timestamps, values in items:
+                timestamps = np.asarray(timestamps, dtype=np.int64)
+                if not len(timestamps):
+                    continue
+                series = Series(timestamps, {
+                    name: np.asarray(column, dtype=np.float32)
+                    for name, column in values.items()
+                })
+                self._merge(kind, cell, RAW, series)
+
+    def query(
+        self,
+        kind: str,
+        cell: CellKey,
+        start: float,
+        end: float,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Series:
+        """Сырые значения в интервале [start, end)"""
+        with self._lock:
+            series = self._read(kind, cell, RAW, start, end)
+        if fields is not None:
+            fields = set(fields)
+            series.values = {n: c for n, c in series.values.items() if n in fields}
+        return series
+
+    def rollup(
+        self,
+        kind: str,
+        cell: CellKey,
+        start: float,
+        end: float,
+        resolution: str = DAY,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Series:
+        """Часовые или суточные агрегаты в интервале [start, end)
+
+        Объединяет прореженные агрегаты и ещё не прореженные сырые данные.
+        Начало периода выравнивается по границе интервала.
+        """
+        bucket = BUCKET_SECONDS[resolution]
+        start = (start + self.utc_offset) // bucket * bucket - self.utc_offset
+        with self._lock:
+            parts = [_as_stats(self._read(kind, cell, RAW, start, end))]
+            parts.append(self._read(kind, cell, HOUR, start, end))
+            if resolution == DAY:
+                parts.append(self._read(kind, cell, DAY, start, end))
+        series = rollup(_concat(parts), bucket, self.utc_offset)
+        if fields is not None:
+            fields = set(fields)
+            series.values = {
+                n: c for n, c in series.values.items() if _base_field(n) in fields
+            }
+        return series
+
+    def load_grid(
+        self,
+        kind: str,
+        start: float,
+        end: float,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Сырые значения всех ячеек на общей оси времени за [start, end)
+
+        Возвращает ячейки (n × 2), метки (m) и матрицы n × m по полям;
+        отсутствующие значения — NaN. Читается одним запросом.
+        """
+        span = CHUNK_SECONDS[RAW]
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT lat_q, lon_q, first_ts, count, columns, t_blob, v_blob "
+                "FROM weather_series WHERE kind = ? AND resolution = ? "
+                "AND chunk_start > ? AND chunk_start < ?",
+                (kind, RAW, start - span, end),
+            ).fetchall()
+        cells: Dict[CellKey, int] = {}
+        parts: List[Series] = []
+        owners: List[np.ndarray] = []
+        for lat_q, lon_q, *chunk in rows:
+            series = _decode(*chunk)
+            series = series.select((series.timestamps >= start) & (series.timestamps < end))
+            if not len(series):
+                continue
+            index = cells.setdefault((lat_q, lon_q), len(cells))
+            parts.append(series)
+            owners.append(np.full(len(series), index, dtype=np.int64))
+        merged = _concat(parts)
+        if fields is None:
+            fields = merged.fields()
+        timestamps = np.unique(merged.timestamps)
+        grid = {}
+        if len(merged):
+            rows_of = np.concatenate(owners)
+            cols_of = np.searchsorted(timestamps, merged.timestamps)
+        for name in fields:
+            matrix = np.full((len(cells), len(timestamps)), np.nan, dtype=np.float32)
+            if name in merged.values:
+                matrix[rows_of, cols_of] = merged.values[name]
+            grid[name] = matrix
+        cell_array = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        return cell_array, timestamps, grid
+
+    def cells(self, kind: str) -> List[CellKey]:
+        """Ячейки, для которых есть данные"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT lat_q, lon_q FROM weather_series WHERE kind = ?", (kind,)
+            ).fetchall()
+        return [(lat_q, lon_q) for lat_q, lon_q in rows]
+
+    def apply_retention(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Прореживание: сырые → часовые → суточные, удаление самых старых
+
+        Переносятся только куски, целиком вышедшие за срок хранения.
+        Возвращает число обработанных кусков по разрешениям.
+        """
+        now = time.time() if now is None else now
+        done = {RAW: 0, HOUR: 0, DAY: 0}
+        with self._lock, self._db:
+            for source, target in ((RAW, HOUR), (HOUR, DAY)):
+                for kind, lat_q, lon_q, chunk_start in self._old_chunks(source, now):
+                    cell = (lat_q, lon_q)
+                    series = self._read_chunk(kind, cell, source, chunk_start)
+                    rolled = rollup(series, BUCKET_SECONDS[target], self.utc_offset)
+                    self._merge(kind, cell, target, rolled)
+                    self._delete_chunk(kind, cell, source, chunk_start)
+                    done[source] += 1
+            for kind, lat_q, lon_q, chunk_start in self._old_chunks(DAY, now):
+                self._delete_chunk(kind, (lat_q, lon_q), DAY, chunk_start)
+                done[DAY] += 1
+        return done
+
+    def _old_chunks(self, resolution: str, now: float) -> List[Tuple[str, int, int, int]]:
+        cutoff = now - self.retention[resolution] - CHUNK_SECONDS[resolution]
+        return self._db.execute(
+            "SELECT kind, lat_q, lon_q, chunk_start FROM weather_series "
+            "WHERE resolution = ? AND chunk_start < ?",
+            (resolution, cutoff),
+        ).fetchall()
+
+    def _merge(self, kind: str, cell: CellKey, resolution: str, series: Series):
+        """Запись ряда по кускам с объединением с сохранёнными"""
+        span = CHUNK_SECONDS[resolution]
+        chunk_ids = series.timestamps // span * span
+        for chunk_start in np.unique(chunk_ids).tolist():
+            part = series.select(chunk_ids == chunk_start)
+            existing = self._read_chunk(kind, cell, resolution, chunk_start)
+            if resolution == RAW:
+                merged = _concat([existing, part])
+                # Стабильная сортировка: из одинаковых меток остаётся новая
+                order = np.argsort(merged.timestamps, kind="stable")
+                merged = merged.select(order)
+                last = np.r_[merged.timestamps[1:] != merged.timestamps[:-1], True]
+                merged = merged.select(last)
+            else:
+                merged = rollup(_concat([existing, part]), 1)
+            self._write_chunk(kind, cell, resolution, chunk_start, merged)
+
+    def _read(
+        self, kind: str, cell: CellKey, resolution: str, start: float, end: float
+    ) -> Series:
+        span = CHUNK_SECONDS[resolution]
+        rows = self._db.execute(
+            "SELECT first_ts, count, columns, t_blob, v_blob FROM weather_series "
+            "WHERE kind = ? AND lat_q = ? AND lon_q = ? AND resolution = ? "
+            "AND chunk_start > ? AND chunk_start < ? ORDER BY chunk_start",
+            (kind, cell[0], cell[1], resolution, start - span, end),
+        ).fetchall()
+        series = _concat([_decode(*row) for row in rows])
+        if not len(series):
+            return series
+        return series.select((series.timestamps >= start) & (series.timestamps < end))
+
+    def _read_chunk(
+        self, kind: str, cell: CellKey, resolution: str, chunk_start: int
+    ) -> Series:
+        row = self._db.execute(
+            "SELECT first_ts, count, columns, t_blob, v_blob FROM weather_series "
+            "WHERE kind = ? AND lat_q = ? AND lon_q = ? AND resolution = ? "
+            "AND chunk_start = ?",
+            (kind, cell[0], cell[1], resolution, chunk_start),
+        ).fetchone()
+        return _decode(*row) if row else Series.empty()
+
+    def _write_chunk(
+        self, kind: str, cell: CellKey, resolution: str, chunk_start: int, series: Series
+    ):
+        first_ts, columns, t_blob, v_blob = _encode(series)
+        self._db.execute(
+            "INSERT OR REPLACE INTO weather_series "
+            "(kind, lat_q, lon_q, resolution, chunk_start, first_ts, count, columns, "
+            "t_blob, v_blob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, cell[0], cell[1], resolution, chunk_start, first_ts, len(series),
+             columns, t_blob, v_blob),
+        )
+
+    def _delete_chunk(self, kind: str, cell: CellKey, resolution: str, chunk_start: int):
+        self._db.execute(
+            "DELETE FROM weather_series WHERE kind = ? AND lat_q = ? AND lon_q = ? "
+            "AND resolution = ? AND chunk_start = ?",
+            (kind, cell[0], cell[1], resolution, chunk_start),
+        )
@@ -0,0 +1,385 @@
+"""Проверка попадания точек в зоны риска"""
+
+import math
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+import numpy as np
+
+from src.models.risk import RiskZone
+from src.services.location_service import ArrayLike, EARTH_RADIUS_KM, LocationService
+
+
+def _unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Точки (lat, lon) в единичные векторы на сфере"""
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+    return np.stack(
+        (cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)),
+        axis=-1,
+    )
+
+
+class PreparedZone:
+    """Зона риска, подготовленная для многократных проверок
+
+    Круг хранится как единичный вектор центра и косинус углового радиуса:
+    точка внутри, если скалярное произведение векторов не меньше порога.
+
+    Рёбра многоугольника раскладываются по широтным полосам. Луч из точки
+    пересекает только рёбра её полосы, поэтому проверка точки просматривает
+    несколько рёбер вместо всех. Долготы вершин разворачиваются относительно
+    первой вершины, так что многоугольник может пересекать антимеридиан.
+    """
+
+    def __init__(self, zone: RiskZone, edges_per_band: int = 8):
+        self.zone = zone
+        self.is_polygon = LocationService.has_polygon(zone)
+        if self.is_polygon:
+            self._prepare_polygon(zone.polygon, edges_per_band)
+        else:
+            self._prepare_circle(zone)
+
+    def _prepare_circle(self, zone: RiskZone):
+        """Круг: центр на сфере и порог косинуса"""
+        self._center = _unit_vectors(np.array(zone.latitude), np.array(zone.longitude))
+        angle = min(zone.radius_km / EARTH_RADIUS_KM, math.pi)
+        self._min_cos = math.cos(angle)
+        min_lat, max_lat, min_lon, max_lon = LocationService.get_bounding_box(
+            zone.latitude, zone.longitude, zone.radius_km
+        )
+        self._set_bounds(min_lat, max_lat, min_lon, max_lon)
+
+    def _prepare_polygon(self, polygon: List[tuple], edges_per_band: int):
+        """Многоугольник: развёрнутые вершины и индекс рёбер по полосам"""
+        coords = np.asarray(polygon, dtype=float)
+        lats = coords[:, 0]
+        # Шаги между соседними вершинами не превышают 180° по долготе
+        steps = (np.diff(coords[:, 1]) + 180) % 360 - 180
+        lons = coords[0, 1] + np.concatenate(([0.0], np.cumsum(steps)))
+
+        lat1, lon1 = lats, lons
+        lat2, lon2 = np.roll(lats, 1), np.roll(lons, 1)
+        self._set_bounds(lats.min(), lats.max(), lons.min(), lons.max())
+
+        # Горизонтальные рёбра луч не пересекает
+        keep = lat1 != lat2
+        self._lat1, self._lon1 = lat1[keep], lon1[keep]
+        self._lat2, self._lon2 = lat2[keep], lon2[keep]
+        self._slope = (self._lon2 - self._lon1) / (self._lat2 - self._lat1)
+        self._ref_lon = (self.min_lon + self.max_lon) / 2
+
+        edge_count = len(self._lat1)
+        band_count = max(1, edge_count // edges_per_band)
+        span = max(self.max_lat - self.min_lat, 1e-12)
+        self._band_count = band_count
+        self._band_height = span / band_count
+
+        low = self._band_of(np.minimum(self._lat1, self._lat2))
+        high = self._band_of(np.maximum(self._lat1, self._lat2))
+        lengths = high - low + 1
+        edge_ids = np.repeat(np.arange(edge_count), lengths)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        bands = np.repeat(low, lengths) + np.arange(len(edge_ids)) - starts
+        order = np.argsort(bands, kind="stable")
+        self._band_edges = edge_ids[order]
+        self._band_offsets = np.searchsorted(bands[order], np.arange(band_count + 1))
+
+    def _set_bounds(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float):
+        """Ограничивающий прямоугольник; долготы могут выходить за ±180"""
+        self.min_lat = float(min_lat)
+        self.max_lat = float(max_lat)
+        self.min_lon = float(min_lon)
+        self.max_lon = float(max_lon)
+        self._lon_span = self.max_lon - self.min_lon
+
+    def _band_of(self, lats: np.ndarray) -> np.ndarray:
+        """Номер широтной полосы"""
+        bands = np.floor((lats - self.min_lat) / self._band_height).astype(np.int64)
+        return np.clip(bands, 0, self._band_count - 1)
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Ограничивающий прямоугольник (min_lat, max_lat, min_lon, max_lon)"""
+        return self.min_lat, self.max_lat, self.min_lon, self.max_lon
+
+    def bbox_mask(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Точки внутри ограничивающего прямоугольника"""
+        inside = (lats >= self.min_lat) & (lats <= self.max_lat)
+        if self._lon_span < 360:
+            inside &= (lons - self.min_lon) % 360 <= self._lon_span
+        return inside
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Проверка попадания одной точки"""
+        return bool(self.contains_many(np.array([lat]), np.array([lon]))[0])
+
+    def contains_many(self, lats: ArrayLike, lons: ArrayLike) -> np.ndarray:
+        """Маска попадания набора точек"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.zeros(len(lats), dtype=bool)
+        candidates = np.flatnonzero(self.bbox_mask(lats, lons))
+        if len(candidates) == 0:
+            return result
+        if self.is_polygon:
+            result[candidates] = self._polygon_contains(lats[candidates], lons[candidates])
+        else:
+            points = _unit_vectors(lats[candidates], lons[candidates])
+            result[candidates] = points @ self._center >= self._min_cos
+        return result
+
+    def _polygon_contains(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Метод луча по рёбрам полосы каждой точки"""
+        lons = self._ref_lon + (lons - self._ref_lon + 180) % 360 - 180
+        inside = np.zeros(len(lats), dtype=bool)
+        bands = self._band_of(lats)
+        order = np.argsort(bands, kind="stable")
+        bounds = np.searchsorted(bands[order], np.arange(self._band_count + 1))
+        for band in np.flatnonzero(np.diff(bounds)):
+            points = order[bounds[band]:bounds[band + 1]]
+            edges = self._band_edges[self._band_offsets[band]:self._band_offsets[band + 1]]
+            if len(edges) == 0:
+                continue
+            lat = lats[points][:, None]
+            lon = lons[points][:, None]
+            lat1, lat2 = self._lat1[edges], self._lat2[edges]
+            straddles = (lat1 > lat) != (lat2 > lat)
+            cross_lon = self._lon1[edges] + (lat - lat1) * self._slope[edges]
+            crossings = np.count_nonzero(straddles & (lon < cross_lon), axis=1)
+            inside[points] = crossings % 2 == 1
+        return inside
+
+
+class ZoneMatcher:
+    """Набор подготовленных зон с пакетными запросами
+
+    Зоны раскладываются по сетке ячеек cell_deg × cell_deg градусов по
+    своим прямоугольникам. Точки запроса группируются по ячейкам, и каждая
+    группа проверяется только против зон своей ячейки. Зоны, накрывающие
+    больше max_cells ячеек, проверяются отдельно: точки сортируются по
+    широте, и бинарным поиском берётся полоса широт зоны.
+    """
+
+    def __init__(self, cell_deg: float = 1.0, max_cells: int = 4096):
+        self.cell_deg = cell_deg
+        self.max_cells = max_cells
+        self._rows = int(math.ceil(180 / cell_deg))
+        self._cols = int(math.ceil(360 / cell_deg))
+        self._zones: Dict[Hashable, PreparedZone] = {}
+        self._payloads: Dict[Hashable, Any] = {}
+        self._grid: Dict[int, Set[Hashable]] = {}
+        self._cells: Dict[Hashable, List[int]] = {}
+        self._wide: Set[Hashable] = set()
+        self._compiled: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return len(self._zones)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._zones
+
+    def keys(self) -> List[Hashable]:
+        """Ключи зон"""
+        return list(self._zones)
+
+    def add(self, key: Hashable, zone: RiskZone, payload: Any = None):
+        """Добавление или замена зоны; неизменённая зона заново не готовится"""
+        prepared = self._zones.get(key)
+        if prepared is None or prepared.zone != zone:
+            self._unregister(key)
+            prepared = PreparedZone(zone)
+            self._zones[key] = prepared
+            self._register(key, prepared)
+        self._payloads[key] = key if payload is None else payload
+
+    def remove(self, key: Hashable) -> bool:
+        """Удаление зоны"""
+        self._unregister(key)
+        self._payloads.pop(key, None)
+        return self._zones.pop(key, None) is not None
+
+    def clear(self):
+        """Удаление всех зон"""
+        self._zones.clear()
+        self._payloads.clear()
+        self._grid.clear()
+        self._cells.clear()
+        self._wide.clear()
+        self._compiled = None
+
+    def _register(self, key: Hashable, zone: PreparedZone):
+        """Раскладка зоны по ячейкам сетки"""
+        self._compiled = None
+        row_lo, row_hi = self._row_of(np.array([zone.min_lat, zone.max_lat])).tolist()
+        col_lo = int(math.floor((zone.min_lon + 180) / self.cell_deg))
+        col_hi = int(math.floor((zone.max_lon + 180) / self.cell_deg))
+        col_count = col_hi - col_lo + 1
+        if col_count >= self._cols or (row_hi - row_lo + 1) * col_count > self.max_cells:
+            self._wide.add(key)
+            return
+        cells = [
+            row * self._cols + col % self._cols
+            for row in range(row_lo, row_hi + 1)
+            for col in range(col_lo, col_hi + 1)
+        ]
+        for cell in cells:
+            self._grid.setdefault(cell, set()).add(key)
+        self._cells[key] = cells
+
+    def _unregister(self, key: Hashable):
+        """Удаление зоны из сетки"""
+        self._compiled = None
+        self._wide.discard(key)
+        for cell in self._cells.pop(key, ()):
+            keys = self._grid[cell]
+            keys.discard(key)
+            if not keys:
+                del self._grid[cell]
+
+    def _row_of(self, lats: np.ndarray) -> np.ndarray:
+        """Строка сетки по широте"""
+        rows = np.floor((lats + 90) / self.cell_deg).astype(np.int64)
+        return np.clip(rows, 0, self._rows - 1)
+
+    def _cell_of(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Ячейка сетки точек"""
+        cols = np.floor(((lons + 180) % 360) / self.cell_deg).astype(np.int64)
+        return self._row_of(lats) * self._cols + np.minimum(cols, self._cols - 1)
+
+    def get(self, key: Hashable) -> Optional[PreparedZone]:
+        """Подготовленная зона по ключу"""
+        return self._zones.get(key)
+
+    def zones_at(self, lat: float, lon: float) -> List[Any]:
+        """Зоны, содержащие точку"""
+        return self.zones_containing([lat], [lon])[0]
+
+    def zones_containing(self, lats: ArrayLike, lons: ArrayLike) -> List[List[Any]]:
+        """Для каждой точки — список зон, которые её содержат"""
+        result: List[List[Any]] = [[] for _ in range(len(lats))]
+        for i, payload in self.match_pairs(lats, lons):
+            result[i].append(payload)
+        return result
+
+    def points_in_zone(self, key: Hashable, lats: ArrayLike, lons: ArrayLike) -> np.ndarray:
+        """Индексы точек, попадающих в зону"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        order = np.argsort(lats, kind="stable")
+        hits = self._match(self._zones[key], order, lats[order], lats, lons)
+        return np.sort(hits)
+
+    def match_pairs(self, lats: ArrayLike, lons: ArrayLike) -> List[Tuple[int, Any]]:
+        """Все пары (индекс точки, зона) с попаданием"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        pairs: List[Tuple[int, Any]] = []
+        if len(lats) == 0 or not self._zones:
+            return pairs
+
+        if self._grid:
+            for i, key in self._match_grid(lats, lons):
+                pairs.append((i, self._payloads[key]))
+
+        if self._wide:
+            order = np.argsort(lats, kind="stable")
+            sorted_lats = lats[order]
+            for key in self._wide:
+                payload = self._payloads[key]
+                hits = self._match(self._zones[key], order, sorted_lats, lats, lons)
+                pairs.extend((i, payload) for i in hits.tolist())
+        return pairs
+
+    def _compile(self) -> tuple:
+        """Массивы сетки и параметров кругов для векторной проверки"""
+        if self._compiled is None:
+            keys = [key for key in self._zones if key in self._cells]
+            position = {key: i for i, key in enumerate(keys)}
+            centers = np.zeros((len(keys), 3))
+            min_cos = np.zeros(len(keys))
+            is_polygon = np.zeros(len(keys), dtype=bool)
+            bounds = np.zeros((len(keys), 4))
+            for i, key in enumerate(keys):
+                zone = self._zones[key]
+                bounds[i] = zone.min_lat, zone.max_lat, zone.min_lon, zone._lon_span
+                if zone.is_polygon:
+                    is_polygon[i] = True
+                else:
+                    centers[i] = zone._center
+                    min_cos[i] = zone._min_cos
+            cell_zones = {
+                cell: np.fromiter((position[key] for key in members), np.int64, len(members))
+                for cell, members in self._grid.items()
+            }
+            self._compiled = (keys, centers, min_cos, is_polygon, bounds, cell_zones)
+        return self._compiled
+
+    def _match_grid(self, lats: np.ndarray, lons: np.ndarray) -> List[Tuple[int, Hashable]]:
+        """Пары (индекс точки, ключ зоны) по зонам сетки
+
+        Для каждой точки берутся зоны её ячейки, все пары-кандидаты
+        собираются в массивы; круги проверяются одним векторным
+        вычислением, многоугольники — группами по зоне.
+        """
+        keys, centers, min_cos, is_polygon, bounds, cell_zones = self._compile()
+        cells = self._cell_of(lats, lons)
+        occupied, inverse = np.unique(cells, return_inverse=True)
+        empty = np.empty(0, dtype=np.int64)
+        members = [cell_zones.get(cell, empty) for cell in occupied.tolist()]
+        counts = np.fromiter((len(m) for m in members), np.int64, len(members))
+        if counts.sum() == 0:
+            return []
+        flat = np.concatenate(members)
+        offsets = np.cumsum(counts) - counts
+
+        per_point = counts[inverse]
+        point_idx = np.repeat(np.arange(len(lats)), per_point)
+        pair_start = np.cumsum(per_point) - per_point
+        within = np.arange(len(point_idx)) - np.repeat(pair_start, per_point)
+        zone_idx = flat[np.repeat(offsets[inverse], per_point) + within]
+
+        matched: List[Tuple[int, Hashable]] = []
+        circle = ~is_polygon[zone_idx]
+        if circle.any():
+            c_points, c_zones = point_idx[circle], zone_idx[circle]
+            xyz = _unit_vectors(lats[c_points], lons[c_points])
+            inside = np.einsum("ij,ij->i", xyz, centers[c_zones]) >= min_cos[c_zones]
+            matched.extend(
+                (i, keys[z]) for i, z in zip(c_points[inside].tolist(), c_zones[inside].tolist())
+            )
+        if not circle.all():
+            p_points, p_zones = point_idx[~circle], zone_idx[~circle]
+            # Отсев по прямоугольникам до поштучной проверки многоугольников
+            box = bounds[p_zones]
+            p_lats, p_lons = lats[p_points], lons[p_points]
+            in_box = (
+                (p_lats >= box[:, 0]) & (p_lats <= box[:, 1]) &
+                ((p_lons - box[:, 2]) % 360 <= box[:, 3])
+            )
+            p_points, p_zones = p_points[in_box], p_zones[in_box]
+            order = np.argsort(p_zones, kind="stable")
+            p_points, p_zones = p_points[order], p_zones[order]
+            zones, starts = np.unique(p_zones, return_index=True)
+            ends = np.append(starts[1:], len(p_zones))
+            for z, start, end in zip(zones.tolist(), starts.tolist(), ends.tolist()):
+                points = p_points[start:end]
+                inside = self._zones[keys[z]].contains_many(lats[points], lons[points])
+                matched.extend((i, keys[z]) for i in points[inside].tolist())
+        return matched
+
+    @staticmethod
+    def _match(
+        zone: PreparedZone,
+        order: np.ndarray,
+        sorted_lats: np.ndarray,
+        lats: np.ndarray,
+        lons: np.ndarray,
+    ) -> np.ndarray:
+        """Индексы точек внутри зоны по заранее отсортированным широтам"""
+        start = np.searchsorted(sorted_lats, zone.min_lat, side="left")
+        end = np.searchsorted(sorted_lats, zone.max_lat, side="right")
+        if start == end:
+            return np.empty(0, dtype=np.int64)
+        candidates = order[start:end]
+        inside = zone.contains_many(lats[candidates], lons[candidates])
+        return candidates[inside]
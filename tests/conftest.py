@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from src.services.database_service import DatabaseService
+
+
+@pytest.fixture
+def run():
+    """Запуск корутины в отдельном цикле событий"""
+    return asyncio.run
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "mnur.db")
+
+
+@pytest.fixture
+def make_db(db_path):
+    """Открытая база с применёнными миграциями"""
+    async def factory(**kwargs) -> DatabaseService:
+        db = DatabaseService(db_path, **kwargs)
+        await db.open()
+        await db.init_db()
+        return db
+    return factory
@@ -0,0 +1,80 @@
+import pytest
+
+from src.models.risk import RiskLevel
+from src.services.db_mapping import decode_polygon, risk_to_record
+
+
+POLYGON = [(55.0, 37.0), (56.0, 37.0), (56.0, 38.0)]
+KIND = {"type": "flood", "level": "high"}
+
+
+def test_dict_with_bounds_still_encodes_polygon():
+    record = risk_to_record({
+        **KIND, "id": "r1", "lat": 55.5, "lon": 37.5, "radius_km": 0, "polygon": POLYGON,
+        "min_lat": 1.0, "max_lat": 2.0, "min_lon": 3.0, "max_lon": 4.0,
+    })
+    assert isinstance(record["polygon"], str)
+    assert decode_polygon(record["polygon"]) == POLYGON
+    # Переданный прямоугольник не пересчитывается
+    assert (record["min_lat"], record["max_lon"]) == (1.0, 4.0)
+
+
+def test_dict_without_center_still_encodes_polygon():
+    record = risk_to_record({**KIND, "id": "r1", "lat": None, "polygon": POLYGON})
+    assert decode_polygon(record["polygon"]) == POLYGON
+    assert record.get("min_lat") is None
+
+
+def test_missing_bounds_are_computed_from_polygon():
+    record = risk_to_record({**KIND, "id": "r1", "lat": 55.5, "lon": 37.5, "radius_km": 0, "polygon": POLYGON})
+    assert (record["min_lat"], record["max_lat"]) == (55.0, 56.0)
+    assert (record["min_lon"], record["max_lon"]) == (37.0, 38.0)
+
+
+def test_encoded_polygon_is_kept():
+    encoded = '[[55.0, 37.0], [56.0, 37.0], [56.0, 38.0]]'
+    record = risk_to_record({**KIND, "id": "r1", "lat": 55.5, "lon": 37.5, "radius_km": 0, "polygon": encoded})
+    assert record["polygon"] == encoded
+    assert record["max_lat"] == 56.0
+
+
+def test_upsert_risk_dict_with_bounds_and_list_polygon(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            result = await db.upsert_risks([{
+                "id": "r1", "type": "flood", "level": "high", "title": "Паводок",
+                "description": "", "lat": 55.5, "lon": 37.5, "radius_km": 0,
+                "polygon": POLYGON, "min_lat": 55.0, "max_lat": 56.0,
+                "min_lon": 37.0, "max_lon": 38.0, "source": "МЧС",
+            }])
+            assert result.inserted == 1
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_risk_enums_are_normalised():
+    record = risk_to_record({"id": "r1", "type": "storm", "level": RiskLevel.LOW})
+    assert (record["type"], record["level"]) == ("storm", "low")
+
+
+@pytest.mark.parametrize("kind", [
+    {"type": "meteor", "level": "high"},
+    {"type": "flood", "level": None},
+    {"level": "high"},
+])
+def test_unknown_risk_enum_is_rejected_before_writing(make_db, run, kind):
+    async def scenario():
+        db = await make_db()
+        try:
+            with pytest.raises(ValueError):
+                await db.upsert_risks([{
+                    **kind, "id": "bad", "title": "?", "description": "",
+                    "lat": 55.5, "lon": 37.5, "radius_km": 5, "source": "фид",
+                }])
+            return await db.get_active_risk_models()
+        finally:
+            await db.close()
+
+    assert run(scenario()) == []
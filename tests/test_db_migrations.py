@@ -0,0 +1,37 @@
+import aiosqlite
+
+from src.services.db_migrations import apply_migrations, find_table_scans
+
+
+async def _plans(queries, **kwargs):
+    async with aiosqlite.connect(":memory:") as db:
+        await apply_migrations(db)
+        return await find_table_scans(db, queries, **kwargs)
+
+
+def test_service_queries_use_indexes(run, make_db):
+    async def scenario():
+        db = await make_db()
+        try:
+            return await db.check_query_plans()
+        finally:
+            await db.close()
+
+    assert run(scenario()) == {}
+
+
+def test_aliased_scan_is_reported(run):
+    queries = {
+        "indexed": ("SELECT * FROM users AS u WHERE u.id = ?", ("a",)),
+        "forced_scan": ("SELECT * FROM users AS u NOT INDEXED WHERE u.id = ?", ("a",)),
+        "subquery": (
+            "SELECT * FROM (SELECT id FROM users WHERE id = ? GROUP BY id)", ("a",),
+        ),
+    }
+    assert run(_plans(queries)) == {"forced_scan": ["SCAN u"]}
+
+
+def test_allowed_full_scan_is_skipped(run):
+    queries = {"export": ("SELECT * FROM users AS u", ())}
+    assert run(_plans(queries)) == {"export": ["SCAN u"]}
+    assert run(_plans(queries, allowed={"export"})) == {}
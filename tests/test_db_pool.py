@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from src.services.db_pool import ConnectionPool, PoolClosedError
+
+
+def test_released_connection_is_reused(db_path, run):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=3)
+        try:
+            async with pool.acquire() as first:
+                await first.execute("SELECT 1")
+            async with pool.acquire() as second:
+                assert second is first
+            return pool.get_stats()
+        finally:
+            await pool.close()
+
+    stats = run(scenario())
+    assert (stats["opened"], stats["in_use"], stats["acquisitions"]) == (1, 0, 2)
+
+
+def test_concurrent_callers_never_exceed_pool_size(db_path, run):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=2)
+        active = peak = 0
+
+        async def work():
+            nonlocal active, peak
+            async with pool.acquire() as db:
+                active += 1
+                peak = max(peak, active)
+                await db.execute("SELECT 1")
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        try:
+            await asyncio.gather(*(work() for _ in range(10)))
+            return peak, pool.get_stats()
+        finally:
+            await pool.close()
+
+    peak, stats = run(scenario())
+    assert peak == 2
+    assert stats["opened"] == 2
+    assert stats["waits"] > 0
+
+
+def test_acquire_times_out_when_pool_is_exhausted(db_path, run):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1, acquire_timeout=0.05)
+        try:
+            async with pool.acquire():
+                with pytest.raises(asyncio.TimeoutError):
+                    async with pool.acquire():
+                        pass
+            return pool.get_stats()
+        finally:
+            await pool.close()
+
+    assert run(scenario())["timeouts"] == 1
+
+
+def test_close_with_checked_out_connection(db_path, run):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1)
+
+        async def waiter():
+            async with pool.acquire():
+                pass
+
+        async with pool.acquire() as db:
+            pending = asyncio.create_task(waiter())
+            await asyncio.sleep(0)
+            await pool.close()
+            # Выданное соединение работает до возврата
+            cursor = await db.execute("SELECT 1")
+            assert (await cursor.fetchone())[0] == 1
+        with pytest.raises(PoolClosedError):
+            await pending
+        with pytest.raises(PoolClosedError):
+            async with pool.acquire():
+                pass
+        return pool.get_stats()
+
+    stats = run(scenario())
+    assert (stats["opened"], stats["in_use"]) == (0, 0)
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.services.db_writer import DatabaseWriter, WriterClosedError
+
+
+async def create_table(db):
+    await db.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, value TEXT)")
+
+
+def insert(value):
+    async def operation(db):
+        cursor = await db.execute("INSERT INTO items (value) VALUES (?)", (value,))
+        return cursor.lastrowid
+    return operation
+
+
+def test_all_operations_complete_under_bursty_load(db_path, run):
+    async def scenario():
+        writer = DatabaseWriter(db_path, max_batch=16, max_delay=0.0005)
+        await writer.submit(create_table)
+        try:
+            for burst in range(20):
+                ids = await asyncio.wait_for(
+                    asyncio.gather(*(writer.submit(insert(f"{burst}-{i}")) for i in range(50))),
+                    timeout=10,
+                )
+                assert len(set(ids)) == 50
+                await asyncio.sleep(0.0003 * (burst % 4))
+            assert writer.get_stats()["operations"] == 1 + 20 * 50
+        finally:
+            await writer.close()
+    run(scenario())
+
+
+def test_failed_operation_rolls_back_only_itself(db_path, run):
+    async def scenario():
+        writer = DatabaseWriter(db_path, max_delay=0.01)
+        await writer.submit(create_table)
+
+        async def broken(db):
+            await db.execute("INSERT INTO items (value) VALUES ('lost')")
+            raise ValueError("ошибка операции")
+
+        try:
+            results = await asyncio.gather(
+                writer.submit(insert("a")), writer.submit(broken), writer.submit(insert("b")),
+                return_exceptions=True,
+            )
+            assert isinstance(results[1], ValueError)
+
+            async def values(db):
+                cursor = await db.execute("SELECT value FROM items ORDER BY id")
+                return [row[0] for row in await cursor.fetchall()]
+            assert await writer.submit(values) == ["a", "b"]
+        finally:
+            await writer.close()
+    run(scenario())
+
+
+def test_dead_writer_fails_pending_operations(db_path, run):
+    async def scenario():
+        writer = DatabaseWriter(db_path)
+        await writer.submit(create_table)
+        started = asyncio.Event()
+
+        async def slow(db):
+            started.set()
+            await asyncio.sleep(10)
+
+        running = asyncio.ensure_future(writer.submit(slow))
+        await started.wait()
+        queued = [asyncio.ensure_future(writer.submit(insert(str(i)))) for i in range(5)]
+        await asyncio.sleep(0)
+        writer._task.cancel()
+
+        results = await asyncio.wait_for(
+            asyncio.gather(running, *queued, return_exceptions=True), timeout=5
+        )
+        assert all(isinstance(result, WriterClosedError) for result in results)
+        with pytest.raises(WriterClosedError):
+            await writer.submit(insert("после остановки"))
+        await writer.close()
+    run(scenario())
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from src.models.shelter import Shelter, ShelterCapacity, ShelterLocation
+from src.services.evacuation_planner import EvacuationPlanner, PopulationCell
+
+
+def shelter(shelter_id, lat, lon=37.0, total=100, current=0, **kwargs):
+    return Shelter(
+        id=shelter_id, name=f"Укрытие {shelter_id}", shelter_type="shelter",
+        location=ShelterLocation(latitude=lat, longitude=lon, address=""),
+        capacity=ShelterCapacity(total=total, current=current), **kwargs,
+    )
+
+
+def cell(cell_id, lat, headcount, lon=37.0, **kwargs):
+    return PopulationCell(cell_id, lat, lon, headcount, **kwargs)
+
+
+def allocation(plan):
+    return {(a.cell_id, a.shelter_id): a.people for a in plan.assignments}
+
+
+def test_cells_go_to_nearest_shelter_with_room():
+    planner = EvacuationPlanner([
+        shelter("north", 55.2), shelter("south", 55.0, total=50, current=20),
+    ])
+    plan = planner.plan([cell("n", 55.19, 60), cell("s", 55.01, 40)])
+    # В южном укрытии 30 свободных мест, остальные едут на север
+    assert allocation(plan) == {("n", "north"): 60, ("s", "south"): 30, ("s", "north"): 10}
+    assert plan.unassigned == {}
+    assert plan.by_shelter() == {"north": 70, "south": 30}
+
+
+def test_shortage_leaves_people_unassigned():
+    planner = EvacuationPlanner([
+        shelter("a", 55.0, total=30), shelter("closed", 55.0, is_active=False),
+    ])
+    plan = planner.plan([cell("x", 55.0, 20), cell("y", 55.05, 25), cell("empty", 55.0, 0)])
+    assert plan.by_shelter() == {"a": 30}
+    assert plan.assigned_people == 30
+    assert plan.unassigned == {"y": 15}
+
+
+def test_accessibility_and_medical_needs_limit_shelters():
+    planner = EvacuationPlanner([
+        shelter("near", 55.0, is_accessible=False),
+        shelter("ramp", 55.1),
+        shelter("medical", 55.3, has_medical=True, is_accessible=False),
+    ])
+    plan = planner.plan([
+        cell("wheelchair", 55.0, 10, needs_accessibility=True),
+        cell("patients", 55.0, 10, needs_medical=True),
+        cell("both", 55.0, 10, needs_accessibility=True, needs_medical=True),
+    ])
+    assert allocation(plan) == {("wheelchair", "ramp"): 10, ("patients", "medical"): 10}
+    assert plan.unassigned == {"both": 10}
+
+
+def test_reduced_capacity_evicts_farthest_cells_first():
+    planner = EvacuationPlanner([shelter("a", 55.0, total=100), shelter("b", 55.5, total=100)])
+    planner.plan([cell("near", 55.0, 40), cell("far", 55.2, 40)])
+
+    plan = planner.update_capacity("a", 50)
+    assert allocation(plan) == {("near", "a"): 40, ("far", "a"): 10, ("far", "b"): 30}
+
+    plan = planner.close_shelter("a")
+    assert allocation(plan) == {("near", "b"): 40, ("far", "b"): 40}
+    plan = planner.update_capacity("b", 60)
+    assert plan.by_shelter() == {"b": 60}
+    assert plan.unassigned == {"near": 20}
+
+
+def test_increased_capacity_takes_unassigned_people():
+    planner = EvacuationPlanner([shelter("a", 55.0, total=10), shelter("b", 56.0, total=10)])
+    plan = planner.plan([cell("x", 55.0, 25)])
+    assert plan.unassigned == {"x": 5}
+
+    plan = planner.update_capacity("b", 30)
+    assert allocation(plan) == {("x", "a"): 10, ("x", "b"): 15}
+    assert plan.unassigned == {}
+
+
+@pytest.mark.parametrize("shelter_id", ["missing", "inactive"])
+def test_unknown_or_inactive_shelter_leaves_plan_unchanged(shelter_id):
+    planner = EvacuationPlanner([shelter("a", 55.0), shelter("inactive", 55.0, is_active=False)])
+    before = allocation(planner.plan([cell("x", 55.0, 150)]))
+
+    assert allocation(planner.update_capacity(shelter_id, 500)) == before
+    plan = planner.close_shelter(shelter_id)
+    assert allocation(plan) == before == {("x", "a"): 100}
+    assert plan.unassigned == {"x": 50}
+
+
+def test_tiled_search_respects_capacity_and_conserves_people():
+    rng = np.random.default_rng(4)
+    shelters = [
+        shelter(f"s{i}", lat, lon, total=int(total))
+        for i, (lat, lon, total) in enumerate(zip(
+            rng.uniform(54, 57, 300), rng.uniform(36, 39, 300), rng.integers(0, 40, 300),
+        ))
+    ]
+    cells = [
+        cell(f"c{i}", lat, int(count), lon=lon)
+        for i, (lat, lon, count) in enumerate(zip(
+            rng.uniform(54, 57, 500), rng.uniform(36, 39, 500), rng.integers(0, 30, 500),
+        ))
+    ]
+    capacity = {s.id: s.capacity.total for s in shelters}
+    # Маленький chunk_size включает поиск по плиткам
+    tiled = EvacuationPlanner(shelters, chunk_size=4)
+    exact = EvacuationPlanner(shelters)
+
+    for planner in (tiled, exact):
+        plan = planner.plan(cells)
+        for closed in ("s0", "s1", "s2"):
+            plan = planner.close_shelter(closed)
+            capacity_now = dict(capacity, **{s: 0 for s in ("s0", "s1", "s2")[:int(closed[1]) + 1]})
+            assert all(people <= capacity_now[s] for s, people in plan.by_shelter().items())
+            assert plan.assigned_people + plan.unassigned_people == sum(c.headcount for c in cells)
+            # Нехватка мест только при полностью занятых укрытиях
+            if plan.unassigned:
+                assert plan.assigned_people == sum(capacity_now.values())
+
+    assert allocation(tiled.get_plan()) == allocation(exact.get_plan())
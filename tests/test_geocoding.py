@@ -0,0 +1,82 @@
+from src.services.geocoding import Gazetteer, GeocodeResult, ReverseGeocoder
+
+
+ENTRIES = [
+    {"name": "Москва", "kind": "city", "lat": 55.7558, "lon": 37.6173, "region": "Москва"},
+]
+
+
+def test_local_lookup_and_cache_hits():
+    geocoder = ReverseGeocoder(Gazetteer(ENTRIES))
+    assert geocoder.reverse(55.75, 37.61).city == "Москва"
+    assert geocoder.reverse(55.75, 37.61).city == "Москва"
+    assert geocoder.hits["gazetteer"] == 1
+    assert geocoder.hits["lru"] == 1
+
+
+def test_remote_errors_are_counted_not_printed(capsys):
+    calls = []
+
+    def remote(lat, lon):
+        calls.append((lat, lon))
+        if len(calls) == 1:
+            raise ConnectionError("сеть недоступна")
+        return GeocodeResult(city="Где-то", source="remote")
+
+    geocoder = ReverseGeocoder(Gazetteer(ENTRIES), remote=remote)
+    assert geocoder.reverse(10.0, 10.0) is None
+    assert geocoder.hits["remote_errors"] == 1
+    assert capsys.readouterr().out == ""
+
+    # Неудачный запрос не кэшируется и повторяется
+    assert geocoder.reverse(10.0, 10.0).city == "Где-то"
+    assert geocoder.hits["remote"] == 1
+
+
+def test_async_lookups_share_disk_cache(tmp_path, run):
+    import asyncio
+
+    geocoder = ReverseGeocoder(Gazetteer(ENTRIES), cache_path=str(tmp_path / "geocode.db"))
+
+    async def scenario():
+        points = [(55.75 + i * 0.01, 37.61) for i in range(20)]
+        return await asyncio.gather(*(geocoder.reverse_async(lat, lon) for lat, lon in points))
+
+    try:
+        results = run(scenario())
+    finally:
+        geocoder.close()
+    assert all(result.city == "Москва" for result in results[:5])
+
+    reopened = ReverseGeocoder(Gazetteer(ENTRIES), cache_path=str(tmp_path / "geocode.db"))
+    try:
+        reopened.reverse_many([55.75], [37.61])
+        assert reopened.hits["disk"] == 1
+    finally:
+        reopened.close()
+
+
+def test_cached_lookups_do_not_wait_for_remote_service():
+    import threading
+
+    started, release = threading.Event(), threading.Event()
+
+    def remote(lat, lon):
+        started.set()
+        release.wait(5)
+        return GeocodeResult(city="Где-то", source="remote")
+
+    geocoder = ReverseGeocoder(Gazetteer(ENTRIES), remote=remote)
+    slow = threading.Thread(target=geocoder.reverse, args=(10.0, 10.0))
+    slow.start()
+    try:
+        assert started.wait(5)
+        fast = threading.Thread(target=geocoder.reverse, args=(55.75, 37.61))
+        fast.start()
+        fast.join(1)
+        assert not fast.is_alive()
+    finally:
+        release.set()
+        slow.join()
+    assert geocoder.reverse(10.0, 10.0).city == "Где-то"
+    assert geocoder.hits["remote"] == 1
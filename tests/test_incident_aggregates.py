@@ -0,0 +1,107 @@
+import random
+
+from src.services.database_service import DatabaseService
+
+
+def incident(incident_id, day, incident_type="flood", severity="high", region="Москва"):
+    return {
+        "id": incident_id, "title": f"Происшествие {incident_id}", "description": None,
+        "incident_type": incident_type, "lat": 55.75, "lon": 37.61, "address": None,
+        "region": region, "is_active": True, "severity": severity,
+        "incident_date": day, "created_at": f"{day or '2025-01-01'}T12:00:00",
+    }
+
+
+async def daily_counts(db: DatabaseService):
+    """Агрегаты из триггеров и их пересчёт по таблице incidents"""
+    async with db._pool.acquire() as conn:
+        cursor = await conn.execute(
+            "SELECT day, region, incident_type, severity, count "
+            "FROM incident_daily_counts ORDER BY 1, 2, 3, 4"
+        )
+        stored = [tuple(row) for row in await cursor.fetchall()]
+        cursor = await conn.execute(
+            "SELECT incident_date, COALESCE(region, ''), COALESCE(incident_type, ''), "
+            "COALESCE(severity, ''), COUNT(*) FROM incidents "
+            "WHERE incident_date IS NOT NULL GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4"
+        )
+        expected = [tuple(row) for row in await cursor.fetchall()]
+    return stored, expected
+
+
+async def delete_incidents(db: DatabaseService, ids):
+    async def operation(conn):
+        await conn.executemany("DELETE FROM incidents WHERE id = ?", [(i,) for i in ids])
+    await db.execute_write(operation)
+
+
+def test_daily_counts_follow_insert_update_and_delete(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_incidents([
+                incident("a", "2025-01-31"),
+                incident("b", "2025-01-31"),
+                incident("c", "2025-01-31", severity="low"),
+                incident("d", None),
+            ])
+            stored, expected = await daily_counts(db)
+            assert stored == expected == [
+                ("2025-01-31", "Москва", "flood", "high", 2),
+                ("2025-01-31", "Москва", "flood", "low", 1),
+            ]
+
+            # Перенос через границу дня (и месяца) и появление даты
+            await db.upsert_incidents([
+                incident("b", "2025-02-01"),
+                incident("d", "2025-02-01"),
+            ])
+            stored, expected = await daily_counts(db)
+            assert stored == expected == [
+                ("2025-01-31", "Москва", "flood", "high", 1),
+                ("2025-01-31", "Москва", "flood", "low", 1),
+                ("2025-02-01", "Москва", "flood", "high", 2),
+            ]
+
+            # Обнулившийся счётчик удаляется, а не остаётся с нулём
+            await delete_incidents(db, ["c"])
+            await db.upsert_incidents([incident("a", "2025-01-31", region=None)])
+            stored, expected = await daily_counts(db)
+            assert stored == expected == [
+                ("2025-01-31", "", "flood", "high", 1),
+                ("2025-02-01", "Москва", "flood", "high", 2),
+            ]
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_daily_counts_match_recount_after_random_changes(make_db, run):
+    rng = random.Random(5)
+    days = [None, "2025-01-30", "2025-01-31", "2025-02-01"]
+
+    def random_incident(incident_id):
+        return incident(
+            incident_id, rng.choice(days),
+            incident_type=rng.choice(["flood", "fire", None]),
+            severity=rng.choice(["low", "high"]),
+            region=rng.choice(["Москва", "Тверь", None]),
+        )
+
+    async def scenario():
+        db = await make_db()
+        try:
+            ids = [f"i{n}" for n in range(40)]
+            await db.upsert_incidents([random_incident(i) for i in ids])
+            for _ in range(15):
+                changed = rng.sample(ids, 10)
+                await db.upsert_incidents([random_incident(i) for i in changed])
+                removed = rng.sample(ids, 3)
+                await delete_incidents(db, removed)
+                await db.upsert_incidents([random_incident(i) for i in removed])
+                stored, expected = await daily_counts(db)
+                assert stored == expected
+                assert all(row[-1] > 0 for row in stored)
+        finally:
+            await db.close()
+    run(scenario())
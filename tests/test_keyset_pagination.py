@@ -0,0 +1,102 @@
+from datetime import date
+
+import pytest
+
+from src.services.database_service import DatabaseService
+
+
+DAY = date(2025, 1, 31)
+
+
+def incident(incident_id, created_at, day=DAY.isoformat()):
+    return {
+        "id": incident_id, "title": f"Происшествие {incident_id}", "description": None,
+        "incident_type": "flood", "lat": 55.75, "lon": 37.61, "address": None,
+        "region": "Москва", "is_active": True, "severity": "high",
+        "incident_date": day, "created_at": created_at,
+    }
+
+
+# 23 происшествия с повторяющимся created_at и одно за другой день
+INCIDENTS = [
+    incident(f"i{n:02d}", f"2025-01-31T{10 + n % 3:02d}:00:00") for n in range(23)
+] + [incident("other", "2025-01-30T10:00:00", day="2025-01-30")]
+EXPECTED = sorted(
+    ((row["created_at"], row["id"]) for row in INCIDENTS if row["id"] != "other"),
+    reverse=True,
+)
+
+
+async def all_pages(db: DatabaseService, limit: int):
+    pages, cursor = [], None
+    while True:
+        page = await db.get_incidents_page(DAY, cursor=cursor, limit=limit)
+        pages.append([(row["created_at"], row["id"]) for row in page.items])
+        if page.next_cursor is None:
+            return pages
+        cursor = page.next_cursor
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 23, 50])
+def test_pages_cover_duplicate_sort_keys_exactly_once(make_db, run, limit):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_incidents(INCIDENTS)
+            return await all_pages(db, limit)
+        finally:
+            await db.close()
+
+    pages = run(scenario())
+    assert [key for page in pages for key in page] == EXPECTED
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_new_rows_do_not_shift_later_pages(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_incidents(INCIDENTS)
+            first = await db.get_incidents_page(DAY, limit=10)
+            # Свежая запись и запись с тем же ключом сортировки перед курсором
+            await db.upsert_incidents([
+                incident("new", "2025-01-31T23:00:00"),
+                incident("i99", first.items[-1]["created_at"]),
+            ])
+            rest = await db.get_incidents_page(DAY, cursor=first.next_cursor, limit=50)
+            return first.items, rest.items
+        finally:
+            await db.close()
+
+    first, rest = run(scenario())
+    keys = [(row["created_at"], row["id"]) for row in first + rest]
+    assert keys == EXPECTED
+    assert len(set(keys)) == len(keys)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4, 23, 100])
+def test_stream_yields_every_row_once(make_db, run, batch_size):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_incidents(INCIDENTS)
+            return [batch async for batch in db.iter_incidents_by_date(DAY, batch_size)]
+        finally:
+            await db.close()
+
+    batches = run(scenario())
+    ids = [row["id"] for batch in batches for row in batch]
+    assert sorted(ids) == sorted(key[1] for key in EXPECTED)
+    assert all(len(batch) == batch_size for batch in batches[:-1])
+
+
+def test_malformed_cursor_is_rejected(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            with pytest.raises(ValueError):
+                await db.get_incidents_page(DAY, cursor="not-a-cursor")
+        finally:
+            await db.close()
+    run(scenario())
@@ -0,0 +1,34 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.services.location_service import LocationService
+
+
+def test_scalar_distance_matches_vectorized():
+    rng = random.Random(1)
+    points = [
+        (rng.uniform(-90, 90), rng.uniform(-180, 180), rng.uniform(-90, 90), rng.uniform(-180, 180))
+        for _ in range(500)
+    ]
+    lat, lon = 55.75, 37.61
+    expected = LocationService.calculate_distances(
+        lat, lon, [p[0] for p in points], [p[1] for p in points]
+    )
+    actual = [LocationService.calculate_distance(lat, lon, p[0], p[1]) for p in points]
+    assert np.allclose(actual, expected, atol=1e-6)
+    assert isinstance(actual[0], float)
+
+
+def test_distance_udf_is_registered(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            async with db._pool.acquire() as conn:
+                cursor = await conn.execute("SELECT distance_km(55.7558, 37.6173, 59.9343, 30.3351)")
+                (distance,) = await cursor.fetchone()
+        finally:
+            await db.close()
+        assert distance == pytest.approx(634, abs=2)
+    run(scenario())
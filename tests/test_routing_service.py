@@ -0,0 +1,81 @@
+import warnings
+
+import numpy as np
+
+from src.services.routing_service import RoadGraph, RoutingService, _search
+
+
+def make_graph(seed: int = 3) -> RoadGraph:
+    """Ориентированный граф из двух несвязанных частей"""
+    rng = np.random.default_rng(seed)
+    n = 300
+    lat = 55.0 + rng.random(n)
+    lon = 37.0 + rng.random(n)
+    half = n // 2
+    sources, targets = [], []
+    for part in (range(half), range(half, n)):
+        nodes = np.array(part)
+        for _ in range(4 * len(nodes)):
+            u, v = rng.choice(nodes, 2, replace=False)
+            sources.append(int(u))
+            targets.append(int(v))
+    graph = RoadGraph.from_edges(lat, lon, sources, targets, bidirectional=False)
+    graph.precompute_landmarks(count=6)
+    return graph
+
+
+def test_heuristic_is_warning_free_and_admissible():
+    graph = make_graph()
+    service = RoutingService(graph)
+    rng = np.random.default_rng(11)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for _ in range(30):
+            source, target = (int(x) for x in rng.integers(graph.node_count, size=2))
+            heuristic = service._heuristic(target)
+            estimates = np.array([heuristic(node) for node in range(graph.node_count)])
+            assert np.isfinite(estimates).all()
+            exact = graph._dijkstra_all([target], reverse=True)
+            reachable = np.isfinite(exact)
+            assert (estimates[reachable] <= exact[reachable] + 1e-3).all()
+
+            dist, _, reached = _search(graph, [source], target=target, heuristic=heuristic)
+            plain, _, plain_reached = _search(graph, [source], target=target)
+            assert reached == plain_reached
+            if reached is not None:
+                assert abs(dist[reached] - plain[plain_reached]) < 1e-6
+
+
+def make_grid(size: int) -> RoadGraph:
+    """Квадратная сетка дорог с шагом 0.01°"""
+    rows, cols = np.divmod(np.arange(size * size), size)
+    lat = 55.0 + rows * 0.01
+    lon = 37.0 + cols * 0.01
+    nodes = np.arange(size * size).reshape(size, size)
+    sources = np.concatenate((nodes[:, :-1].ravel(), nodes[:-1, :].ravel()))
+    targets = np.concatenate((nodes[:, 1:].ravel(), nodes[1:, :].ravel()))
+    graph = RoadGraph.from_edges(lat, lon, sources, targets)
+    graph.precompute_landmarks(count=4)
+    return graph
+
+
+def test_short_route_work_does_not_grow_with_graph():
+    results = []
+    for size in (12, 150):
+        service = RoutingService(make_grid(size))
+        evaluated = []
+        make_heuristic = service._heuristic
+
+        def counting(target, make_heuristic=make_heuristic, evaluated=evaluated):
+            heuristic = make_heuristic(target)
+            return lambda node: evaluated.append(node) or heuristic(node)
+
+        service._heuristic = counting
+        route = service.route(55.02, 37.02, 55.05, 37.06)
+        results.append((route.cost, len(route.nodes), len(evaluated)))
+
+    (small_cost, small_nodes, _), (large_cost, large_nodes, large_evaluated) = results
+    assert abs(small_cost - large_cost) < 1e-9
+    assert small_nodes == large_nodes == 8
+    # Оценки считаются только около маршрута, а не для 22 500 узлов
+    assert large_evaluated < 200
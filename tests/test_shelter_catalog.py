@@ -0,0 +1,114 @@
+import random
+
+from src.models.shelter import Shelter, ShelterCapacity, ShelterLocation
+from src.services.shelter_catalog import ShelterCatalog
+from src.services.shelter_service import ShelterService
+
+
+def shelter(shelter_id, shelter_type="shelter", total=100, current=0, active=True):
+    return Shelter(
+        id=shelter_id, name=f"Укрытие {shelter_id}", shelter_type=shelter_type,
+        location=ShelterLocation(latitude=55.75, longitude=37.61, address=""),
+        capacity=ShelterCapacity(total=total, current=current), is_active=active,
+    )
+
+
+def ids(shelters):
+    return [s.id for s in shelters]
+
+
+def test_indexes_by_id_type_status_and_capacity():
+    catalog = ShelterCatalog([
+        shelter("a", "bunker", total=50, current=10),
+        shelter("b", "shelter", total=20, current=20),
+        shelter("c", "bunker", total=30, active=False),
+        shelter("d", "shelter", total=40),
+    ])
+    assert catalog.get("c").shelter_type == "bunker"
+    assert catalog.get("missing") is None
+    assert sorted(ids(catalog.by_type("bunker"))) == ["a", "c"]
+    assert list(catalog.by_type("medical")) == []
+    assert catalog.types() == {"bunker": 2, "shelter": 2}
+    assert sorted(ids(catalog.active())) == ["a", "b", "d"]
+
+    # По возрастанию свободных мест, неактивные не попадают
+    assert ids(catalog.with_capacity(0)) == ["b", "a", "d"]
+    view = catalog.with_capacity(1)
+    assert ids(view) == ["a", "d"]
+    assert (len(view), view[0].id, view[-1].id, ids(view[::-1])) == (2, "a", "d", ["d", "a"])
+    assert catalog.count_with_capacity(41) == 0
+
+
+def test_views_follow_add_and_remove():
+    catalog = ShelterCatalog([shelter("a", total=10)])
+    bunkers, active, roomy = catalog.by_type("bunker"), catalog.active(), catalog.with_capacity(5)
+
+    catalog.add(shelter("b", "bunker", total=50))
+    assert (ids(bunkers), sorted(ids(active)), ids(roomy)) == (["b"], ["a", "b"], ["a", "b"])
+
+    # Замена укрытия с тем же ID переносит его между индексами
+    catalog.add(shelter("b", "shelter", total=3))
+    assert (ids(bunkers), ids(roomy), len(catalog)) == ([], ["a"], 2)
+
+    assert catalog.remove("a").id == "a"
+    assert catalog.remove("a") is None
+    assert (sorted(ids(active)), ids(roomy)) == (["b"], [])
+
+
+def test_indexes_are_stale_until_update_shelter():
+    service = ShelterService()
+    service.add_shelter(shelter("x", "bunker", total=100, current=0))
+    roomy = service.get_shelters_with_capacity(90)
+    assert "x" in ids(roomy)
+
+    target = service.get_shelter_by_id("x")
+    target.capacity.current = 95
+    target.shelter_type = "medical"
+    # Изменение на месте индексы не видят до update_shelter
+    assert "x" in ids(roomy)
+    assert "x" in ids(service.get_shelters_by_type("bunker"))
+
+    assert service.update_shelter("x")
+    assert "x" not in ids(roomy)
+    assert service.get_shelters_with_capacity(5)[0].id == "x"
+    assert "x" not in ids(service.get_shelters_by_type("bunker"))
+    assert ids(service.get_shelters_by_type("medical")) == ["x"]
+
+    target.is_active = False
+    service.update_shelter("x")
+    assert "x" not in ids(service.get_active_shelters())
+    assert "x" not in ids(service.get_shelters_with_capacity(0))
+    assert not service.update_shelter("missing")
+
+
+def test_indexes_match_brute_force_after_random_changes():
+    rng = random.Random(9)
+    types = ["shelter", "bunker", "medical"]
+    catalog = ShelterCatalog(
+        shelter(f"s{i}", rng.choice(types), 50, rng.randrange(51)) for i in range(60)
+    )
+    for _ in range(300):
+        shelter_id = f"s{rng.randrange(80)}"
+        action = rng.random()
+        if action < 0.2:
+            catalog.remove(shelter_id)
+        elif action < 0.4 or shelter_id not in catalog:
+            catalog.add(shelter(shelter_id, rng.choice(types), 50, rng.randrange(51)))
+        else:
+            target = catalog.get(shelter_id)
+            target.capacity.current = rng.randrange(51)
+            target.shelter_type = rng.choice(types)
+            target.is_active = rng.random() < 0.8
+            catalog.reindex(shelter_id)
+
+    everything = list(catalog)
+    for shelter_type in types:
+        assert sorted(ids(catalog.by_type(shelter_type))) == sorted(
+            s.id for s in everything if s.shelter_type == shelter_type
+        )
+    for need in (0, 1, 25, 50):
+        expected = sorted(
+            (s for s in everything if s.is_active and s.capacity.available >= need),
+            key=lambda s: (s.capacity.available, s.id),
+        )
+        assert ids(catalog.with_capacity(need)) == ids(expected)
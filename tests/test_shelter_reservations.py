@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from src.services.shelter_reservations import (
+    ReservationError, ShelterFullError, ShelterReservations,
+)
+
+
+def shelter(name="Укрытие 1", current=0, total=100):
+    return {
+        "id": "s1", "name": name, "shelter_type": "shelter", "lat": 55.75,
+        "lon": 37.61, "address": "ул. Тестовая, 1", "capacity_total": total,
+        "capacity_current": current, "is_active": True, "phone": None,
+    }
+
+
+def test_upsert_after_reserve_keeps_occupancy(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([shelter()])
+            reservations = ShelterReservations(db)
+            await reservations.reserve("s1", 40)
+
+            result = await db.upsert_shelters([shelter(name="Укрытие 1 (новое имя)")])
+            assert result.updated == 1
+            [row] = await db.get_shelter_occupancy(["s1"])
+            assert row["capacity_current"] == 40
+
+            # Повтор того же фида не считается изменением
+            result = await db.upsert_shelters([shelter(name="Укрытие 1 (новое имя)")])
+            assert result.unchanged == 1
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_upsert_sets_occupancy_of_new_shelter(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([shelter(current=15)])
+            [row] = await db.get_shelter_occupancy(["s1"])
+            assert row["capacity_current"] == 15
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_concurrent_reserves_never_overbook(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([shelter(total=50)])
+            reservations = ShelterReservations(db)
+            results = await asyncio.gather(
+                *(reservations.reserve("s1", 1) for _ in range(80)),
+                return_exceptions=True,
+            )
+            assert sum(not isinstance(r, Exception) for r in results) == 50
+            assert all(
+                isinstance(r, ShelterFullError) for r in results if isinstance(r, Exception)
+            )
+            [row] = await db.get_shelter_occupancy(["s1"])
+            assert row["capacity_current"] == 50
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_zero_ttl_hold_expires_immediately(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([shelter()])
+            reservations = ShelterReservations(db, hold_ttl=900)
+            await reservations.reserve("s1", 10, ttl=0)
+            await asyncio.sleep(0.01)
+            assert await reservations.expire_stale() == 1
+            assert reservations.get_occupancy("s1").current == 0
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_reserve_rejects_shelter_with_unknown_capacity(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([shelter(total=None)])
+            reservations = ShelterReservations(db)
+            with pytest.raises(ReservationError) as error:
+                await reservations.reserve("s1", 1)
+            assert not isinstance(error.value, ShelterFullError)
+            [row] = await db.get_shelter_occupancy(["s1"])
+            assert row["capacity_current"] == 0
+        finally:
+            await db.close()
+    run(scenario())
@@ -0,0 +1,84 @@
+from src.services.database_service import DatabaseService
+
+
+def shelter(shelter_id, lat, lon, active=True):
+    return {
+        "id": shelter_id, "name": f"Укрытие {shelter_id}", "shelter_type": "shelter",
+        "lat": lat, "lon": lon, "address": None, "capacity_total": 100,
+        "capacity_current": 0, "is_active": active, "phone": None,
+    }
+
+
+async def rtree_rows(db: DatabaseService):
+    async with db._pool.acquire() as conn:
+        cursor = await conn.execute(
+            "SELECT s.id, r.min_lat, r.min_lon FROM shelters_rtree AS r "
+            "JOIN shelters AS s ON s.rowid = r.id ORDER BY s.id"
+        )
+        # R*Tree хранит координаты в float32
+        return [(row[0], round(row[1], 4), round(row[2], 4)) for row in await cursor.fetchall()]
+
+
+async def nearby_ids(db: DatabaseService, lat, lon, radius_km=5):
+    return [row["id"] for row in await db.get_nearby_shelters(lat, lon, radius_km)]
+
+
+def test_rtree_follows_insert_update_and_deactivation(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([
+                shelter("a", 55.75, 37.61),
+                shelter("b", 55.76, 37.62),
+                shelter("far", 59.93, 30.31),
+            ])
+            assert await rtree_rows(db) == [
+                ("a", 55.75, 37.61), ("b", 55.76, 37.62), ("far", 59.93, 30.31),
+            ]
+            assert await nearby_ids(db, 55.75, 37.61) == ["a", "b"]
+
+            # Переезд укрытия переносит его строку R*Tree
+            await db.upsert_shelters([shelter("b", 59.94, 30.32)])
+            assert ("b", 59.94, 30.32) in await rtree_rows(db)
+            assert await nearby_ids(db, 55.75, 37.61) == ["a"]
+            assert await nearby_ids(db, 59.93, 30.31) == ["far", "b"]
+
+            # Неактивное укрытие остаётся в R*Tree, но не в выдаче
+            await db.upsert_shelters([shelter("far", 59.93, 30.31, active=False)])
+            assert len(await rtree_rows(db)) == 3
+            assert await nearby_ids(db, 59.93, 30.31) == ["b"]
+        finally:
+            await db.close()
+    run(scenario())
+
+
+def test_nearby_shelters_across_antimeridian(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([
+                shelter("east", 65.0, 179.99), shelter("west", 65.0, -179.99),
+            ])
+            return await nearby_ids(db, 65.0, 180.0, radius_km=10)
+        finally:
+            await db.close()
+    assert sorted(run(scenario())) == ["east", "west"]
+
+
+def test_nearby_shelters_plan_uses_rtree(make_db, run):
+    async def scenario():
+        db = await make_db()
+        try:
+            await db.upsert_shelters([shelter("a", 55.75, 37.61)])
+            sql, params = DatabaseService._nearby_shelters_query(55.75, 37.61, 5, 50)
+            # Без статистики ANALYZE планировщик охотнее берёт idx_shelters_active
+            async with db._pool.acquire() as conn:
+                cursor = await conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                return [row[3] for row in await cursor.fetchall()]
+        finally:
+            await db.close()
+
+    plan = run(scenario())
+    assert any(line.startswith("SCAN shelters_rtree VIRTUAL TABLE") for line in plan)
+    assert any(line.startswith("SEARCH s USING INTEGER PRIMARY KEY") for line in plan)
+    assert not any("idx_shelters_active" in line for line in plan)
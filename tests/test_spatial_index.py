@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.services.location_service import LocationService
+from src.services.spatial_index import SpatialIndex
+
+
+def random_point(rng: random.Random):
+    """Точка в одном из скоплений: Москва, антимеридиан, полюс или где угодно"""
+    kind = rng.random()
+    if kind < 0.4:
+        return rng.gauss(55.75, 0.05), rng.gauss(37.61, 0.05)
+    if kind < 0.6:
+        return rng.uniform(60, 66), rng.choice((-1, 1)) * rng.uniform(179.9, 180)
+    if kind < 0.7:
+        return rng.uniform(89.9, 90), rng.uniform(-180, 180)
+    return rng.uniform(-90, 90), rng.uniform(-180, 180)
+
+
+def brute_force(points, lat, lon, predicate=None):
+    """Все точки с расстояниями по возрастанию"""
+    keys = [key for key in points if predicate is None or predicate(key)]
+    if not keys:
+        return [], np.empty(0)
+    distances = LocationService.calculate_distances(
+        lat, lon, [points[key][0] for key in keys], [points[key][1] for key in keys]
+    )
+    order = np.argsort(distances, kind="stable")
+    return [keys[i] for i in order], distances[order]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_queries_match_brute_force_after_inserts_and_removes(seed):
+    rng = random.Random(seed)
+    # Маленькие листья и буфер, чтобы перестройки случались часто
+    index = SpatialIndex(leaf_size=4, rebuild_ratio=0.2, max_pending=16)
+    initial = [(key, *random_point(rng), None) for key in range(100)]
+    index.bulk_load(initial)
+    points = {key: (lat, lon) for key, lat, lon, _ in initial}
+
+    for step in range(400):
+        action = rng.random()
+        key = rng.randrange(150)
+        if action < 0.35:
+            assert index.remove(key) == (key in points)
+            points.pop(key, None)
+        else:
+            # Вставка новой точки или перемещение существующей
+            points[key] = random_point(rng)
+            index.insert(key, *points[key])
+        assert len(index) == len(points)
+
+        if step % 10:
+            continue
+        lat, lon = random_point(rng)
+        k = rng.choice((1, 5, 20))
+        keys, distances = brute_force(points, lat, lon)
+        found = index.nearest(lat, lon, k=k)
+        assert np.allclose([d for _, d in found], distances[:k], atol=1e-6)
+        # Ключи совпадают, кроме точек на равном расстоянии
+        strict = {key for key, d in zip(keys, distances) if d < distances[min(k, len(keys)) - 1] - 1e-6}
+        assert strict <= {key for key, _ in found}
+
+        even = lambda key: key % 2 == 0
+        keys, distances = brute_force(points, lat, lon, predicate=even)
+        found = index.nearest(lat, lon, k=k, predicate=even)
+        assert np.allclose([d for _, d in found], distances[:k], atol=1e-6)
+
+        radius = rng.choice((1.0, 50.0, 2000.0))
+        keys, distances = brute_force(points, lat, lon)
+        found = index.within_radius(lat, lon, radius)
+        found_keys = {key for key, _ in found}
+        assert {key for key, d in zip(keys, distances) if d < radius - 1e-6} <= found_keys
+        assert found_keys <= {key for key, d in zip(keys, distances) if d <= radius + 1e-6}
+        assert [d for _, d in found] == sorted(d for _, d in found)
+
+        limited = index.nearest(lat, lon, k=k, max_distance_km=radius)
+        assert {key for key, _ in limited} <= found_keys
+        assert len(limited) == min(k, len(found))
+
+
+def test_empty_index_and_removed_keys():
+    index = SpatialIndex()
+    assert index.nearest(55.75, 37.61) == []
+    assert index.within_radius(55.75, 37.61, 100) == []
+    index.insert("a", 55.75, 37.61, payload="укрытие")
+    assert index.nearest(55.75, 37.61, k=0) == []
+    assert index.remove("a")
+    assert not index.remove("a")
+    assert index.nearest(55.75, 37.61) == []
+    assert "a" not in index
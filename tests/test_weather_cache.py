@@ -0,0 +1,75 @@
+from src.services.weather_cache import CURRENT, FORECAST, WeatherCache
+
+
+def test_puts_are_batched_into_one_disk_write(run, tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def scenario():
+        cache = WeatherCache(path, flush_delay=0.01)
+        for i in range(50):
+            cache.put(CURRENT, (i, i), {"n": i})
+        await cache.flush()
+        stats = cache.get_stats()
+        await cache.close()
+        return stats
+
+    stats = run(scenario())
+    assert stats["disk_writes"] == 1
+    assert stats["pending_writes"] == 0
+
+    async def reopen():
+        cache = WeatherCache(path)
+        entry = await cache.get(CURRENT, (7, 7))
+        await cache.close()
+        return entry
+
+    assert run(reopen()).payload == {"n": 7}
+
+
+def test_pending_entry_is_readable_after_eviction(run, tmp_path):
+    async def scenario():
+        cache = WeatherCache(str(tmp_path / "cache.db"), memory_size=1, flush_delay=10)
+        cache.put(CURRENT, (1, 1), {"n": 1})
+        cache.put(CURRENT, (2, 2), {"n": 2})
+        entry = await cache.get(CURRENT, (1, 1))
+        await cache.close()
+        return entry
+
+    assert run(scenario()).payload == {"n": 1}
+
+
+def test_invalidate_removes_entries_not_yet_on_disk(run, tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def scenario():
+        cache = WeatherCache(path, flush_delay=10)
+        cache.put(FORECAST, (1, 1), {"n": 1})
+        cache.put(CURRENT, (1, 1), {"n": 1})
+        removed = await cache.invalidate([FORECAST])
+        await cache.close()
+
+        cache = WeatherCache(path)
+        entries = await cache.peek_many(FORECAST, [(1, 1)]), await cache.peek(CURRENT, (1, 1))
+        await cache.close()
+        return removed, entries
+
+    removed, (forecast, current) = run(scenario())
+    assert removed == 1
+    assert forecast == {(1, 1): None}
+    assert current.payload == {"n": 1}
+
+
+def test_put_outside_event_loop_writes_immediately(run, tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = WeatherCache(path)
+    cache.put(CURRENT, (3, 3), {"n": 3})
+    assert cache.get_stats()["pending_writes"] == 0
+
+    async def reopen():
+        other = WeatherCache(path)
+        entry = await other.get(CURRENT, (3, 3))
+        await other.close()
+        return entry
+
+    assert run(reopen()).payload == {"n": 3}
+    run(cache.close())
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from src.models.risk import RiskLevel, RiskType
+from src.services.weather_rules import RuleEngine, WeatherRule
+
+
+DAY = 86400
+STEP = 10800
+TIMESTAMPS = np.arange(0, 5 * DAY, STEP, dtype=np.int64)
+
+
+def column(*slots_values, default=0.0):
+    """Строка матрицы: значение default, кроме заданных слотов"""
+    row = np.full(len(TIMESTAMPS), default, dtype=np.float32)
+    for slots, value in slots_values:
+        row[list(slots)] = value
+    return row
+
+
+def test_parse_rule():
+    rule = WeatherRule.parse("wind_speed ≥ 15 for 6h -> storm/medium")
+    assert (rule.field, rule.op, rule.threshold) == ("wind_speed", ">=", 15.0)
+    assert (rule.risk_type, rule.level, rule.duration, rule.unit) == (
+        RiskType.STORM, RiskLevel.MEDIUM, 6, "h",
+    )
+
+
+@pytest.mark.parametrize("text", [
+    "wind_speed >= fast -> storm/high",
+    "rain >= 10 -> flood/high",
+    "wind_speed >= 20 -> storm/extreme",
+])
+def test_parse_rejects_bad_rules(text):
+    with pytest.raises(ValueError):
+        WeatherRule.parse(text)
+
+
+def test_hourly_duration_needs_consecutive_slots():
+    engine = RuleEngine(["wind_speed >= 15 for 6h -> storm/medium"])
+    values = {"wind_speed": np.stack([
+        column(([4, 5], 16)),
+        column(([4, 6], 16)),
+        column(([4, 5], np.nan), ([6], 16)),
+    ])}
+    [hit] = engine.evaluate(TIMESTAMPS, values)
+    assert hit.mask.tolist() == [True, False, False]
+    assert hit.start[0] == TIMESTAMPS[4]
+    assert hit.end[0] == TIMESTAMPS[5] + STEP
+
+
+def test_daily_duration_counts_local_days():
+    engine = RuleEngine(["temp_max >= 35 for 2d -> heat/high"])
+    # Слоты 7 и 8 — 21:00 и 00:00 UTC, но одни сутки при UTC+3
+    values = {"temp_max": np.stack([
+        column(([1, 9], 36)),
+        column(([1, 17], 36)),
+        column(([7, 8], 36)),
+    ])}
+    [utc] = engine.evaluate(TIMESTAMPS, values)
+    assert utc.mask.tolist() == [True, False, True]
+    [local] = engine.evaluate(TIMESTAMPS, values, utc_offset=3 * 3600)
+    assert local.mask.tolist() == [True, False, False]
+
+
+def test_higher_level_of_same_type_wins():
+    engine = RuleEngine()
+    values = {"wind_speed": np.stack([column(([3], 26)), column(([3], 21)), column()])}
+    hits = {hit.rule.level: hit.mask.tolist() for hit in engine.evaluate(TIMESTAMPS, values)}
+    assert hits == {
+        RiskLevel.CRITICAL: [True, False, False],
+        RiskLevel.HIGH: [False, True, False],
+    }
+
+
+def test_risks_merge_adjacent_cells():
+    engine = RuleEngine(["wind_speed >= 20 -> storm/high"])
+    cells = np.array([[10, 10], [11, 11], [15, 15], [12, 10]])
+    storm = column(([2], 22))
+    values = {"wind_speed": np.stack([storm, storm, storm, column()])}
+    risks = engine.risks(cells, TIMESTAMPS, values, cell_deg=0.1)
+    assert sorted(risk.id for risk in risks) == [
+        "weather_storm_high_10_10", "weather_storm_high_15_15",
+    ]
+    merged = next(risk for risk in risks if risk.id.endswith("10_10"))
+    assert len(merged.zone.polygon) >= 3
+    assert all(type(value) is float for point in merged.zone.polygon for value in point)
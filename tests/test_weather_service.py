@@ -0,0 +1,207 @@
+import asyncio
+import threading
+
+import httpx
+
+from src.services.weather_cache import WeatherCache
+from src.services.weather_service import WeatherService
+from src.services.weather_timeseries import FORECAST, OBSERVATION, WeatherSeriesStore
+
+
+BASE = 1760000000
+
+
+def forecast_payload(temp_max: float = 20.0, wind: float = 4.0) -> dict:
+    return {
+        "city": {"timezone": 10800},
+        "list": [
+            {
+                "dt": BASE + i * 10800,
+                "main": {
+                    "temp": temp_max - 2, "temp_min": temp_max - 5, "temp_max": temp_max,
+                    "feels_like": temp_max - 2, "humidity": 40, "pressure": 1010,
+                },
+                "wind": {"speed": wind},
+                "weather": [{"description": "ясно", "icon": "01d"}],
+                "pop": 0,
+            }
+            for i in range(40)
+        ],
+    }
+
+
+CURRENT_PAYLOAD = {
+    "dt": BASE, "timezone": 10800,
+    "main": {"temp": 18, "feels_like": 17, "humidity": 40, "pressure": 1010},
+    "wind": {"speed": 3},
+    "weather": [{"description": "ясно", "icon": "01d"}],
+}
+
+
+def make_service(handler=None, **kwargs) -> WeatherService:
+    def default(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/forecast"):
+            return httpx.Response(200, json=forecast_payload())
+        return httpx.Response(200, json=CURRENT_PAYLOAD)
+
+    return WeatherService(
+        api_key="key",
+        transport=httpx.MockTransport(handler or default),
+        cache=WeatherCache(),
+        **kwargs,
+    )
+
+
+class ThreadRecordingStore(WeatherSeriesStore):
+    """Хранилище, запоминающее потоки вызовов"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def append_many(self, items):
+        self.threads.append(threading.current_thread())
+        super().append_many(items)
+
+    def apply_retention(self, now=None):
+        self.threads.append(threading.current_thread())
+        return super().apply_retention(now)
+
+
+def test_series_writes_are_batched_off_the_event_loop(run):
+    store = ThreadRecordingStore()
+
+    async def scenario():
+        service = make_service(series=store, series_flush_delay=10)
+        for lat in (55.71, 55.81, 55.91):
+            await service.get_forecast(lat, 37.61)
+            await service.get_current_weather(lat, 37.61)
+        assert store.cells(FORECAST) == []
+        trend = await service.get_trend(55.71, 37.61, BASE - 86400, BASE + 86400, kind=OBSERVATION)
+        await service.close()
+        return trend
+
+    trend = run(scenario())
+    assert len(store.cells(FORECAST)) == 3
+    assert len(store.cells(OBSERVATION)) == 3
+    assert trend.values["temp_mean"].tolist() == [18.0]
+    assert len(store.threads) == 1
+    assert store.threads[0] is not threading.main_thread()
+
+
+def test_refresh_loop_applies_retention_in_a_thread(run):
+    store = ThreadRecordingStore()
+
+    async def scenario():
+        service = make_service(series=store)
+
+        async def points():
+            return [(55.71, 37.61)]
+
+        task = asyncio.create_task(service.run_refresh_loop(points, interval=60))
+        while not service.last_refresh:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await service.close()
+        return service.last_refresh
+
+    stats = run(scenario())
+    assert stats["refreshed"] == 1
+    assert "downsampled" in stats
+    assert all(thread is not threading.main_thread() for thread in store.threads)
+
+
+def test_run_bounded_yields_a_result_for_cancelled_calls(run):
+    async def call(item):
+        await asyncio.sleep(0)
+        if item % 3 == 0:
+            raise asyncio.CancelledError()
+        if item % 3 == 1:
+            raise ValueError(item)
+        return item
+
+    async def scenario():
+        service = make_service()
+        collected = {}
+        async with asyncio.timeout(2):
+            async for item, result in service._run_bounded(list(range(12)), call, 4):
+                collected[item] = result
+        await service.close()
+        return collected
+
+    collected = run(scenario())
+    assert sorted(collected) == list(range(12))
+    assert all(isinstance(collected[i], asyncio.CancelledError) for i in range(0, 12, 3))
+    assert all(isinstance(collected[i], ValueError) for i in range(1, 12, 3))
+    assert all(collected[i] == i for i in range(2, 12, 3))
+
+
+def test_refresh_counts_cancelled_fetches_as_errors(run):
+    async def scenario():
+        service = make_service()
+
+        async def cancelled(*args):
+            raise asyncio.CancelledError()
+
+        service._fetch_cell = cancelled
+        async with asyncio.timeout(2):
+            stats = await service.refresh_cells([(55.71, 37.61), (55.91, 37.61)])
+        await service.close()
+        return stats
+
+    stats = run(scenario())
+    assert stats["errors"] == 2
+    assert stats["refreshed"] == 0
+
+
+def test_malformed_cached_forecast_keeps_current_weather(run):
+    async def scenario():
+        service = make_service()
+        service.cache.put(FORECAST, service.cache.cell(55.71, 37.61), {"list": [{"dt": BASE}]})
+        weather = await service.get_current_weather(55.71, 37.61)
+        await service.close()
+        return weather
+
+    weather = run(scenario())
+    assert weather is not None
+    assert weather.temperature == 18
+    assert weather.alerts == []
+
+
+def test_malformed_forecast_gives_no_alerts(run):
+    async def scenario():
+        service = make_service()
+        service.cache.put(FORECAST, service.cache.cell(55.71, 37.61), {"list": [{"dt": BASE}]})
+        alerts = await service.get_weather_alerts(55.71, 37.61)
+        await service.close()
+        return alerts
+
+    assert run(scenario()) == []
+
+
+def test_points_of_one_cell_share_a_request_without_cache(run):
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((float(request.url.params["lat"]), float(request.url.params["lon"])))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=CURRENT_PAYLOAD)
+
+    async def scenario():
+        service = WeatherService(
+            api_key="key", transport=httpx.MockTransport(handler), cell_deg=0.1,
+        )
+        weather = await asyncio.gather(
+            service.get_current_weather(55.71, 37.61),
+            service.get_current_weather(55.79, 37.69),
+            service.get_current_weather(55.91, 37.61),
+        )
+        await service.close()
+        return weather
+
+    weather = run(scenario())
+    assert all(w is not None and w.temperature == 18 for w in weather)
+    # Запрос идёт для центра ячейки, а не для первой точки
+    assert sorted((round(lat, 6), round(lon, 6)) for lat, lon in requests) == [
+        (55.75, 37.65), (55.95, 37.65),
+    ]
@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from src.models.risk import RiskZone
+from src.services.location_service import LocationService
+from src.services.zone_engine import PreparedZone
+
+
+ZONES = [
+    RiskZone(latitude=55.75, longitude=37.61, radius_km=30),
+    RiskZone(latitude=55.75, longitude=37.61, radius_km=30, polygon=[(55.0, 37.0)]),
+    RiskZone(latitude=55.75, longitude=37.61, radius_km=30, polygon=[(55.0, 37.0), (56.0, 38.0)]),
+    RiskZone(
+        latitude=55.75, longitude=37.61, radius_km=0,
+        polygon=[(55.5, 37.2), (56.0, 37.3), (56.1, 38.0), (55.4, 38.1)],
+    ),
+]
+
+
+@pytest.mark.parametrize("zone", ZONES)
+def test_prepared_zone_agrees_with_zone_intersects(zone):
+    rng = random.Random(7)
+    prepared = PreparedZone(zone)
+    points = [(rng.uniform(55.0, 56.5), rng.uniform(36.8, 38.5)) for _ in range(2000)]
+    for lat, lon in points:
+        assert prepared.contains(lat, lon) == LocationService.zone_intersects(zone, lat, lon)
+
+
+@pytest.mark.parametrize("zone", ZONES[1:3])
+def test_degenerate_polygon_uses_circle_bounds(zone):
+    circle = RiskZone(latitude=zone.latitude, longitude=zone.longitude, radius_km=zone.radius_km)
+    assert LocationService.get_zone_bounding_box(zone) == LocationService.get_zone_bounding_box(circle)